@@ -8,12 +8,61 @@ class Settings(BaseSettings):
         env_file_encoding="utf-8",
     )
 
-    dify_api_key_csv_to_json: str | None = Field(default=None, alias="DIFY_API_KEY_CSV_TO_JSON")
     dify_api_key_categorize_json: str | None = Field(default=None, alias="DIFY_API_KEY_CATEGORIZE_JSON")
+    dify_api_key_categorize_json_batch: str | None = Field(default=None, alias="DIFY_API_KEY_CATEGORIZE_JSON_BATCH")
     dify_base_url: str | None = Field(default=None, alias="DIFY_BASE_URL")
     dify_user: str | None = Field(default=None, alias="DIFY_USER")
+    dify_concurrency: int = Field(default=8, alias="DIFY_CONCURRENCY")
+    dify_timeout: float = Field(default=120.0, alias="DIFY_TIMEOUT")
+    dify_workflow_version: str = Field(default="1", alias="DIFY_WORKFLOW_VERSION")
+    dify_batch_max_items: int = Field(default=1, alias="DIFY_BATCH_MAX_ITEMS")
+    dify_batch_max_bytes: int = Field(default=32_000, alias="DIFY_BATCH_MAX_BYTES")
+    # None の場合は送信レートを制限しない
+    dify_rate_limit_per_second: float | None = Field(default=None, alias="DIFY_RATE_LIMIT_PER_SECOND")
+    dify_rate_limit_burst: int = Field(default=8, alias="DIFY_RATE_LIMIT_BURST")
+
+    http_max_retries: int = Field(default=4, alias="HTTP_MAX_RETRIES")
+    http_backoff_base_seconds: float = Field(default=0.5, alias="HTTP_BACKOFF_BASE_SECONDS")
+    http_backoff_max_seconds: float = Field(default=60.0, alias="HTTP_BACKOFF_MAX_SECONDS")
+
+    categorize_cache_enabled: bool = Field(default=True, alias="CATEGORIZE_CACHE_ENABLED")
+    categorize_cache_ttl_seconds: int | None = Field(default=60 * 60 * 24 * 30, alias="CATEGORIZE_CACHE_TTL_SECONDS")
+    categorize_cache_max_entries: int | None = Field(default=100_000, alias="CATEGORIZE_CACHE_MAX_ENTRIES")
+
+    # /categorize で分類できたものをこの件数・秒数ごとにコミットする（失敗したものはデッドレターに保存する）
+    categorize_commit_batch_size: int = Field(default=100, alias="CATEGORIZE_COMMIT_BATCH_SIZE")
+    categorize_commit_interval_seconds: float = Field(default=1.0, alias="CATEGORIZE_COMMIT_INTERVAL_SECONDS")
+
+    # 一覧・カテゴリの読み取りキャッシュ（書き込みがあると無効になる）
+    read_cache_max_entries: int = Field(default=256, alias="READ_CACHE_MAX_ENTRIES")
+    read_cache_ttl_seconds: float | None = Field(default=60.0, alias="READ_CACHE_TTL_SECONDS")
+
+    # 分類済みのブックマークに近いものは Dify に送らずに分類する（NumPy が必要）
+    local_classifier_enabled: bool = Field(default=False, alias="LOCAL_CLASSIFIER_ENABLED")
+    local_classifier_threshold: float = Field(default=0.1, alias="LOCAL_CLASSIFIER_THRESHOLD")
+    local_classifier_min_similarity: float = Field(default=0.2, alias="LOCAL_CLASSIFIER_MIN_SIMILARITY")
+    local_classifier_min_samples: int = Field(default=20, alias="LOCAL_CLASSIFIER_MIN_SAMPLES")
+
+    # 似ているブックマークの検索（NumPy が必要）
+    vector_index_enabled: bool = Field(default=True, alias="VECTOR_INDEX_ENABLED")
+
+    sqlite_pool_size: int = Field(default=8, alias="SQLITE_POOL_SIZE")
+    # 接続プールの接続がすべて使用中の場合に返却を待つ秒数（超えた場合は 503 を返す。None の場合は無期限）
+    sqlite_pool_timeout_seconds: float | None = Field(default=30.0, alias="SQLITE_POOL_TIMEOUT_SECONDS")
+    sqlite_busy_timeout_ms: int = Field(default=5000, alias="SQLITE_BUSY_TIMEOUT_MS")
+    sqlite_synchronous: str = Field(default="NORMAL", alias="SQLITE_SYNCHRONOUS")
+    sqlite_mmap_size: int = Field(default=256 * 1024 * 1024, alias="SQLITE_MMAP_SIZE")
+    # 負の値は KiB 単位（-64000 で約 64MB）
+    sqlite_cache_size: int = Field(default=-64000, alias="SQLITE_CACHE_SIZE")
+    # これ以上かかったクエリを警告ログに出す（None の場合は出さない）
+    db_slow_query_ms: float | None = Field(default=None, alias="DB_SLOW_QUERY_MS")
 
     x_client_id: str | None = Field(default=None, alias="X_CLIENT_ID")
     x_client_secret: str | None = Field(default=None, alias="X_CLIENT_SECRET")
     x_redirect_uri: str | None = Field(default=None, alias="X_REDIRECT_URI")
-    x_scopes: list[str] | None = Field(default=None, alias="X_SCOPES")
\ No newline at end of file
+    x_scopes: list[str] | None = Field(default=None, alias="X_SCOPES")
+    x_timeout: float = Field(default=30.0, alias="X_TIMEOUT")
+    x_api_base_url: str = Field(default="https://api.twitter.com/2", alias="X_API_BASE_URL")
+    # ブックマーク取得の上限（15分あたり180回）に合わせる
+    x_rate_limit_per_second: float | None = Field(default=180 / (15 * 60), alias="X_RATE_LIMIT_PER_SECOND")
+    x_rate_limit_burst: int = Field(default=15, alias="X_RATE_LIMIT_BURST")
\ No newline at end of file
@@ -1,12 +1,49 @@
-from fastapi import FastAPI
-from .routers.bookmark import router as bookmark_router
-from .modules.database import init_db
-
-app = FastAPI()
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from .routers import bookmark
+from .routers.bookmark import router as bookmark_router, jobRunner
+from .routers.metrics import router as metrics_router
+from .modules.database import init_db, close_pool, PoolTimeoutError
+from .modules.crud import add_write_listener, remove_write_listener
+from .modules.async_crud import db_executor
+from .modules.metrics import MetricsMiddleware
 
 # DB初期化（アプリ起動時に一度だけ実行される）
 init_db()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 分類キャッシュ・ローカル分類・類似検索のベクトルを作る（ルーターの import 時には作らない）
+    bookmark.open_categorize_resources()
+    localClassifier = bookmark.localClassifier
+    vectorIndex = bookmark.vectorIndex
+    # 前回停止時に完了していなかった分類ジョブを再開する
+    jobRunner.resume()
+    # ローカル分類の重心は起動を待たせずに裏で作る（できるまでは全件 Dify に送る）
+    if localClassifier is not None:
+        threading.Thread(target=localClassifier.fit_from_db, name="local-classifier-fit", daemon=True).start()
+    # 類似検索のベクトルは書き込みのたびに更新し、未登録の分は裏で登録する
+    if vectorIndex is not None:
+        add_write_listener(vectorIndex.on_bookmarks_written)
+        threading.Thread(target=vectorIndex.sync_from_db, name="vector-index-sync", daemon=True).start()
+    yield
+    await jobRunner.shutdown()
+    if vectorIndex is not None:
+        remove_write_listener(vectorIndex.on_bookmarks_written)
+    bookmark.close_categorize_resources()
+    # 実行中の DB の処理を待ってから接続を閉じる
+    db_executor.shutdown()
+    close_pool()
+
+app = FastAPI(lifespan=lifespan)
+
+# 接続プールの接続が空かない場合は一時的な混雑として 503 を返す（ルーターで捕捉しなかったもの）
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # CORS設定
 from fastapi.middleware.cors import CORSMiddleware
 origins = [
@@ -20,4 +57,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(bookmark_router, prefix="/bookmarks", tags=["bookmarks"])
\ No newline at end of file
+# ルートごとのレイテンシを記録する（GET /metrics で出力）
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(bookmark_router, prefix="/bookmarks", tags=["bookmarks"])
+app.include_router(metrics_router, tags=["metrics"])
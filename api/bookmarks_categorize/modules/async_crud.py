@@ -0,0 +1,80 @@
+from . import crud, failures, jobs, search
+# DBExecutor は jobs からも使うので database に置き、ここから再エクスポートする
+from .database import DBExecutor, db_executor
+
+
+# 以下は crud・search・jobs・failures の関数を await できるようにしたもの（引数と戻り値は元の関数と同じ）
+
+async def get_or_create_category(name: str) -> int:
+    return await db_executor.write(crud.get_or_create_category, name)
+
+async def bulk_insert_bookmarks(bookmarks: list[tuple[str, str, dict]], batch_size: int = 1000) -> int:
+    return await db_executor.write(crud.bulk_insert_bookmarks, bookmarks, batch_size)
+
+async def set_category_parent(category_id: int, parent_id: int | None):
+    return await db_executor.write(crud.set_category_parent, category_id, parent_id)
+
+async def set_bookmark_categories(bookmark_id: str, category_ids: list[int]):
+    return await db_executor.write(crud.set_bookmark_categories, bookmark_id, category_ids)
+
+async def get_category(category_id: int):
+    return await db_executor.read(crud.get_category, category_id)
+
+async def get_all_categories():
+    return await db_executor.read(crud.get_all_categories)
+
+async def get_categories_with_counts():
+    return await db_executor.read(crud.get_categories_with_counts)
+
+async def get_bookmarks_json(category_id: int = None, **filters):
+    return await db_executor.read(crud.get_bookmarks_json, category_id, **filters)
+
+async def get_bookmarks_page(category_id: int = None, limit: int = 50, cursor: str = None, **filters):
+    return await db_executor.read(crud.get_bookmarks_page, category_id, limit, cursor, **filters)
+
+async def aiter_bookmarks_ndjson(lines):
+    """
+    crud.iter_bookmarks_ndjson のジェネレーターを読み取り用のスレッドで1バッチずつ読み進める
+    （途中で打ち切られた場合もジェネレーターを閉じる）
+    """
+    try:
+        while True:
+            chunk = await db_executor.read(next, lines, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        lines.close()
+
+async def search_bookmarks(query: str, category_id: int = None, limit: int = 20, offset: int = 0, **filters):
+    return await db_executor.read(search.search_bookmarks, query, category_id, limit, offset, **filters)
+
+async def open_job() -> str:
+    return await db_executor.write(jobs.open_job)
+
+async def append_job_items(job_id: str, start_index: int, bookmarks_json_list: list[dict]) -> int:
+    return await db_executor.write(jobs.append_job_items, job_id, start_index, bookmarks_json_list)
+
+async def queue_job(job_id: str):
+    return await db_executor.write(jobs.queue_job, job_id)
+
+async def delete_job(job_id: str):
+    return await db_executor.write(jobs.delete_job, job_id)
+
+async def get_job(job_id: str):
+    return await db_executor.read(jobs.get_job, job_id)
+
+async def get_job_results(job_id: str):
+    return await db_executor.read(jobs.get_job_results, job_id)
+
+async def record_failures(failed: list[tuple[dict, str]]) -> int:
+    return await db_executor.write(failures.record_failures, failed)
+
+async def resolve_failures(tweets: list[dict]) -> int:
+    return await db_executor.write(failures.resolve_failures, tweets)
+
+async def get_failures(limit: int = None):
+    return await db_executor.read(failures.get_failures, limit)
+
+async def count_failures() -> int:
+    return await db_executor.read(failures.count_failures)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from .database import db_path
+
+# bookmarks.db と同じディレクトリに保存する
+cache_db_path = os.path.join(os.path.dirname(db_path), "categorize_cache.db")
+
+
+class CategorizeCache:
+    """
+    ツイート内容のハッシュをキーにした分類結果の永続キャッシュ
+    WAL モードの接続を1本だけ開いて使い回し、ヒット時の最終参照日時の更新はまとめて書き込む
+    """
+
+    # 何件書き込むごとに期限切れ・件数超過のエントリを削除するか
+    EVICT_INTERVAL = 100
+    # 最終参照日時の更新を何件ためたら書き込むか（それまでは保存・削除・統計の取得時にまとめて書き込む）
+    TOUCH_FLUSH_SIZE = 100
+
+    def __init__(
+            self,
+            path: str,
+            namespace: str,
+            ttl_seconds: int | None = None,
+            max_entries: int | None = None
+        ) -> None:
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_evict = 0
+        self._lock = threading.Lock()
+        # ヒットしたが最終参照日時をまだ書き込んでいないキーと参照日時
+        self._touched = {}
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # WAL にすると読み込みがロックを取らず、コミットごとの fsync も減る
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn_lock = threading.RLock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS categorize_cache (
+                    key TEXT NOT NULL PRIMARY KEY,
+                    category TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_categorize_cache_accessed_at ON categorize_cache (accessed_at)"
+            )
+        self.evict()
+
+    @staticmethod
+    def make_namespace(api_key: str | None, workflow_version: str, batch_api_key: str | None = None) -> str:
+        """
+        ワークフローのAPIキーとバージョンから名前空間を作る（APIキーそのものは保存しない）
+        バッチ実行のワークフローを使う場合は、そのAPIキーも名前空間に含める
+        """
+        keys = api_key or ""
+        if batch_api_key:
+            keys += "\n" + batch_api_key
+        api_key_hash = hashlib.sha256(keys.encode("utf-8")).hexdigest()[:16]
+        return f"{api_key_hash}:{workflow_version}"
+
+    def make_key(self, bookmark_json: dict) -> str:
+        """キーの順序や空白に依存しないよう正規化したJSONのハッシュをキーにする"""
+        normalized = json.dumps(bookmark_json, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{self.namespace}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, bookmark_json: dict) -> str | None:
+        """
+        キャッシュされた分類項目を取得する
+
+        Args:
+            bookmark_json: ツイート内容の辞書
+
+        Returns:
+            str: 分類項目（キャッシュにない・期限切れの場合はNone）
+        """
+        key = self.make_key(bookmark_json)
+        now = time.time()
+        with self._conn_lock:
+            row = self._conn.execute(
+                "SELECT category, created_at FROM categorize_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM categorize_cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                # ヒットのたびにコミットせず、最終参照日時の更新をためておく
+                self._touched[key] = now
+                if len(self._touched) >= self.TOUCH_FLUSH_SIZE:
+                    self.flush()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, bookmark_json: dict, category: str) -> None:
+        """
+        分類項目をキャッシュに保存する
+
+        Args:
+            bookmark_json: ツイート内容の辞書
+            category: 分類項目
+        """
+        key = self.make_key(bookmark_json)
+        now = time.time()
+        with self._connect() as conn:
+            self._touched.pop(key, None)
+            self._flush_touched(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO categorize_cache (key, category, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, category, now, now)
+            )
+
+        with self._lock:
+            self._writes_since_evict += 1
+            should_evict = self._writes_since_evict >= self.EVICT_INTERVAL
+            if should_evict:
+                self._writes_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        期限切れのエントリと、上限件数を超えた古いエントリ（最終参照が古い順）を削除する
+
+        Returns:
+            int: 削除した件数
+        """
+        deleted = 0
+        with self._connect() as conn:
+            # 件数超過の判定に最近の参照を反映する
+            self._flush_touched(conn)
+            if self.ttl_seconds is not None:
+                deleted += conn.execute(
+                    "DELETE FROM categorize_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                ).rowcount
+            if self.max_entries is not None:
+                deleted += conn.execute("""
+                    DELETE FROM categorize_cache WHERE key IN (
+                        SELECT key FROM categorize_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,)).rowcount
+        return deleted
+
+    def stats(self) -> dict:
+        """ヒット・ミス数とエントリ数を返す"""
+        self.flush()
+        with self._conn_lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM categorize_cache").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries
+            }
+
+    def flush(self) -> None:
+        """ためている最終参照日時の更新を書き込む"""
+        with self._connect() as conn:
+            self._flush_touched(conn)
+
+    def close(self) -> None:
+        """ためている更新を書き込み、接続をクローズする（FastAPI のシャットダウン時に呼び出す）"""
+        with self._conn_lock:
+            self.flush()
+            self._conn.close()
+
+    def _flush_touched(self, conn: sqlite3.Connection) -> None:
+        """最終参照日時の更新を書き込む（_connect のトランザクション内で呼び出す）"""
+        if self._touched:
+            conn.executemany(
+                "UPDATE categorize_cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()]
+            )
+            self._touched.clear()
+
+    @contextmanager
+    def _connect(self):
+        """キャッシュDBの接続を排他的に使い、コミット（例外時はロールバック）する"""
+        with self._conn_lock, self._conn:
+            yield self._conn
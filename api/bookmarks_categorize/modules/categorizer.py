@@ -0,0 +1,313 @@
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterable, Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from .dify import DifyModule
+from .cache import CategorizeCache
+from .local_classifier import LocalClassifier
+from .crud import CATEGORY_SOURCE_DIFY, CATEGORY_SOURCE_LOCAL
+
+
+class CategorizeEngine:
+    """Dify のワークフローに分類リクエストを並列に投げるエンジン"""
+
+    def __init__(
+            self,
+            dify_module: DifyModule,
+            concurrency: int = 8,
+            timeout: float = 120.0,
+            cache: CategorizeCache | None = None,
+            batch_max_items: int = 1,
+            batch_max_bytes: int = 32_000,
+            known_category: Callable[[dict], str | None] | None = None,
+            local_classifier: LocalClassifier | None = None
+        ) -> None:
+        self.dify_module = dify_module
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache = cache
+        # 2件以上の場合は複数のツイートを1回のワークフロー実行にまとめる
+        self.batch_max_items = batch_max_items
+        self.batch_max_bytes = batch_max_bytes
+        # 保存済みのツイートの分類項目を返す関数（再インポート時は Dify もキャッシュも見ずに済ませる）
+        self.known_category = known_category
+        self.known_hits = 0
+        # 確信できるものは Dify に送らずにローカルで分類する（Dify の分類結果で重心を更新する）
+        self.local_classifier = local_classifier
+        # キャッシュで節約できた時間を見積もるため、Dify の呼び出し回数・分類件数・所要時間を記録する
+        self.dify_calls = 0
+        self.dify_items = 0
+        self.dify_seconds = 0.0
+        # requests はブロッキングなので専用スレッドプールで実行し、イベントループを塞がない
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="dify")
+        # 保存済みのツイート・キャッシュ・ローカル分類の参照と更新は SQLite と CPU を使うので、1本の専用スレッドで順に実行する
+        self._lookup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="categorize-lookup")
+
+    async def categorize(self, bookmark_json: dict) -> str:
+        """
+        ブックマーク1件を分類し、分類項目を返す
+
+        Args:
+            bookmark_json: ツイート内容の辞書
+
+        Returns:
+            str: 分類項目
+        """
+        found = await self._alookup(bookmark_json)
+        if found is not None:
+            return found[0]
+        return await self._categorize_uncached(bookmark_json)
+
+    def _lookup(self, bookmark_json: dict) -> tuple[str, str | None] | None:
+        """
+        保存済みのツイート、キャッシュ、ローカル分類の順に分類項目を探す（見つからない場合はNone）
+
+        Returns:
+            tuple: (分類項目, 分類の出所)。保存済みのツイートの場合の出所は None（保存済みの値を残す）
+        """
+        if self.known_category is not None:
+            category = self.known_category(bookmark_json)
+            if category is not None:
+                self.known_hits += 1
+                return category, None
+        if self.cache is not None:
+            # キャッシュには Dify の分類結果だけを保存している
+            category = self.cache.get(bookmark_json)
+            if category is not None:
+                return category, CATEGORY_SOURCE_DIFY
+        if self.local_classifier is not None:
+            category = self.local_classifier.classify(bookmark_json)
+            if category is not None:
+                return category, CATEGORY_SOURCE_LOCAL
+        return None
+
+    def _learn(self, bookmark_json: dict, category: str) -> None:
+        """Dify の分類結果をキャッシュに保存し、ローカル分類の重心に加える"""
+        if self.cache is not None:
+            self.cache.set(bookmark_json, category)
+        if self.local_classifier is not None:
+            self.local_classifier.add(bookmark_json, category)
+
+    def _learn_many(self, results: list[tuple[dict, str]]) -> None:
+        for bookmark_json, category in results:
+            self._learn(bookmark_json, category)
+
+    async def _alookup(self, bookmark_json: dict) -> tuple[str, str | None] | None:
+        """_lookup を参照用のスレッドで実行する（参照先がない場合はスレッドを使わない）"""
+        if self.known_category is None and self.cache is None and self.local_classifier is None:
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._lookup_executor, self._lookup, bookmark_json)
+
+    async def _alearn(self, results: list[tuple[dict, str]]) -> None:
+        """_learn を参照用のスレッドでまとめて実行する"""
+        if not results or (self.cache is None and self.local_classifier is None):
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._lookup_executor, self._learn_many, results)
+
+    async def _categorize_uncached(self, bookmark_json: dict) -> str:
+        """キャッシュを見ずに Dify で1件分類し、結果をキャッシュに保存する"""
+        loop = asyncio.get_running_loop()
+        bookmark_json_str = json.dumps(bookmark_json, ensure_ascii=False)
+        started_at = time.perf_counter()
+        future = loop.run_in_executor(self._executor, self.dify_module.categorized_json, bookmark_json_str)
+        run_workflow_result = await asyncio.wait_for(future, timeout=self.timeout)
+        self._record_dify_call(1, time.perf_counter() - started_at)
+        category = DifyModule.extract_category(run_workflow_result)
+
+        await self._alearn([(bookmark_json, category)])
+        return category
+
+    async def _categorize_batch(self, bookmark_json_list: list[dict], bookmark_json_str_list: list[str]) -> list[str | None]:
+        """複数件を1回のワークフロー実行で分類する（対応付けられなかったアイテムは None）"""
+        loop = asyncio.get_running_loop()
+        started_at = time.perf_counter()
+        future = loop.run_in_executor(self._executor, self.dify_module.categorized_json_batch, bookmark_json_str_list)
+        # 件数倍にすると止まったバッチがセマフォの枠を長く占有するので、1回の呼び出しと同じ期限にする
+        categories = await asyncio.wait_for(future, timeout=self.timeout)
+        self._record_dify_call(len(bookmark_json_list), time.perf_counter() - started_at)
+
+        await self._alearn([
+            (bookmark_json, category) for bookmark_json, category in zip(bookmark_json_list, categories) if category is not None
+        ])
+        return categories
+
+    def _record_dify_call(self, items: int, seconds: float) -> None:
+        self.dify_calls += 1
+        self.dify_items += items
+        self.dify_seconds += seconds
+
+    def cache_stats(self) -> dict | None:
+        """
+        キャッシュのヒット・ミス数と、ヒットによって節約できた時間の見積もりを返す
+
+        Returns:
+            dict: キャッシュの統計情報（キャッシュ無効時はNone）
+        """
+        if self.cache is None:
+            return None
+        stats = self.cache.stats()
+        # バッチ実行の場合も比較できるよう、1件あたりの平均所要時間で見積もる
+        average_dify_seconds = self.dify_seconds / self.dify_items if self.dify_items else 0.0
+        stats["known_hits"] = self.known_hits
+        stats["dify_calls"] = self.dify_calls
+        stats["dify_items"] = self.dify_items
+        stats["average_dify_seconds"] = average_dify_seconds
+        stats["estimated_saved_seconds"] = stats["hits"] * average_dify_seconds
+        return stats
+
+    def local_stats(self) -> dict | None:
+        """
+        ローカル分類で Dify に送らずに済んだ件数と割合を返す
+
+        Returns:
+            dict: ローカル分類の統計情報（無効時はNone）
+        """
+        if self.local_classifier is None:
+            return None
+        return self.local_classifier.stats()
+
+    async def categorize_all(self, bookmarks_json_list: Iterable[dict] | AsyncIterable[dict]) -> list[str]:
+        """
+        ブックマークのリストを同時実行数の上限内で並列に分類する
+        非同期イテレーターを渡した場合は、読み込みと分類を並行して進める
+
+        Args:
+            bookmarks_json_list: ツイート内容の辞書のリスト（またはイテレーター）
+
+        Returns:
+            list: 分類項目のリスト（入力と同じ順序）
+        """
+        category_by_index = {}
+        async for index, category, error, _ in self.categorize_as_completed(_aenumerate(bookmarks_json_list)):
+            if error is not None:
+                raise error
+            category_by_index[index] = category
+        return [category_by_index[index] for index in range(len(category_by_index))]
+
+    async def categorize_as_completed(
+            self,
+            bookmarks: Iterable[tuple[int, dict]] | AsyncIterable[tuple[int, dict]],
+            max_pending: int | None = None
+        ):
+        """
+        ブックマークを並列に分類し、完了したものから順に結果を返す
+        入力は少しずつ読み進め、分類待ちのアイテムが max_pending 件に達している間は読み込みを止める
+
+        Args:
+            bookmarks: (インデックス, ツイート内容の辞書) のリスト（または非同期イテレーター）
+            max_pending: 同時に分類待ちにするアイテム数の上限（Noneの場合は同時実行数 × バッチ件数 × 2）
+
+        Yields:
+            tuple: (インデックス, 分類項目, 例外, 分類の出所)。失敗した場合は分類項目と出所が None になる
+                （出所は CATEGORY_SOURCE_DIFY / CATEGORY_SOURCE_LOCAL、保存済みのツイートの場合は None）
+        """
+        if max_pending is None:
+            max_pending = self.concurrency * self.batch_max_items * 2
+
+        # タイムアウトが待ち行列ではなく実際の呼び出しにかかるよう、セマフォで投入数を絞る
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(index: int, bookmark_json: dict):
+            async with semaphore:
+                try:
+                    return [(index, await self._categorize_uncached(bookmark_json), None, CATEGORY_SOURCE_DIFY)]
+                except Exception as e:
+                    return [(index, None, e, None)]
+
+        async def run_batch(batch: list[tuple[int, dict, str]]):
+            async with semaphore:
+                try:
+                    categories = await self._categorize_batch(
+                        [bookmark_json for _, bookmark_json, _ in batch],
+                        [bookmark_json_str for _, _, bookmark_json_str in batch]
+                    )
+                except Exception:
+                    categories = [None] * len(batch)
+
+            results = []
+            retries = []
+            for (index, bookmark_json, _), category in zip(batch, categories):
+                if category is None:
+                    retries.append(run_one(index, bookmark_json))
+                else:
+                    results.append((index, category, None, CATEGORY_SOURCE_DIFY))
+            # バッチの結果が不正・欠落していたアイテムは1件ずつ分類し直す（同時実行数はセマフォで抑えたまま並列に投げる）
+            for retried in await asyncio.gather(*retries):
+                results.extend(retried)
+            return results
+
+        # 実行中のタスクとそのアイテム数
+        tasks = {}
+        # バッチ実行の場合に詰めている途中のバッチ（件数かバイト数の上限を超える手前で送り出す。上限を超える1件はそれだけで1バッチになる）
+        batch = []
+        batch_bytes = 0
+
+        def submit_batch():
+            nonlocal batch, batch_bytes
+            if batch:
+                tasks[asyncio.ensure_future(run_batch(batch))] = len(batch)
+                batch = []
+                batch_bytes = 0
+
+        def pop_done() -> list:
+            results = []
+            for task in [task for task in tasks if task.done()]:
+                del tasks[task]
+                results.extend(task.result())
+            return results
+
+        try:
+            async for index, bookmark_json in _aiter(bookmarks):
+                # 保存済み・キャッシュにある・ローカルで分類できるものは Dify に投げずに返す
+                found = await self._alookup(bookmark_json)
+                if found is not None:
+                    yield index, found[0], None, found[1]
+                    continue
+
+                if self.batch_max_items > 1:
+                    bookmark_json_str = json.dumps(bookmark_json, ensure_ascii=False)
+                    size = len(bookmark_json_str.encode("utf-8"))
+                    if batch and (len(batch) >= self.batch_max_items or batch_bytes + size > self.batch_max_bytes):
+                        submit_batch()
+                    batch.append((index, bookmark_json, bookmark_json_str))
+                    batch_bytes += size
+                else:
+                    tasks[asyncio.ensure_future(run_one(index, bookmark_json))] = 1
+
+                for result in pop_done():
+                    yield result
+                # 分類待ちが上限に達している間は、次のアイテムを読み込まずに完了を待つ
+                while tasks and sum(tasks.values()) + len(batch) >= max_pending:
+                    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for result in pop_done():
+                        yield result
+                if len(batch) >= max_pending:
+                    submit_batch()
+
+            submit_batch()
+            while tasks:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for result in pop_done():
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def _aiter(items: Iterable | AsyncIterable):
+    """同期・非同期どちらのイテラブルも非同期に読み進める"""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+async def _aenumerate(items: Iterable | AsyncIterable):
+    index = 0
+    async for item in _aiter(items):
+        yield index, item
+        index += 1
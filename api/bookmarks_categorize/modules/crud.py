@@ -1,7 +1,61 @@
 import os
 import json
 import uuid
+import base64
+import logging
+from collections.abc import Callable
 from .database import db_path, get_connection
+from .metrics import time_stage
+from .read_cache import data_version
+from .tweet import extract_tweet_id, extract_tweet_fields, normalize_timestamp, url_domain
+
+# 主カテゴリの分類の出所（Dify のワークフロー、ローカル分類）。保存済みのツイートから引いた場合は None で、既存の値を残す
+CATEGORY_SOURCE_DIFY = "dify"
+CATEGORY_SOURCE_LOCAL = "local"
+
+# 同じツイートは1件にまとめ、分類か内容（分類の出所を含む）が変わった場合だけ更新する（変わらなければ全文検索の索引も更新しない）
+UPSERT_BOOKMARK_SQL = """
+    INSERT INTO bookmarks (id, categorize_id, tweet, tweet_id, screen_name, tweet_text, tweeted_at, has_media, category_source)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (tweet_id) DO UPDATE SET
+        categorize_id = excluded.categorize_id,
+        tweet = excluded.tweet,
+        screen_name = excluded.screen_name,
+        tweet_text = excluded.tweet_text,
+        tweeted_at = excluded.tweeted_at,
+        has_media = excluded.has_media,
+        category_source = COALESCE(excluded.category_source, bookmarks.category_source),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE bookmarks.categorize_id != excluded.categorize_id OR bookmarks.tweet != excluded.tweet
+        OR bookmarks.category_source IS NOT COALESCE(excluded.category_source, bookmarks.category_source)
+"""
+
+logger = logging.getLogger(__name__)
+
+# ブックマークを書き込んだ後に呼び出す関数（類似検索のベクトルの更新など）
+_write_listeners: list[Callable[[list[tuple[str, str | None, dict]]], None]] = []
+
+def add_write_listener(listener: Callable[[list[tuple[str, str | None, dict]]], None]) -> None:
+    """
+    ブックマークをコミットした後に呼び出す関数を登録する
+
+    Args:
+        listener: (ブックマークID, ツイートID, ツイート内容の辞書) のリストを受け取る関数
+            （ツイートIDが同じ既存の行を更新した場合、その行のブックマークIDは異なる）
+    """
+    _write_listeners.append(listener)
+
+def remove_write_listener(listener) -> None:
+    if listener in _write_listeners:
+        _write_listeners.remove(listener)
+
+def _notify_written(bookmarks: list[tuple[str, str | None, dict]]) -> None:
+    """書き込みはコミット済みなので、登録された関数が失敗しても呼び出し元には伝えない"""
+    for listener in list(_write_listeners):
+        try:
+            listener(bookmarks)
+        except Exception:
+            logger.exception("ブックマークの書き込み後の処理に失敗しました")
 
 def get_or_create_category(name: str) -> int:
     """
@@ -24,77 +78,523 @@ def get_or_create_category(name: str) -> int:
                 cur.execute("INSERT INTO bookmarks_category (categorize_name) VALUES (?)", (name,))
                 category_id = cur.lastrowid
                 conn.commit()
+                data_version.bump()
             return category_id
         except Exception as e:
             conn.rollback()
             raise e
 
-def insert_bookmark(bookmark_id: str, categorize_id: int, tweet: dict):
+def insert_bookmark(bookmark_id: str, categorize_id: int, tweet: dict, category_source: str = None):
     """
-    ブックマークをデータベースに挿入する
+    ブックマークをデータベースに挿入する（同じツイートIDのブックマークがある場合は更新する）
     
     Args:
         bookmark_id: ブックマークの一意識別子
         categorize_id: カテゴリID
         tweet: ツイート内容の辞書
+        category_source: 分類の出所（CATEGORY_SOURCE_DIFY など。Noneの場合は既存の値を残す）
     """
     with get_connection() as conn:
         cur = conn.cursor()
         try:
-            tweet_json = json.dumps(tweet, ensure_ascii=False)
-            cur.execute(
-                "INSERT OR IGNORE INTO bookmarks (id, categorize_id, tweet) VALUES (?, ?, ?)",
-                (bookmark_id, categorize_id, tweet_json)
-            )
+            row, urls = _bookmark_row(bookmark_id, categorize_id, tweet, category_source)
+            cur.execute(UPSERT_BOOKMARK_SQL, row)
+            _replace_bookmark_urls(cur, [(bookmark_id, row[3], urls)])
             conn.commit()
+            data_version.bump()
         except Exception as e:
             conn.rollback()
             raise e
+    _notify_written([(bookmark_id, row[3], tweet)])
 
-def get_bookmarks_by_category(category_id: int = None):
+def bulk_insert_bookmarks(bookmarks: list[tuple], batch_size: int = 1000) -> int:
     """
-    カテゴリIDに基づいてブックマークを取得する
-    
+    分類済みのブックマークをまとめてデータベースに挿入する（同じツイートIDのブックマークがある場合は更新する）
+    カテゴリ名はバッチごとに一括で解決し、ブックマークは executemany で挿入して
+    バッチごとに1回だけコミットする
+
+    Args:
+        bookmarks: (ブックマークID, カテゴリ名, ツイート内容の辞書[, 分類の出所]) のリスト
+            （分類の出所を省略した場合・Noneの場合は既存の値を残す）
+        batch_size: 1回のコミットで挿入する件数
+
+    Returns:
+        int: 挿入・更新した件数
+    """
+    # コミット済みで、書き込み後の処理に渡す行
+    written = []
+    try:
+        # カテゴリの解決・挿入・コミットの時間を記録する
+        with time_stage("db_bulk_insert", len(bookmarks)), get_connection() as conn:
+            cur = conn.cursor()
+            try:
+                category_ids = {}
+                inserted = 0
+                for start in range(0, len(bookmarks), batch_size):
+                    batch = bookmarks[start:start + batch_size]
+                    new_names = {bookmark[1] for bookmark in batch if bookmark[1] not in category_ids}
+                    category_ids.update(_resolve_category_ids(cur, new_names))
+                    rows = [
+                        _bookmark_row(bookmark_id, category_ids[name], tweet, *source)
+                        for bookmark_id, name, tweet, *source in batch
+                    ]
+                    cur.executemany(UPSERT_BOOKMARK_SQL, [row for row, _ in rows])
+                    inserted += cur.rowcount
+                    _replace_bookmark_urls(cur, [(row[0], row[3], urls) for row, urls in rows])
+                    conn.commit()
+                    data_version.bump()
+                    written.extend((row[0], row[3], bookmark[2]) for (row, _), bookmark in zip(rows, batch))
+                return inserted
+            except Exception as e:
+                conn.rollback()
+                raise e
+    finally:
+        # 接続を返却してから呼び出す（リスナーが別の接続を取っても、同じスレッドで接続を二重に取らない）
+        # 途中のバッチで失敗した場合も、コミット済みのバッチの分は通知する
+        if written:
+            _notify_written(written)
+
+def _bookmark_row(bookmark_id: str, categorize_id: int, tweet: dict, category_source: str = None) -> tuple[tuple, list[str]]:
+    """UPSERT_BOOKMARK_SQL のパラメータと、ツイートに含まれる URL を返す"""
+    fields = extract_tweet_fields(tweet)
+    row = (
+        bookmark_id,
+        categorize_id,
+        json.dumps(tweet, ensure_ascii=False),
+        fields["tweet_id"],
+        fields["screen_name"],
+        fields["tweet_text"],
+        fields["tweeted_at"],
+        int(fields["has_media"]),
+        category_source
+    )
+    return row, fields["urls"]
+
+def _replace_bookmark_urls(cur, bookmarks: list[tuple[str, str | None, list[str]]]):
+    """
+    ブックマークの URL を入れ替える
+    ツイートIDがあるものは、既存の行が更新された場合に備えてツイートIDから行を引く
+
+    Args:
+        cur: カーソル
+        bookmarks: (ブックマークID, ツイートID, URLのリスト) のリスト
+    """
+    by_tweet_id = [(tweet_id, urls) for _, tweet_id, urls in bookmarks if tweet_id is not None]
+    by_bookmark_id = [(bookmark_id, urls) for bookmark_id, tweet_id, urls in bookmarks if tweet_id is None and urls]
+    cur.executemany(
+        "DELETE FROM bookmark_urls WHERE bookmark_id = (SELECT id FROM bookmarks WHERE tweet_id = ?)",
+        [(tweet_id,) for tweet_id, _ in by_tweet_id]
+    )
+    cur.executemany(
+        "INSERT OR IGNORE INTO bookmark_urls (bookmark_id, url, domain) SELECT id, ?, ? FROM bookmarks WHERE tweet_id = ?",
+        [(url, url_domain(url), tweet_id) for tweet_id, urls in by_tweet_id for url in urls]
+    )
+    cur.executemany(
+        "INSERT OR IGNORE INTO bookmark_urls (bookmark_id, url, domain) VALUES (?, ?, ?)",
+        [(bookmark_id, url, url_domain(url)) for bookmark_id, urls in by_bookmark_id for url in urls]
+    )
+
+def _resolve_category_ids(cur, names: set[str]) -> dict[str, int]:
+    """
+    カテゴリ名の集合をまとめてIDに解決する（存在しないカテゴリは作成する）
+
+    Args:
+        cur: カーソル
+        names: カテゴリ名の集合
+
+    Returns:
+        dict: カテゴリ名からカテゴリIDへの対応
+    """
+    names = list(names)
+    if not names:
+        return {}
+    cur.executemany(
+        "INSERT OR IGNORE INTO bookmarks_category (categorize_name) VALUES (?)",
+        [(name,) for name in names]
+    )
+    category_ids = {}
+    # SQLite のプレースホルダ数の上限を超えないよう分割して取得する
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        cur.execute(
+            f"SELECT categorize_name, id FROM bookmarks_category WHERE categorize_name IN ({placeholders})",
+            chunk
+        )
+        category_ids.update(cur.fetchall())
+    return category_ids
+
+def get_category_by_tweet(tweet: dict) -> str | None:
+    """
+    ツイートが保存済みの場合はその分類項目を返す（再インポート時に Dify の呼び出しを省くために使う）
+
+    Args:
+        tweet: ツイート内容の辞書
+
+    Returns:
+        str: 分類項目（未保存、またはツイートIDを取り出せない場合はNone）
+    """
+    tweet_id = extract_tweet_id(tweet)
+    if tweet_id is None:
+        return None
+    with get_connection() as conn:
+        row = conn.execute("""
+            SELECT c.categorize_name
+            FROM bookmarks b
+            JOIN bookmarks_category c ON b.categorize_id = c.id
+            WHERE b.tweet_id = ?
+        """, (tweet_id,)).fetchone()
+    return row[0] if row else None
+
+def build_filter_conditions(
+        screen_name: str = None,
+        since: str = None,
+        until: str = None,
+        has_media: bool = None,
+        domain: str = None,
+        label_id: int = None
+    ) -> tuple[list[str], list]:
+    """
+    投稿者・投稿日時・メディアの有無・URLのドメインによる絞り込みの条件とパラメータを組み立てる
+    （ブックマークのテーブルの別名は b）
+
+    Args:
+        screen_name: 投稿者のスクリーンネーム（大文字小文字を区別しない）
+        since: この日時以降に投稿されたもの
+        until: この日時より前に投稿されたもの
+        has_media: メディアの有無
+        domain: ツイートに含まれるURLのドメイン
+        label_id: 付けられたカテゴリのID（主カテゴリ以外も含む）
+
+    Returns:
+        tuple: (条件のリスト, パラメータのリスト)
+
+    Raises:
+        ValueError: 日時を解釈できない場合
+    """
+    conditions = []
+    params = []
+    if screen_name:
+        conditions.append("b.screen_name = ?")
+        params.append(screen_name.lstrip("@"))
+    for value, operator in ((since, ">="), (until, "<")):
+        if value:
+            timestamp = normalize_timestamp(value)
+            if timestamp is None:
+                raise ValueError(f"日時の形式が不正です: {value}")
+            conditions.append(f"b.tweeted_at {operator} ?")
+            params.append(timestamp)
+    if has_media is not None:
+        conditions.append("b.has_media = ?")
+        params.append(int(has_media))
+    if domain:
+        conditions.append("b.id IN (SELECT bookmark_id FROM bookmark_urls WHERE domain = ?)")
+        params.append(url_domain(f"https://{domain.strip()}"))
+    if label_id is not None:
+        conditions.append("b.id IN (SELECT bookmark_id FROM bookmark_categories WHERE category_id = ?)")
+        params.append(label_id)
+    return conditions, params
+
+def get_bookmarks_json(category_id: int = None, **filters) -> bytes:
+    """
+    カテゴリIDに基づいてブックマークを取得し、{"bookmarks": [...]} の JSON 本文として返す
+    (created_at, id) の降順で、保存済みの tweet の JSON 文字列はデコードせずにそのまま埋め込む
+
     Args:
         category_id: カテゴリID（Noneの場合は全て取得）
-        
+        filters: build_filter_conditions の絞り込み条件
+
+    Returns:
+        bytes: レスポンス本文の JSON
+    """
+    conditions, params = _bookmark_list_conditions(category_id, None, **filters)
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT b.id, c.categorize_name, b.tweet, b.created_at
+            FROM bookmarks b
+            JOIN bookmarks_category c ON b.categorize_id = c.id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY b.created_at DESC, b.id DESC
+        """, params)
+        return ('{"bookmarks": [' + ", ".join(_bookmark_row_json(row) for row in cur) + "]}").encode("utf-8")
+
+def _bookmark_row_json(row) -> str:
+    """(id, 分類項目, tweet, created_at) の行を1件分の JSON 文字列にする"""
+    # tweet は json.dumps で保存した1行の JSON なので、そのまま値として埋め込める
+    return (
+        f'{{"id": {json.dumps(row[0], ensure_ascii=False)}, '
+        f'"category": {json.dumps(row[1], ensure_ascii=False)}, '
+        f'"tweet": {row[2]}, '
+        f'"created_at": {json.dumps(row[3])}}}'
+    )
+
+def encode_cursor(created_at: str, bookmark_id: str) -> str:
+    """
+    ページの最後のブックマークの (created_at, id) をカーソル文字列にする
+    """
+    raw = json.dumps([created_at, bookmark_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """
+    カーソル文字列を (created_at, id) に戻す
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    try:
+        created_at, bookmark_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("カーソルの形式が不正です")
+    if not isinstance(created_at, str) or not isinstance(bookmark_id, str):
+        raise ValueError("カーソルの形式が不正です")
+    return created_at, bookmark_id
+
+def _bookmark_list_conditions(category_id: int = None, cursor: str = None, **filters) -> tuple[list[str], list]:
+    """一覧取得クエリの WHERE 句の条件とパラメータを組み立てる"""
+    conditions = ["b.is_deleted = 0"]
+    params = []
+    if category_id is not None:
+        conditions.append("b.categorize_id = ?")
+        params.append(category_id)
+    if cursor is not None:
+        conditions.append("(b.created_at, b.id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    filter_conditions, filter_params = build_filter_conditions(**filters)
+    return conditions + filter_conditions, params + filter_params
+
+def get_bookmarks_page(category_id: int = None, limit: int = 50, cursor: str = None, **filters):
+    """
+    ブックマークを (created_at, id) の降順でキーセットページネーションして取得する
+    カーソル位置からインデックスを辿るため、何ページ目でも取得コストは一定になる
+
+    Args:
+        category_id: カテゴリID（Noneの場合は全て取得）
+        limit: 1ページの件数
+        cursor: 前のページの next_cursor（Noneの場合は先頭ページ）
+        filters: build_filter_conditions の絞り込み条件
+
     Returns:
-        list: ブックマークのリスト
+        tuple: (ブックマークのリスト, 次のページのカーソル（最終ページの場合はNone）)
+    """
+    conditions, params = _bookmark_list_conditions(category_id, cursor, **filters)
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # 次のページの有無を判定するため1件多く取得する
+        cur.execute(f"""
+            SELECT b.id, c.categorize_name, b.tweet, b.created_at
+            FROM bookmarks b
+            JOIN bookmarks_category c ON b.categorize_id = c.id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY b.created_at DESC, b.id DESC
+            LIMIT ?
+        """, (*params, limit + 1))
+        rows = cur.fetchall()
+
+    bookmarks = [
+        {
+            "id": row[0],
+            "category": row[1],
+            "tweet": json.loads(row[2]),
+            "created_at": row[3]
+        }
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = bookmarks[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+    return bookmarks, next_cursor
+
+def iter_bookmarks_ndjson(category_id: int = None, limit: int = None, cursor: str = None, batch_size: int = 500, **filters):
+    """
+    ブックマークを (created_at, id) の降順で1件1行の NDJSON として少しずつ返すジェネレーター
+    カーソルから batch_size 件ずつキーセットで読み出し、保存済みの tweet の JSON 文字列はデコードせずにそのまま埋め込むため、
+    件数によらずメモリ使用量は一定になる
+    接続はバッチを読み出す間だけ借りて返却するため、遅いクライアントへの送信中もプールの接続を占有しない
+
+    Args:
+        category_id: カテゴリID（Noneの場合は全て取得）
+        limit: 取得する最大件数（Noneの場合は全件）
+        cursor: get_bookmarks_page の next_cursor（Noneの場合は先頭から）
+        batch_size: 1回に読み出して返す件数
+        filters: build_filter_conditions の絞り込み条件
+
+    Yields:
+        bytes: batch_size 件分の NDJSON
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        conditions, params = _bookmark_list_conditions(category_id, cursor, **filters)
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        with get_connection() as conn:
+            rows = conn.execute(f"""
+                SELECT b.id, c.categorize_name, b.tweet, b.created_at
+                FROM bookmarks b
+                JOIN bookmarks_category c ON b.categorize_id = c.id
+                WHERE {" AND ".join(conditions)}
+                ORDER BY b.created_at DESC, b.id DESC
+                LIMIT ?
+            """, params + [size]).fetchall()
+        if not rows:
+            break
+        yield "".join(_bookmark_row_json(row) + "\n" for row in rows).encode("utf-8")
+        if len(rows) < size:
+            break
+        if remaining is not None:
+            remaining -= len(rows)
+        # 次のバッチはこのバッチの最後の行の続きから読み出す
+        cursor = encode_cursor(rows[-1][3], rows[-1][0])
+
+def get_category(category_id: int):
+    """
+    カテゴリを1件取得する
+
+    Args:
+        category_id: カテゴリID
+
+    Returns:
+        dict: カテゴリ（存在しない・削除済みの場合はNone）
+    """
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT id, categorize_name, parent_id, created_at FROM bookmarks_category WHERE id = ? AND is_deleted = 0",
+            (category_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    return {"id": row[0], "name": row[1], "parent_id": row[2], "created_at": row[3]}
+
+def set_category_parent(category_id: int, parent_id: int | None):
+    """
+    カテゴリの親カテゴリを設定する
+
+    Args:
+        category_id: カテゴリID
+        parent_id: 親カテゴリID（Noneの場合は最上位にする）
+
+    Raises:
+        ValueError: 親カテゴリが存在しない場合、または親子関係が循環する場合
     """
     with get_connection() as conn:
         cur = conn.cursor()
         try:
-            if category_id is not None:
-                cur.execute("""
-                    SELECT b.id, c.categorize_name, b.tweet, b.created_at 
-                    FROM bookmarks b
-                    JOIN bookmarks_category c ON b.categorize_id = c.id
-                    WHERE b.categorize_id = ? AND b.is_deleted = 0
-                    ORDER BY b.created_at DESC
-                """, (category_id,))
-            else:
+            if parent_id is not None:
+                # 親カテゴリから祖先を辿り、自分自身が含まれていれば循環になる
                 cur.execute("""
-                    SELECT b.id, c.categorize_name, b.tweet, b.created_at 
-                    FROM bookmarks b
-                    JOIN bookmarks_category c ON b.categorize_id = c.id
-                    WHERE b.is_deleted = 0
-                    ORDER BY b.created_at DESC
-                """)
-            
-            rows = cur.fetchall()
-            bookmarks = []
-            for row in rows:
-                bookmark = {
-                    "id": row[0],
-                    "category": row[1],
-                    "tweet": json.loads(row[2]),
-                    "created_at": row[3]
-                }
-                bookmarks.append(bookmark)
-            return bookmarks
+                    WITH RECURSIVE ancestors (id, parent_id) AS (
+                        SELECT id, parent_id FROM bookmarks_category WHERE id = ? AND is_deleted = 0
+                        UNION
+                        SELECT c.id, c.parent_id FROM bookmarks_category c JOIN ancestors a ON c.id = a.parent_id
+                    )
+                    SELECT id FROM ancestors
+                """, (parent_id,))
+                ancestor_ids = {row[0] for row in cur.fetchall()}
+                if not ancestor_ids:
+                    raise ValueError(f"親カテゴリが存在しません: {parent_id}")
+                if category_id in ancestor_ids:
+                    raise ValueError("カテゴリの親子関係が循環しています")
+            cur.execute("UPDATE bookmarks_category SET parent_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (parent_id, category_id))
+            conn.commit()
+            data_version.bump()
         except Exception as e:
+            conn.rollback()
             raise e
 
+def get_bookmark_category_ids(bookmark_id: str):
+    """
+    ブックマークに付けられたカテゴリのIDを取得する
+
+    Returns:
+        list: カテゴリIDのリスト（ブックマークが存在しない場合はNone）
+    """
+    with get_connection() as conn:
+        if conn.execute("SELECT 1 FROM bookmarks WHERE id = ? AND is_deleted = 0", (bookmark_id,)).fetchone() is None:
+            return None
+        rows = conn.execute(
+            "SELECT category_id FROM bookmark_categories WHERE bookmark_id = ? ORDER BY category_id", (bookmark_id,)
+        ).fetchall()
+    return [row[0] for row in rows]
+
+def set_bookmark_categories(bookmark_id: str, category_ids: list[int]):
+    """
+    ブックマークに付けるカテゴリを置き換える（主カテゴリ categorize_id は常に残す）
+    カテゴリごとの件数はトリガーで更新される
+
+    Args:
+        bookmark_id: ブックマークID
+        category_ids: 付けるカテゴリIDのリスト
+
+    Returns:
+        list: 付けられたカテゴリIDのリスト（ブックマークが存在しない場合はNone）
+
+    Raises:
+        ValueError: 存在しないカテゴリが含まれる場合
+    """
+    category_ids = sorted(set(category_ids))
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT categorize_id FROM bookmarks WHERE id = ? AND is_deleted = 0", (bookmark_id,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            if category_ids:
+                cur.execute(
+                    f"SELECT id FROM bookmarks_category WHERE is_deleted = 0 AND id IN ({','.join('?' * len(category_ids))})",
+                    category_ids
+                )
+                missing = set(category_ids) - {found[0] for found in cur.fetchall()}
+                if missing:
+                    raise ValueError(f"カテゴリが存在しません: {sorted(missing)}")
+            keep = set(category_ids) | ({row[0]} if row[0] is not None else set())
+            cur.execute(
+                f"DELETE FROM bookmark_categories WHERE bookmark_id = ? AND category_id NOT IN ({','.join('?' * len(keep))})",
+                (bookmark_id, *keep)
+            )
+            cur.executemany(
+                "INSERT OR IGNORE INTO bookmark_categories (bookmark_id, category_id) VALUES (?, ?)",
+                [(bookmark_id, category_id) for category_id in sorted(keep)]
+            )
+            conn.commit()
+            data_version.bump()
+            return sorted(keep)
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def get_categories_with_counts():
+    """
+    全てのカテゴリを親カテゴリIDとブックマーク数付きで取得する
+    件数はトリガーで更新される category_counts から読むため、ブックマークの件数によらずカテゴリ数分の読み取りで済む
+
+    Returns:
+        list: カテゴリのリスト（bookmark_count は主カテゴリとしての件数、label_count は付けられている件数）
+    """
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT c.id, c.categorize_name, c.parent_id, c.created_at,
+                coalesce(n.bookmark_count, 0), coalesce(n.label_count, 0)
+            FROM bookmarks_category c
+            LEFT JOIN category_counts n ON n.category_id = c.id
+            WHERE c.is_deleted = 0
+            ORDER BY c.created_at DESC
+        """).fetchall()
+    return [
+        {
+            "id": row[0],
+            "name": row[1],
+            "parent_id": row[2],
+            "created_at": row[3],
+            "bookmark_count": row[4],
+            "label_count": row[5]
+        }
+        for row in rows
+    ]
+
 def get_all_categories():
     """
     全てのカテゴリを取得する
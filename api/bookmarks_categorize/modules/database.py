@@ -1,49 +1,281 @@
 import sqlite3, os
+import asyncio
+import functools
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from ..config import Settings
+from .metrics import db_query_seconds, db_slow_queries
+from .migrations import migrate
 
 base_path = os.path.dirname(__file__)
 db_path = os.path.join(base_path, "../db/bookmarks.db")
 
+slow_query_logger = logging.getLogger(__name__ + ".slow_query")
+
+# メトリクスのラベルにする文の種類（それ以外は other にまとめる）
+_STATEMENTS = frozenset({"select", "insert", "update", "delete", "with", "replace", "pragma", "begin", "commit", "rollback", "explain"})
+_SPACES = re.compile(r"\s+")
+
+
+def _record_query(conn: "InstrumentedConnection", sql: str, seconds: float, parameters=None) -> None:
+    """クエリの実行時間を記録し、しきい値以上の場合は遅いクエリとしてログに出す"""
+    words = sql.split(None, 1)
+    statement = words[0].lower() if words else "other"
+    if statement not in _STATEMENTS:
+        statement = "other"
+    db_query_seconds.observe(seconds, statement=statement)
+    if conn.slow_query_seconds is not None and seconds >= conn.slow_query_seconds:
+        db_slow_queries.inc(statement=statement)
+        slow_query_logger.warning(
+            "遅いクエリ (%.1fms): %s params=%s",
+            seconds * 1000, _SPACES.sub(" ", sql).strip()[:1000], repr(parameters)[:200]
+        )
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """execute / executemany の実行時間を記録するカーソル（SELECT は最初の行を取り出すまでの時間）"""
+
+    def execute(self, sql, parameters=()):
+        started_at = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(self.connection, sql, time.perf_counter() - started_at, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        started_at = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(self.connection, sql, time.perf_counter() - started_at)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """クエリとコミットの時間を記録する接続（接続プールが作成する）"""
+
+    # これ以上かかったクエリをログに出す秒数（Noneの場合はログに出さない）
+    slow_query_seconds: float | None = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute は C 実装のカーソルを直接使うので、計測するカーソル経由で実行する
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started_at = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            _record_query(self, "COMMIT", time.perf_counter() - started_at)
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """接続プールの接続がすべて使用中で、待ち時間内に返却されなかった"""
+
+
+class ConnectionPool:
+    """スレッドセーフな SQLite 接続プール"""
+
+    def __init__(
+            self,
+            path: str,
+            size: int = 8,
+            busy_timeout_ms: int = 5000,
+            synchronous: str = "NORMAL",
+            mmap_size: int = 0,
+            cache_size: int = -2000,
+            slow_query_ms: float | None = None,
+            acquire_timeout_seconds: float | None = 30.0
+        ) -> None:
+        self.path = path
+        self.size = size
+        # 接続の返却を待つ秒数（Noneの場合は無期限）
+        self.acquire_timeout_seconds = acquire_timeout_seconds
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.slow_query_ms = slow_query_ms
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """新しい接続を作成し、WAL モードと各種 PRAGMA を設定する"""
+        conn = sqlite3.connect(
+            self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False, factory=InstrumentedConnection
+        )
+        if self.slow_query_ms is not None:
+            conn.slow_query_seconds = self.slow_query_ms / 1000
+        # WAL にすると書き込み中でも読み込みがブロックされない
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        return conn
+
+    def acquire(self, timeout: float | None = None) -> sqlite3.Connection:
+        """
+        プールから接続を取り出す（空きがなく上限に達している場合は返却を待つ）
+
+        Args:
+            timeout: 返却を待つ秒数（Noneの場合はプールの acquire_timeout_seconds）
+
+        Returns:
+            sqlite3.Connection: 接続
+
+        Raises:
+            PoolTimeoutError: 待ち時間内に接続が返却されなかった場合
+        """
+        if timeout is None:
+            timeout = self.acquire_timeout_seconds
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("接続プールはクローズされています")
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                if len(self._connections) < self.size:
+                    conn = self._connect()
+                    self._connections.append(conn)
+                    return conn
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(f"接続プールから接続を取得できませんでした（{timeout}秒待機）")
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """接続をプールに返却する（コミットされていない変更はロールバックする）"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._closed:
+                conn.close()
+                return
+        self._idle.put(conn)
+
+    def close(self) -> None:
+        """プールのすべての接続をクローズする"""
+        with self._lock:
+            self._closed = True
+            connections = self._connections
+            self._connections = []
+        for conn in connections:
+            conn.close()
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """
+    現在の db_path に対応する接続プールを取得する（初回呼び出し時に作成）
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != db_path:
+            if _pool is not None:
+                _pool.close()
+            settings = Settings()
+            _pool = ConnectionPool(
+                db_path,
+                size=settings.sqlite_pool_size,
+                busy_timeout_ms=settings.sqlite_busy_timeout_ms,
+                synchronous=settings.sqlite_synchronous,
+                mmap_size=settings.sqlite_mmap_size,
+                cache_size=settings.sqlite_cache_size,
+                slow_query_ms=settings.db_slow_query_ms,
+                acquire_timeout_seconds=settings.sqlite_pool_timeout_seconds
+            )
+        return _pool
+
+def close_pool():
+    """接続プールをクローズする（FastAPI のシャットダウン時に呼び出す）"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 @contextmanager
 def get_connection():
     """
-    DB への接続を取得し、処理後に必ずクローズするコンテキストマネージャー
+    接続プールから DB 接続を取得し、処理後に必ずプールへ返却するコンテキストマネージャー
     """
-    conn = sqlite3.connect(db_path)
+    pool = get_pool()
+    conn = pool.acquire()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.release(conn)
+
+
+class DBExecutor:
+    """
+    sqlite3 の同期 API を専用スレッドプールで実行し、イベントループを塞がないようにする
+    読み取りは複数スレッドで並列に、書き込みは1スレッドで順に実行する
+    （SQLite の書き込みは同時に1つしか進まないため、書き込みのロック待ちで読み取りのスレッドを塞がない）
+    """
+
+    def __init__(self, read_workers: int = 4) -> None:
+        self.read_workers = read_workers
+        self._read_executor = None
+        self._write_executor = None
+        self._lock = threading.Lock()
+
+    def _executors(self) -> tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+        """スレッドプールを取得する（初回呼び出し時、またはシャットダウン後に作成）"""
+        with self._lock:
+            if self._read_executor is None:
+                self._read_executor = ThreadPoolExecutor(max_workers=self.read_workers, thread_name_prefix="db-read")
+                self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+            return self._read_executor, self._write_executor
+
+    async def read(self, func, *args, **kwargs):
+        """読み取りの関数を読み取り用のスレッドで実行し、結果を待つ"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executors()[0], functools.partial(func, *args, **kwargs))
+
+    async def write(self, func, *args, **kwargs):
+        """書き込みの関数を書き込み用のスレッドで実行し、結果を待つ"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executors()[1], functools.partial(func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        """実行中の処理の完了を待ってスレッドを止める（FastAPI のシャットダウン時に呼び出す）"""
+        with self._lock:
+            executors = [self._read_executor, self._write_executor]
+            self._read_executor = None
+            self._write_executor = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+
+# 接続プールの1接続は書き込み用に残す
+db_executor = DBExecutor(read_workers=max(1, Settings().sqlite_pool_size - 1))
+
 
 def init_db():
     # dbディレクトリが存在しない場合は作成
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    
+
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # テーブルがなければ作成（初回実行時）
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS bookmarks_category (
-            id INTEGER NOT NULL PRIMARY KEY,
-            categorize_name TEXT NOT NULL UNIQUE,
-            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            is_deleted INTEGER NOT NULL DEFAULT 0
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS bookmarks (
-            id TEXT NOT NULL PRIMARY KEY,
-            categorize_id INTEGER NOT NULL DEFAULT 0,
-            tweet TEXT NOT NULL,
-            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            is_deleted INTEGER NOT NULL DEFAULT 0,
-            FOREIGN KEY (categorize_id) REFERENCES bookmarks_category(id)
-        )
-    """)
+
+    # 未適用のマイグレーションを適用（初回実行時はテーブルを作成）
+    migrate(conn)
 
     conn.commit()
     print("DB作成完了")
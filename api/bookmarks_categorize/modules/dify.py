@@ -1,9 +1,11 @@
-import os
 import requests
 import json
-import ast
-from dotenv import load_dotenv
-import streamlit as st
+from .http_client import HTTPClient
+from .metrics import dify_request_seconds, time_call
+
+
+class DifyError(Exception):
+    """Dify のワークフロー実行の失敗"""
 
 
 class DifyModule:
@@ -11,14 +13,21 @@ class DifyModule:
     def __init__(
             self,
             dify_api_key_categorize_json: str,
-            dify_api_key_csv_to_json: str,
             dify_base_url: str,
-            dify_user: str
+            dify_user: str,
+            timeout: float = 120.0,
+            pool_maxsize: int = 10,
+            dify_api_key_categorize_json_batch: str | None = None,
+            client: HTTPClient | None = None
         ) -> None:
         self.dify_api_key_categorize_json = dify_api_key_categorize_json
-        self.dify_api_key_csv_to_json = dify_api_key_csv_to_json
+        # バッチ用ワークフローのキー（未設定の場合は1件ずつ分類するワークフローと共用）
+        self.dify_api_key_categorize_json_batch = dify_api_key_categorize_json_batch or dify_api_key_categorize_json
         self.dify_base_url = dify_base_url
         self.dify_user = dify_user
+        self.timeout = timeout
+        # 接続の使い回し・再試行・レート制限は HTTPClient に任せる
+        self.client = client or HTTPClient(timeout=timeout, pool_maxsize=pool_maxsize)
 
     def categorized_json(self, bookmark_json: str) -> str:
         '''xのブックマークのJsonファイルをカテゴリごとに分類'''
@@ -40,56 +49,36 @@ class DifyModule:
         }
 
         try:
-            response = requests.post(target_url, headers=headers, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            raise f"ワークフロー実行エラー: {str(e)}"
-            # st.error(f"ワークフロー実行エラー: {str(e)}")
-            # return None
-
-    def upload_file(self, file):
-        target_url = f"{self.dify_base_url}/files/upload"
-
-        headers = {
-            "Authorization": f"Bearer {self.dify_api_key_csv_to_json}",
-        }
-
-        try:
-            response = requests.post(
-                target_url,
-                headers=headers,
-                files={"file": (file.name, file.read(), file.type)},
-                data={"user": self.dify_user},
-            )
-
-            if response.status_code == 201:
+            with time_call(dify_request_seconds, workflow="single"):
+                response = self.client.post(target_url, headers=headers, json=payload, timeout=self.timeout)
+                response.raise_for_status()
                 return response.json()
-            else:
-                st.error(f"アップロードエラー: {response.status_code}")
-                return None
-
-        except Exception as e:
-            raise f"予期しないエラーが発生しました: {str(e)}"
-            # st.error(f"予期しないエラーが発生しました: {str(e)}")
-            # return None
-
-
-    def convert_csv_to_json(self, file_id: str) -> str:
-        '''xのブックマークのcsvファイルをJson形式に変換'''
+        except requests.exceptions.RequestException as e:
+            raise DifyError(f"ワークフロー実行エラー: {str(e)}") from e
+
+    @staticmethod
+    def extract_category(run_workflow_result: dict) -> str:
+        '''ワークフローの実行結果から分類項目を取り出す'''
+        categorized_bookmark_json = run_workflow_result["data"]["outputs"]["categorized_bookmark_json"]
+        return json.loads(categorized_bookmark_json)["分類項目"]
+
+    def categorized_json_batch(self, bookmark_json_list: list[str]) -> list[str | None]:
+        '''
+        複数のブックマークを1回のワークフロー実行でまとめて分類
+
+        ワークフローには JSON 配列として渡し、出力の categorized_bookmark_json には
+        [{"index": 0, "分類項目": "..."}, ...] の形式の配列を返してもらう。
+        結果を対応付けられなかったアイテムは None になる（呼び出し側で1件ずつ再分類する）
+        '''
         target_url = f"{self.dify_base_url}/workflows/run"
         headers = {
-            "Authorization": f"Bearer {self.dify_api_key_csv_to_json}",
+            "Authorization": f"Bearer {self.dify_api_key_categorize_json_batch}",
             "Content-Type": "application/json"
         }
 
         input = {
             # Dify ワークフローの入力フィールド名と一致させる
-            "bookmark_csv": {
-                "type": "document",
-                "transfer_method": "local_file",
-                "upload_file_id": file_id
-            }
+            "bookmark_json": "[" + ",".join(bookmark_json_list) + "]"
         }
 
         payload = {
@@ -98,45 +87,34 @@ class DifyModule:
             "user": self.dify_user
         }
 
+        # 1件あたりのタイムアウトを件数分確保する
         try:
-            response = requests.post(target_url, headers=headers, json=payload)
-            response.raise_for_status()
-            return response.json()
+            with time_call(dify_request_seconds, workflow="batch"):
+                response = self.client.post(
+                    target_url, headers=headers, json=payload, timeout=self.timeout * len(bookmark_json_list)
+                )
+                response.raise_for_status()
+                run_workflow_result = response.json()
         except requests.exceptions.RequestException as e:
-            raise f"ワークフロー実行エラー: {str(e)}"
-            # st.error(f"ワークフロー実行エラー: {str(e)}")
-            # return None
-
-
-    # def categorized_json(self, bookmark_json: str) -> str:
-    #     '''xのブックマークのJsonファイルをカテゴリごとに分類'''
-    #     target_url = f"{self.DIFY_BASE_URL}/workflows/run"
-    #     headers = {
-    #         "Authorization": f"Bearer {dify_api_key.categorize_json}",
-    #         "Content-Type": "application/json"
-    #     }
-
-    #     input = {
-    #         # Dify ワークフローの入力フィールド名と一致させる
-    #         "bookmark_json": bookmark_json
-    #     }
-
-    #     payload = {
-    #         "inputs": input,
-    #         "response_mode": "blocking",
-    #         "user": self.DIFY_USER
-    #     }
+            raise DifyError(f"バッチワークフロー実行エラー: {str(e)}") from e
+        return self.extract_batch_categories(run_workflow_result, len(bookmark_json_list))
 
-    #     try:
-    #         response = requests.post(target_url, headers=headers, json=payload)
-    #         response.raise_for_status()
-    #         return response.json()
-    #     except requests.exceptions.RequestException as e:
-    #         raise f"ワークフロー実行エラー: {str(e)}"
-    #         # st.error(f"ワークフロー実行エラー: {str(e)}")
-    #         # return None
-
-
-
-
-    
\ No newline at end of file
+    @staticmethod
+    def extract_batch_categories(run_workflow_result: dict, size: int) -> list[str | None]:
+        '''バッチ実行の結果から各アイテムの分類項目を取り出す（不正・欠落したアイテムは None）'''
+        categories = [None] * size
+        try:
+            outputs = json.loads(run_workflow_result["data"]["outputs"]["categorized_bookmark_json"])
+        except (KeyError, TypeError, ValueError):
+            return categories
+        if not isinstance(outputs, list):
+            return categories
+
+        for position, output in enumerate(outputs):
+            if not isinstance(output, dict) or not isinstance(output.get("分類項目"), str):
+                continue
+            # index がなければ配列の位置で対応付ける
+            index = output.get("index", position)
+            if isinstance(index, int) and 0 <= index < size and categories[index] is None:
+                categories[index] = output["分類項目"]
+        return categories
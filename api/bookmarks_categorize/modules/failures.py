@@ -0,0 +1,123 @@
+import hashlib
+import json
+from .database import get_connection
+from .tweet import extract_tweet_id
+
+# 同じツイートが再び失敗した場合は試行回数を増やし、最後のエラーで上書きする
+UPSERT_FAILURE_SQL = """
+    INSERT INTO categorize_failures (failure_key, tweet_id, tweet, error)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (failure_key) DO UPDATE SET
+        tweet = excluded.tweet,
+        error = excluded.error,
+        attempts = attempts + 1,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def format_error(error: BaseException) -> str:
+    """例外を保存用の文字列にする（ジョブのアイテムのエラーと同じ形式）"""
+    return f"{type(error).__name__}: {error}"
+
+def failure_key(tweet: dict) -> str:
+    """
+    デッドレターの重複判定に使うキー
+
+    Args:
+        tweet: ツイート内容の辞書
+
+    Returns:
+        str: ツイートID（取り出せない場合はツイート内容のハッシュ）
+    """
+    tweet_id = extract_tweet_id(tweet)
+    if tweet_id is not None:
+        return tweet_id
+    normalized = json.dumps(tweet, ensure_ascii=False, sort_keys=True)
+    return "sha256:" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def record_failures(failures: list[tuple[dict, str]]) -> int:
+    """
+    分類に失敗したブックマークをデッドレターに保存する（1トランザクション）
+
+    Args:
+        failures: (ツイート内容の辞書, エラー内容) のリスト
+
+    Returns:
+        int: 保存した件数
+    """
+    if not failures:
+        return 0
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.executemany(UPSERT_FAILURE_SQL, [
+                (failure_key(tweet), extract_tweet_id(tweet), json.dumps(tweet, ensure_ascii=False), error)
+                for tweet, error in failures
+            ])
+            conn.commit()
+            return len(failures)
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def get_failures(limit: int = None):
+    """
+    デッドレターのブックマークを古い順に取得する
+
+    Args:
+        limit: 取得する最大件数（Noneの場合は全件）
+
+    Returns:
+        list: 失敗したブックマークのリスト（tweet はツイート内容の辞書）
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, tweet_id, tweet, error, attempts, created_at, updated_at
+            FROM categorize_failures
+            ORDER BY id
+            LIMIT ?
+        """, (-1 if limit is None else limit,))
+        return [
+            {
+                "id": row[0],
+                "tweet_id": row[1],
+                "tweet": json.loads(row[2]),
+                "error": row[3],
+                "attempts": row[4],
+                "created_at": row[5],
+                "updated_at": row[6]
+            }
+            for row in cur.fetchall()
+        ]
+
+def count_failures() -> int:
+    """デッドレターの件数を取得する"""
+    with get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM categorize_failures").fetchone()[0]
+
+def resolve_failures(tweets: list[dict]) -> int:
+    """
+    分類に成功したツイートがデッドレターに残っていれば削除する
+    （以前に失敗したツイートを再アップロードして成功した場合）
+
+    Args:
+        tweets: ツイート内容の辞書のリスト
+
+    Returns:
+        int: 削除した件数
+    """
+    if not tweets:
+        return 0
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.executemany(
+                "DELETE FROM categorize_failures WHERE failure_key = ?",
+                [(failure_key(tweet),) for tweet in tweets]
+            )
+            conn.commit()
+            return cur.rowcount
+        except Exception as e:
+            conn.rollback()
+            raise e
@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+# 再試行するステータスコード（レート制限と一時的なサーバーエラー）
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# 冪等でないリクエストで再試行するステータスコード（処理されずに断られたことが分かるもの。503 は Retry-After がある場合だけ）
+NON_IDEMPOTENT_RETRY_STATUSES = frozenset({429, 503})
+
+
+class TokenBucket:
+    """
+    スレッドセーフなトークンバケット
+    rate 件/秒でトークンが補充され、最大 capacity 件まで連続で取り出せる
+    """
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        # レート制限の解除時刻（それまではトークンを払い出さない）
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        トークンを1つ取り出す（足りない場合は補充されるまで待つ）
+
+        Returns:
+            float: 待った秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float) -> None:
+        """レート制限に達した場合に、指定した秒数トークンの払い出しを止める"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class HTTPClient:
+    """
+    接続を使い回す HTTP クライアント（XModule と DifyModule で共用）
+    一時的なエラーは指数バックオフ（ジッター付き）で再試行し、Retry-After / x-rate-limit-reset に従って待つ
+    POST は冪等でないものとして扱い、処理されていないことが分かる場合（接続エラー、429、Retry-After 付きの 503）だけ再試行する
+    （Dify のワークフローは読み込みタイムアウトや 5xx の時点で実行済みのことがあり、再試行すると LLM を再実行してしまう）
+    """
+
+    def __init__(
+            self,
+            timeout: float = 30.0,
+            max_retries: int = 4,
+            backoff_base: float = 0.5,
+            backoff_max: float = 60.0,
+            rate_limit_per_second: float | None = None,
+            rate_limit_burst: int = 1,
+            pool_maxsize: int = 10
+        ) -> None:
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # None の場合は送信レートを制限しない
+        self.bucket = TokenBucket(rate_limit_per_second, rate_limit_burst) if rate_limit_per_second else None
+
+        # 並列実行時にコネクションを使い回せるようにセッションをプールする
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def max_elapsed_seconds(self, idempotent: bool = True) -> float:
+        """
+        再試行を含めた1リクエストの最大所要時間の目安（レート制限で待つ時間は含まない）
+
+        Args:
+            idempotent: タイムアウトを再試行するリクエストか（False の場合、タイムアウトするのは最後の1回だけ）
+        """
+        attempts = self.max_retries + 1 if idempotent else 1
+        return self.timeout * attempts + self.backoff_max * self.max_retries
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self._send(self.session.get, url, idempotent=True, **kwargs)
+
+    def post(self, url: str, idempotent: bool = False, **kwargs) -> requests.Response:
+        """POST を送信する（何度送っても結果が変わらない場合は idempotent=True でタイムアウト・5xx も再試行する）"""
+        return self._send(self.session.post, url, idempotent=idempotent, **kwargs)
+
+    def _send(self, send, url: str, idempotent: bool, **kwargs) -> requests.Response:
+        """
+        リクエストを送信し、一時的なエラーの場合は再試行する
+        再試行しても失敗した場合は最後のレスポンスを返す（接続エラーの場合は例外を送出する）
+        冪等でない場合は、相手に届いて処理された可能性のある読み込みタイムアウトと 5xx は再試行しない
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        retry_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout) if idempotent else requests.exceptions.ConnectionError
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                response = send(url, **kwargs)
+            except retry_errors:
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            wait = self.rate_limit_wait(response)
+            if not self.should_retry(response, wait, idempotent):
+                # 残り回数を使い切った場合は、次のリクエストを解除時刻まで待たせる
+                if wait is not None and self.bucket is not None:
+                    self.bucket.pause(wait)
+                return response
+            if attempt >= self.max_retries:
+                return response
+
+            if wait is None:
+                wait = self.backoff(attempt)
+            elif self.bucket is not None:
+                # 他のスレッドのリクエストも解除時刻まで止める
+                self.bucket.pause(wait)
+            time.sleep(wait)
+            attempt += 1
+
+    @staticmethod
+    def should_retry(response: requests.Response, wait: float | None, idempotent: bool) -> bool:
+        """レスポンスのステータスコードから再試行するかを判定する（wait は rate_limit_wait の結果）"""
+        if idempotent:
+            return response.status_code in RETRY_STATUSES
+        if response.status_code not in NON_IDEMPOTENT_RETRY_STATUSES:
+            return False
+        return response.status_code == 429 or wait is not None
+
+    def backoff(self, attempt: int) -> float:
+        """attempt 回目の再試行までの待ち時間（full jitter の指数バックオフ）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def rate_limit_wait(response: requests.Response) -> float | None:
+        """
+        レスポンスのヘッダーからレート制限の解除までの秒数を取得する
+
+        Returns:
+            float: 解除までの秒数（Retry-After、または残り回数が0の場合の x-rate-limit-reset）。指定がない場合はNone
+        """
+        headers = response.headers
+        retry_after = headers.get("Retry-After")
+        if isinstance(retry_after, str):
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+        reset = headers.get("x-rate-limit-reset")
+        remaining = headers.get("x-rate-limit-remaining")
+        if isinstance(reset, str) and (remaining == "0" or response.status_code == 429):
+            try:
+                return max(0.0, float(reset) - time.time())
+            except ValueError:
+                pass
+        return None
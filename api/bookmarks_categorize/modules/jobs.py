@@ -0,0 +1,480 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections.abc import Iterable
+from .database import get_connection, db_executor
+from .crud import bulk_insert_bookmarks
+from .categorizer import CategorizeEngine
+from .failures import format_error, record_failures, resolve_failures
+
+logger = logging.getLogger(__name__)
+
+# ジョブのステータス
+# アップロードを読み込みながらアイテムを登録している途中（読み込みが終わったら queued にする）
+JOB_UPLOADING = "uploading"
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+# ジョブの実行自体が例外で止まった（エラー内容を error に保存し、次回起動時に未処理のアイテムから再開する）
+JOB_FAILED = "failed"
+
+# アップロードから登録する場合に1トランザクションで追加するアイテム数
+JOB_ITEMS_CHUNK_SIZE = 1000
+
+# ジョブ内の各アイテムのステータス
+ITEM_PENDING = "pending"
+ITEM_DONE = "done"
+ITEM_FAILED = "failed"
+
+
+def create_job(bookmarks_json_list: Iterable[dict]) -> str:
+    """
+    分類ジョブを作成し、アイテムを未処理状態で登録する
+    イテレーターを渡した場合は読み込みながら登録するため、全件をメモリに載せずに済む
+
+    Args:
+        bookmarks_json_list: ツイート内容の辞書のリスト（またはイテレーター）
+
+    Returns:
+        str: ジョブID
+    """
+    job_id = str(uuid.uuid4())
+    total = 0
+
+    def job_items():
+        nonlocal total
+        for i, bookmark_json in enumerate(bookmarks_json_list):
+            total = i + 1
+            yield (job_id, i, json.dumps(bookmark_json, ensure_ascii=False))
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "INSERT INTO categorize_jobs (id, status, total) VALUES (?, ?, ?)",
+                (job_id, JOB_QUEUED, 0)
+            )
+            cur.executemany(
+                "INSERT INTO categorize_job_items (job_id, item_index, tweet) VALUES (?, ?, ?)",
+                job_items()
+            )
+            cur.execute("UPDATE categorize_jobs SET total = ? WHERE id = ?", (total, job_id))
+            conn.commit()
+            return job_id
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def open_job() -> str:
+    """
+    アイテムを少しずつ登録するジョブを作成する（append_job_items で登録し、queue_job で実行待ちにする）
+    アップロードの読み込み中は DB の書き込みを塞がないよう、短いトランザクションに分けて登録するために使う
+
+    Returns:
+        str: ジョブID
+    """
+    job_id = str(uuid.uuid4())
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "INSERT INTO categorize_jobs (id, status, total) VALUES (?, ?, ?)",
+                (job_id, JOB_UPLOADING, 0)
+            )
+            conn.commit()
+            return job_id
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def append_job_items(job_id: str, start_index: int, bookmarks_json_list: list[dict]) -> int:
+    """
+    ジョブにアイテムを未処理状態で追加する（1トランザクション）
+
+    Args:
+        job_id: ジョブID
+        start_index: 最初のアイテムのインデックス
+        bookmarks_json_list: ツイート内容の辞書のリスト
+
+    Returns:
+        int: 追加した件数
+    """
+    if not bookmarks_json_list:
+        return 0
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.executemany(
+                "INSERT INTO categorize_job_items (job_id, item_index, tweet) VALUES (?, ?, ?)",
+                [
+                    (job_id, start_index + i, json.dumps(bookmark_json, ensure_ascii=False))
+                    for i, bookmark_json in enumerate(bookmarks_json_list)
+                ]
+            )
+            cur.execute(
+                "UPDATE categorize_jobs SET total = total + ? WHERE id = ?",
+                (len(bookmarks_json_list), job_id)
+            )
+            conn.commit()
+            return len(bookmarks_json_list)
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def queue_job(job_id: str):
+    """アイテムの登録が終わったジョブを実行待ちにする"""
+    update_job_status(job_id, JOB_QUEUED)
+
+def delete_job(job_id: str):
+    """ジョブとそのアイテムを削除する（アップロードの読み込みに失敗した場合など）"""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM categorize_job_items WHERE job_id = ?", (job_id,))
+            cur.execute("DELETE FROM categorize_jobs WHERE id = ?", (job_id,))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def delete_uploading_jobs() -> list[str]:
+    """
+    アイテムの登録の途中で止まったジョブを削除する（登録中にサーバーが停止した場合）
+
+    Returns:
+        list: 削除したジョブIDのリスト
+    """
+    with get_connection() as conn:
+        job_ids = [
+            row[0] for row in conn.execute("SELECT id FROM categorize_jobs WHERE status = ?", (JOB_UPLOADING,))
+        ]
+    for job_id in job_ids:
+        delete_job(job_id)
+    return job_ids
+
+def get_job(job_id: str):
+    """
+    ジョブの状態と進捗を取得する
+
+    Args:
+        job_id: ジョブID
+
+    Returns:
+        dict: ジョブの状態（存在しない場合はNone）
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, status, total, summary, error, created_at, updated_at FROM categorize_jobs WHERE id = ?",
+            (job_id,)
+        )
+        row = cur.fetchone()
+        if row is None:
+            return None
+
+        cur.execute(
+            "SELECT status, COUNT(*) FROM categorize_job_items WHERE job_id = ? GROUP BY status",
+            (job_id,)
+        )
+        counts = dict(cur.fetchall())
+        return {
+            "id": row[0],
+            "status": row[1],
+            "total": row[2],
+            "done": counts.get(ITEM_DONE, 0),
+            "failed": counts.get(ITEM_FAILED, 0),
+            "summary": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6]
+        }
+
+def get_job_results(job_id: str):
+    """
+    ジョブ内で分類が完了したアイテムを取得する（ジョブ実行中は途中結果）
+
+    Args:
+        job_id: ジョブID
+
+    Returns:
+        list: 分類済みブックマークのリスト（入力順）
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT category, tweet
+            FROM categorize_job_items
+            WHERE job_id = ? AND status = ?
+            ORDER BY item_index
+        """, (job_id, ITEM_DONE))
+        return [
+            {"bookmark_category": row[0], "tweet_content": json.loads(row[1])}
+            for row in cur.fetchall()
+        ]
+
+def get_pending_items(job_id: str, after_index: int = -1, limit: int = None):
+    """
+    ジョブ内の未処理アイテムをインデックス順に取得する（after_index より後ろから limit 件ずつ読み進められる）
+
+    Args:
+        job_id: ジョブID
+        after_index: このインデックスより後ろのアイテムを取得する
+        limit: 取得する最大件数（Noneの場合は全件）
+
+    Returns:
+        list: (インデックス, ツイート内容の辞書) のリスト
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT item_index, tweet
+            FROM categorize_job_items
+            WHERE job_id = ? AND status = ? AND item_index > ?
+            ORDER BY item_index
+            LIMIT ?
+        """, (job_id, ITEM_PENDING, after_index, -1 if limit is None else limit))
+        return [(row[0], json.loads(row[1])) for row in cur.fetchall()]
+
+def get_unfinished_job_ids():
+    """
+    完了していないジョブ（実行が失敗したものを含む）のIDを取得する
+
+    Returns:
+        list: ジョブIDのリスト（作成順）
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id FROM categorize_jobs WHERE status IN (?, ?, ?) ORDER BY created_at",
+            (JOB_QUEUED, JOB_RUNNING, JOB_FAILED)
+        )
+        return [row[0] for row in cur.fetchall()]
+
+def update_job_status(job_id: str, status: str, summary: dict = None, error: str = None):
+    """
+    ジョブのステータスを更新する
+
+    Args:
+        job_id: ジョブID
+        status: ジョブのステータス
+        summary: 完了時の集計結果
+        error: 失敗時のエラー内容
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "UPDATE categorize_jobs SET status = ?, summary = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (status, json.dumps(summary, ensure_ascii=False) if summary is not None else None, error, job_id)
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def update_job_item(job_id: str, item_index: int, status: str, category: str = None, error: str = None):
+    """
+    ジョブ内のアイテムの処理結果を記録する
+
+    Args:
+        job_id: ジョブID
+        item_index: アイテムのインデックス
+        status: アイテムのステータス
+        category: 分類項目
+        error: 失敗時のエラー内容
+    """
+    update_job_items(job_id, [(item_index, status, category, error)])
+
+def update_job_items(job_id: str, items: list[tuple[int, str, str | None, str | None]]):
+    """
+    ジョブ内の複数のアイテムの処理結果をまとめて記録する（1トランザクション）
+
+    Args:
+        job_id: ジョブID
+        items: (インデックス, ステータス, 分類項目, エラー内容) のリスト
+    """
+    if not items:
+        return
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.executemany("""
+                UPDATE categorize_job_items
+                SET status = ?, category = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE job_id = ? AND item_index = ?
+            """, [(status, category, error, job_id, item_index) for item_index, status, category, error in items])
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def summarize_job(job_id: str) -> dict:
+    """
+    ジョブの集計結果（件数とカテゴリ別件数）を作成する
+
+    Args:
+        job_id: ジョブID
+
+    Returns:
+        dict: 集計結果
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT category, COUNT(*)
+            FROM categorize_job_items
+            WHERE job_id = ? AND status = ?
+            GROUP BY category
+            ORDER BY COUNT(*) DESC
+        """, (job_id, ITEM_DONE))
+        categories = dict(cur.fetchall())
+    job = get_job(job_id)
+    return {
+        "total": job["total"],
+        "done": job["done"],
+        "failed": job["failed"],
+        "categories": categories
+    }
+
+def save_job_results(job_id: str, succeeded: list[tuple[int, str, dict]], failed: list[tuple[int, str, dict]]):
+    """
+    ジョブ内のアイテムの分類結果をまとめて保存する
+    成功したものはブックマークとして保存し、失敗したものはデッドレターに保存してから、アイテムを処理済みにする
+    （間で止まっても、再開時に同じツイートのブックマークが更新されるだけで重複しない）
+
+    Args:
+        job_id: ジョブID
+        succeeded: (インデックス, 分類項目, ツイート内容の辞書, 分類の出所) のリスト
+        failed: (インデックス, エラー内容, ツイート内容の辞書) のリスト
+    """
+    if succeeded:
+        # 同じツイートIDのブックマークは新しいIDで挿入されず、既存の行が更新される
+        bulk_insert_bookmarks([(str(uuid.uuid4()), category, tweet, source) for _, category, tweet, source in succeeded])
+        resolve_failures([tweet for _, _, tweet, _ in succeeded])
+    if failed:
+        # 再分類のエンドポイントから再実行できるよう、デッドレターにも保存する
+        record_failures([(tweet, error) for _, error, tweet in failed])
+    update_job_items(
+        job_id,
+        [(item_index, ITEM_DONE, category, None) for item_index, category, _, _ in succeeded]
+        + [(item_index, ITEM_FAILED, None, error) for item_index, error, _ in failed]
+    )
+
+
+class JobRunner:
+    """分類ジョブをバックグラウンドで実行するランナー"""
+
+    def __init__(
+            self,
+            categorize_engine: CategorizeEngine,
+            page_size: int = 500,
+            commit_batch_size: int = 100,
+            commit_interval_seconds: float = 1.0
+        ) -> None:
+        self.categorize_engine = categorize_engine
+        # 未処理のアイテムを何件ずつ読み込むか（ジョブ全体をメモリに載せない）
+        self.page_size = page_size
+        # 分類結果をこの件数・秒数ごとにまとめて保存する
+        self.commit_batch_size = commit_batch_size
+        self.commit_interval_seconds = commit_interval_seconds
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def start(self, job_id: str) -> None:
+        """ジョブの実行を開始する（実行中の場合は何もしない）"""
+        if job_id in self._tasks:
+            return
+        task = asyncio.create_task(self.run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def resume(self) -> list[str]:
+        """
+        サーバー再起動前に完了していなかったジョブ（実行が失敗したものを含む）を再開する
+
+        Returns:
+            list: 再開したジョブIDのリスト
+        """
+        # アップロードの途中で止まったジョブは不完全なので、再開せずに削除する
+        delete_uploading_jobs()
+        job_ids = get_unfinished_job_ids()
+        for job_id in job_ids:
+            self.start(job_id)
+        return job_ids
+
+    async def run(self, job_id: str) -> None:
+        """
+        ジョブを実行する
+        途中で例外が発生した場合はジョブを失敗にしてエラー内容を保存する（保存済みのアイテムはそのまま残る）
+        停止（キャンセル）された場合は実行中のまま残し、次回起動時に再開する
+        """
+        try:
+            await self._run(job_id)
+        except Exception as e:
+            logger.exception("分類ジョブの実行に失敗しました: %s", job_id)
+            try:
+                await db_executor.write(update_job_status, job_id, JOB_FAILED, error=format_error(e))
+            except Exception:
+                logger.exception("分類ジョブの失敗を記録できませんでした: %s", job_id)
+
+    async def _run(self, job_id: str) -> None:
+        """
+        未処理のアイテムだけを少しずつ読み込んで分類し、完了したものをまとめて保存する
+        DB の読み書きは db_executor のスレッドで実行し、イベントループを塞がない
+        """
+        await db_executor.write(update_job_status, job_id, JOB_RUNNING)
+        # 分類中のアイテムのツイート内容（保存したものから取り除く）
+        tweets = {}
+        # まだ保存していない (インデックス, 分類項目, 分類の出所) と (インデックス, エラー内容)
+        succeeded = []
+        failed = []
+        pending_since = None
+
+        async def pending_items():
+            after_index = -1
+            while True:
+                page = await db_executor.read(get_pending_items, job_id, after_index, self.page_size)
+                if not page:
+                    return
+                for item_index, tweet in page:
+                    tweets[item_index] = tweet
+                    yield item_index, tweet
+                after_index = page[-1][0]
+
+        async def flush():
+            nonlocal succeeded, failed, pending_since
+            if succeeded or failed:
+                await db_executor.write(
+                    save_job_results,
+                    job_id,
+                    [(item_index, category, tweets[item_index], source) for item_index, category, source in succeeded],
+                    [(item_index, error, tweets[item_index]) for item_index, error in failed]
+                )
+            for item_index in [item[0] for item in succeeded + failed]:
+                del tweets[item_index]
+            succeeded = []
+            failed = []
+            pending_since = None
+
+        async for item_index, category, error, source in self.categorize_engine.categorize_as_completed(pending_items()):
+            if error is None:
+                succeeded.append((item_index, category, source))
+            else:
+                failed.append((item_index, format_error(error)))
+            if pending_since is None:
+                pending_since = time.perf_counter()
+            if (len(succeeded) + len(failed) >= self.commit_batch_size
+                    or time.perf_counter() - pending_since >= self.commit_interval_seconds):
+                await flush()
+        await flush()
+
+        summary = await db_executor.read(summarize_job, job_id)
+        await db_executor.write(update_job_status, job_id, JOB_COMPLETED, summary)
+
+    async def shutdown(self) -> None:
+        """実行中のジョブを停止する（未処理のアイテムは次回起動時に再開される）"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
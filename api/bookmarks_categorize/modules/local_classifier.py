@@ -0,0 +1,182 @@
+import json
+import threading
+from .database import get_connection
+from .crud import CATEGORY_SOURCE_LOCAL
+from .text_vectors import hashed_features, np
+
+# 分類に使うベクトルの次元数（カテゴリ数 × 次元数の行列を持つ）
+FEATURE_DIM = 2 ** 14
+# 前回 IDF を計算したときから文書数がこの割合だけ増えたら、IDF とすべての重心を作り直す
+# （それまでは IDF を固定し、追加があったカテゴリの重心だけを更新する）
+IDF_REFRESH_RATIO = 0.1
+
+
+class LocalClassifier:
+    """
+    分類済みのブックマークから作ったカテゴリごとの重心（TF-IDF、hashing trick）による最近傍重心分類器
+    十分に確信できる場合だけ分類項目を返し、それ以外は Dify に任せる
+
+    確信度は最も近いカテゴリと2番目に近いカテゴリのコサイン類似度の差で、threshold 以上の場合だけ採用する
+    """
+
+    def __init__(self, threshold: float = 0.1, min_similarity: float = 0.2, min_samples: int = 20, dim: int = FEATURE_DIM) -> None:
+        if np is None:
+            raise RuntimeError("ローカル分類には NumPy が必要です")
+        self.threshold = threshold
+        self.min_similarity = min_similarity
+        # 件数が少ないカテゴリの重心は当てにならないので、これ未満のカテゴリには分類しない
+        self.min_samples = min_samples
+        self.dim = dim
+        self.categories = []
+        self._category_index = {}
+        # カテゴリごとの出現頻度ベクトルの合計（IDF は分類時に掛ける）
+        self._sums = np.zeros((0, dim), dtype=np.float64)
+        self._samples = np.zeros(0, dtype=np.int64)
+        # 次元ごとの文書頻度と文書数（IDF の計算に使う）
+        self._document_frequency = np.zeros(dim, dtype=np.int64)
+        self._documents = 0
+        # IDF を掛けて正規化した重心（追加があったカテゴリの行だけ更新して使い回す）
+        self._centroids = None
+        self._idf = None
+        # IDF を計算したときの文書数と、その後に追加があったカテゴリの行
+        self._idf_documents = 0
+        self._dirty_rows = set()
+        self.ready = False
+        self.attempts = 0
+        self.local_hits = 0
+        self._lock = threading.Lock()
+
+    def add(self, tweet: dict, category: str) -> None:
+        """分類済みのブックマークを1件追加し、カテゴリの重心を更新する"""
+        indices, weights = hashed_features(tweet, self.dim)
+        if len(indices) == 0:
+            return
+        with self._lock:
+            self._add_features(indices, weights, category)
+
+    def _add_features(self, indices, weights, category: str) -> None:
+        row = self._category_index.get(category)
+        if row is None:
+            row = len(self.categories)
+            self.categories.append(category)
+            self._category_index[category] = row
+            self._sums = np.vstack([self._sums, np.zeros((1, self.dim), dtype=np.float64)])
+            self._samples = np.append(self._samples, 0)
+        self._sums[row, indices] += weights
+        self._samples[row] += 1
+        self._document_frequency[indices] += 1
+        self._documents += 1
+        self._dirty_rows.add(row)
+
+    def fit_from_db(self, batch_size: int = 1000) -> int:
+        """
+        DBの分類済みのブックマーク（主カテゴリ）から重心を作る
+        ローカル分類で付けたカテゴリは自分の予測なので学習に使わない
+
+        Returns:
+            int: 追加した件数
+        """
+        added = 0
+        with get_connection() as conn:
+            cur = conn.execute("""
+                SELECT c.categorize_name, b.tweet
+                FROM bookmarks b
+                JOIN bookmarks_category c ON b.categorize_id = c.id
+                WHERE b.is_deleted = 0 AND b.category_source IS NOT ?
+            """, (CATEGORY_SOURCE_LOCAL,))
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                # ベクトル化はロックの外で行い、分類を長く止めないようにする
+                features = []
+                for category, tweet in rows:
+                    try:
+                        indices, weights = hashed_features(json.loads(tweet), self.dim)
+                    except ValueError:
+                        continue
+                    if len(indices):
+                        features.append((indices, weights, category))
+                with self._lock:
+                    for indices, weights, category in features:
+                        self._add_features(indices, weights, category)
+                added += len(features)
+        self.ready = True
+        return added
+
+    def _prepare(self):
+        """
+        IDF を掛けて L2 正規化した重心の行列を返す
+        追加があったカテゴリの行だけを作り直し、文書数が IDF_REFRESH_RATIO 以上増えた場合は IDF ごとすべて作り直す
+        """
+        if self._centroids is None or self._documents > self._idf_documents * (1 + IDF_REFRESH_RATIO):
+            self._idf = (np.log((1 + self._documents) / (1 + self._document_frequency)) + 1).astype(np.float32)
+            self._idf_documents = self._documents
+            self._centroids = self._normalized_centroids(self._sums)
+        elif self._dirty_rows:
+            rows = sorted(self._dirty_rows)
+            if len(self.categories) > len(self._centroids):
+                added = len(self.categories) - len(self._centroids)
+                self._centroids = np.vstack([self._centroids, np.zeros((added, self.dim), dtype=np.float32)])
+            self._centroids[rows] = self._normalized_centroids(self._sums[rows])
+        self._dirty_rows.clear()
+        return self._centroids, self._idf
+
+    def _normalized_centroids(self, sums):
+        weighted = (sums * self._idf).astype(np.float32)
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return weighted / norms
+
+    def predict(self, tweet: dict) -> tuple[str, float] | None:
+        """
+        最も近いカテゴリと確信度を返す
+
+        Returns:
+            tuple: (分類項目, 確信度)。分類できるカテゴリがない場合はNone
+        """
+        indices, weights = hashed_features(tweet, self.dim)
+        if len(indices) == 0:
+            return None
+        with self._lock:
+            eligible = np.flatnonzero(self._samples >= self.min_samples)
+            if len(eligible) == 0:
+                return None
+            centroids, idf = self._prepare()
+            query = weights * idf[indices]
+            query /= np.linalg.norm(query)
+            # 疎なクエリと重心の内積（該当する次元の列だけを使う）
+            similarities = centroids[np.ix_(eligible, indices)] @ query
+        order = np.argsort(similarities)[::-1]
+        best = float(similarities[order[0]])
+        second = float(similarities[order[1]]) if len(order) > 1 else 0.0
+        if best < self.min_similarity:
+            return None
+        return self.categories[eligible[order[0]]], best - second
+
+    def classify(self, tweet: dict) -> str | None:
+        """
+        確信度がしきい値以上の場合だけ分類項目を返す（Dify に送る前に呼び出す）
+
+        Returns:
+            str: 分類項目（確信できない・準備ができていない場合はNone）
+        """
+        if not self.ready:
+            return None
+        self.attempts += 1
+        prediction = self.predict(tweet)
+        if prediction is None or prediction[1] < self.threshold:
+            return None
+        self.local_hits += 1
+        return prediction[0]
+
+    def stats(self) -> dict:
+        """ローカルで分類できた件数と割合"""
+        return {
+            "ready": self.ready,
+            "categories": len(self.categories),
+            "samples": self._documents,
+            "attempts": self.attempts,
+            "local_hits": self.local_hits,
+            "local_share": self.local_hits / self.attempts if self.attempts else 0.0
+        }
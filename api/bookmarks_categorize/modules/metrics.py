@@ -0,0 +1,239 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus の既定のバケット（秒）に、DB のクエリ向けの短いバケットを加えたもの
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """増える一方の値（ラベルの組み合わせごとに持つ）"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} のラベルは {self.labelnames} です: {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Counter):
+    """値の分布（バケットごとの累積件数・合計・件数）"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # バケットごとの件数（累積ではない）・合計・件数
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            # value 以上の最初のバケット（どれにも入らない場合は +Inf）
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """with ブロックの所要時間を記録する（例外で抜けた場合も記録する）"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスをまとめて Prometheus のテキスト形式で出力する"""
+
+    def __init__(self) -> None:
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"{metric.name} は登録済みです")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式（text/plain; version=0.0.4）"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """記録した値を消す（テスト用）"""
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+registry = MetricsRegistry()
+
+http_request_seconds = registry.histogram(
+    "bookmarks_http_request_duration_seconds", "API のリクエストの所要時間（ルートごと）", ("method", "route", "status")
+)
+stage_seconds = registry.histogram(
+    "bookmarks_stage_duration_seconds", "取り込みの処理段階ごとの所要時間（1リクエスト・1呼び出しあたり）", ("stage",)
+)
+stage_items = registry.counter(
+    "bookmarks_stage_items_total", "処理段階ごとに処理したブックマーク数", ("stage",)
+)
+dify_request_seconds = registry.histogram(
+    "bookmarks_dify_request_duration_seconds", "Dify のワークフロー実行の所要時間（再試行を含む）", ("workflow", "outcome")
+)
+x_request_seconds = registry.histogram(
+    "bookmarks_x_request_duration_seconds", "X API の呼び出しの所要時間（再試行を含む）", ("endpoint", "outcome")
+)
+db_query_seconds = registry.histogram(
+    "bookmarks_db_query_duration_seconds", "SQLite のクエリの実行時間（SELECT は最初の行まで）とコミットの時間", ("statement",)
+)
+db_slow_queries = registry.counter(
+    "bookmarks_db_slow_queries_total", "DB_SLOW_QUERY_MS 以上かかったクエリ数", ("statement",)
+)
+
+
+@contextmanager
+def time_stage(stage: str, items: int = 0):
+    """
+    処理段階の所要時間と件数を記録する
+
+    Args:
+        stage: 処理段階の名前（upload_parse, categorize, merge, db_bulk_insert など）
+        items: 処理したブックマーク数
+    """
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started_at, items)
+
+def observe_stage(stage: str, seconds: float, items: int = 0) -> None:
+    """with で囲めない処理段階（他の処理と交互に進むもの）の所要時間と件数を記録する"""
+    stage_seconds.observe(seconds, stage=stage)
+    if items:
+        stage_items.inc(items, stage=stage)
+
+@contextmanager
+def time_call(histogram: Histogram, **labels):
+    """外部 API の呼び出しの所要時間を、成功・失敗（outcome ラベル）に分けて記録する"""
+    started_at = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        histogram.observe(time.perf_counter() - started_at, outcome=outcome, **labels)
+
+
+class MetricsMiddleware:
+    """
+    ルートごとのレイテンシを記録する ASGI ミドルウェア
+    ラベルにはパスではなくルートのテンプレート（/bookmarks/{bookmark_id}/similar など）を使い、種類が増えすぎないようにする
+    ストリーミングのレスポンスは本文を送り終えるまでの時間を記録する
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # ルーティングで scope に一致したルートが入る（一致しない場合は unmatched）
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started_at,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status)
+            )
@@ -0,0 +1,504 @@
+import json
+import sqlite3
+from .tweet import extract_tweet_id, extract_tweet_fields, url_domain
+
+# スキーマのバージョンは PRAGMA user_version で管理する。
+# スキーマを変更する場合は init_db を直接編集せず、末尾にマイグレーション関数を追加すること
+# （リストの位置 + 1 がそのマイグレーションのバージョンになる）
+
+# 主カテゴリをカテゴリの1つとして付けるトリガー
+# UPSERT（ON CONFLICT DO UPDATE）から呼ばれると外側の文の競合の扱いが INSERT OR IGNORE より優先され、
+# 既に付いているカテゴリで UNIQUE 制約違反になるため、NOT EXISTS で既存の組み合わせを除いて挿入する
+# 全文検索の索引に入れる値（{t} は "new." などの接頭辞）
+# 本文と投稿者は保存時に tweet.extract_tweet_fields で取り出した列を使い、一覧の絞り込みと同じ規則にする（表示名は列がないので JSON から取り出す）
+BOOKMARKS_FTS_VALUES = """
+    coalesce({t}tweet_text, ''),
+    coalesce({t}screen_name, ''),
+    coalesce(json_extract({t}tweet, '$.name'), json_extract({t}tweet, '$.user.name'), '')
+"""
+
+BOOKMARKS_CATEGORY_AI_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS bookmarks_category_ai AFTER INSERT ON bookmarks
+    WHEN new.categorize_id IS NOT NULL BEGIN
+        INSERT INTO bookmark_categories (bookmark_id, category_id)
+        SELECT new.id, new.categorize_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM bookmark_categories WHERE bookmark_id = new.id AND category_id = new.categorize_id
+        );
+        INSERT INTO category_counts (category_id, bookmark_count) VALUES (new.categorize_id, new.is_deleted = 0)
+        ON CONFLICT (category_id) DO UPDATE SET bookmark_count = bookmark_count + excluded.bookmark_count;
+    END
+"""
+BOOKMARKS_CATEGORY_MOVED_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS bookmarks_category_moved AFTER UPDATE OF categorize_id ON bookmarks
+    WHEN old.categorize_id IS NOT new.categorize_id BEGIN
+        DELETE FROM bookmark_categories WHERE bookmark_id = old.id AND category_id = old.categorize_id;
+        INSERT INTO bookmark_categories (bookmark_id, category_id)
+        SELECT new.id, new.categorize_id
+        WHERE new.categorize_id IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM bookmark_categories WHERE bookmark_id = new.id AND category_id = new.categorize_id
+        );
+    END
+"""
+
+
+def _v1_create_tables(cur: sqlite3.Cursor):
+    """初期テーブルを作成する（マイグレーション導入前に作成されたDBにも適用できるよう IF NOT EXISTS を付ける）"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bookmarks_category (
+            id INTEGER NOT NULL PRIMARY KEY,
+            categorize_name TEXT NOT NULL UNIQUE,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            is_deleted INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bookmarks (
+            id TEXT NOT NULL PRIMARY KEY,
+            categorize_id INTEGER NOT NULL DEFAULT 0,
+            tweet TEXT NOT NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            is_deleted INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (categorize_id) REFERENCES bookmarks_category(id)
+        )
+    """)
+
+    # 分類ジョブ（バックグラウンド実行の進捗を再起動後も引き継ぐ）
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS categorize_jobs (
+            id TEXT NOT NULL PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'queued',
+            total INTEGER NOT NULL DEFAULT 0,
+            summary TEXT,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS categorize_job_items (
+            job_id TEXT NOT NULL,
+            item_index INTEGER NOT NULL,
+            tweet TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            category TEXT,
+            error TEXT,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job_id, item_index),
+            FOREIGN KEY (job_id) REFERENCES categorize_jobs(id)
+        )
+    """)
+
+def _v2_add_list_indexes(cur: sqlite3.Cursor):
+    """一覧取得クエリの絞り込み・並び替えに使うインデックスを追加する"""
+    # カテゴリ別一覧: WHERE categorize_id = ? AND is_deleted = 0 ORDER BY created_at DESC
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookmarks_category_created
+        ON bookmarks (categorize_id, is_deleted, created_at)
+    """)
+    # 全件一覧: WHERE is_deleted = 0 ORDER BY created_at DESC
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookmarks_deleted_created
+        ON bookmarks (is_deleted, created_at)
+    """)
+    # カテゴリ一覧: WHERE is_deleted = 0 ORDER BY created_at DESC（id, 名前まで含めたカバリングインデックス）
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookmarks_category_deleted_created
+        ON bookmarks_category (is_deleted, created_at, id, categorize_name)
+    """)
+    # 再開時の未完了ジョブ検索
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_categorize_jobs_status
+        ON categorize_jobs (status, created_at)
+    """)
+
+def _v3_add_keyset_indexes(cur: sqlite3.Cursor):
+    """キーセットページネーション（created_at, id の降順）用にインデックスを id まで含めたものに置き換える"""
+    cur.execute("DROP INDEX IF EXISTS idx_bookmarks_category_created")
+    cur.execute("DROP INDEX IF EXISTS idx_bookmarks_deleted_created")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookmarks_category_created_id
+        ON bookmarks (categorize_id, is_deleted, created_at, id)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookmarks_deleted_created_id
+        ON bookmarks (is_deleted, created_at, id)
+    """)
+
+def _v4_add_search_index(cur: sqlite3.Cursor):
+    """ツイート本文と投稿者を全文検索する FTS5 テーブルと、bookmarks との同期トリガーを追加する"""
+    # 日本語は空白で単語が区切られないため trigram トークナイザを使う
+    cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_fts
+        USING fts5(text, screen_name, name, tokenize = 'trigram')
+    """)
+    values = """
+        coalesce(json_extract({t}, '$.note_tweet_text'), json_extract({t}, '$.full_text'), json_extract({t}, '$.text'), ''),
+        coalesce(json_extract({t}, '$.screen_name'), json_extract({t}, '$.user.screen_name'), ''),
+        coalesce(json_extract({t}, '$.name'), json_extract({t}, '$.user.name'), '')
+    """
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ai AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts (rowid, text, screen_name, name)
+            VALUES (new.rowid, {values.format(t="new.tweet")});
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ad AFTER DELETE ON bookmarks BEGIN
+            DELETE FROM bookmarks_fts WHERE rowid = old.rowid;
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_au AFTER UPDATE OF tweet ON bookmarks BEGIN
+            DELETE FROM bookmarks_fts WHERE rowid = old.rowid;
+            INSERT INTO bookmarks_fts (rowid, text, screen_name, name)
+            VALUES (new.rowid, {values.format(t="new.tweet")});
+        END
+    """)
+    # 既存のブックマークを索引に登録する
+    cur.execute(f"""
+        INSERT INTO bookmarks_fts (rowid, text, screen_name, name)
+        SELECT rowid, {values.format(t="tweet")} FROM bookmarks
+    """)
+
+def _v5_add_x_sync_tables(cur: sqlite3.Cursor):
+    """X のブックマーク同期の状態（ユーザーごとの最新位置と取り込み済みのツイートID）を保存するテーブルを追加する"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS x_sync_state (
+            user_id TEXT NOT NULL PRIMARY KEY,
+            newest_tweet_id TEXT,
+            synced_count INTEGER NOT NULL DEFAULT 0,
+            last_synced_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS x_synced_tweets (
+            user_id TEXT NOT NULL,
+            tweet_id TEXT NOT NULL,
+            job_id TEXT,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, tweet_id)
+        ) WITHOUT ROWID
+    """)
+
+def _v6_dedupe_by_tweet_id(cur: sqlite3.Cursor):
+    """
+    ブックマークにツイートIDの列を追加し、同じツイートの重複を最新の1件にまとめてから一意インデックスを張る
+    （ツイートIDを取り出せないブックマークは NULL のまま残す）
+    """
+    cur.execute("ALTER TABLE bookmarks ADD COLUMN tweet_id TEXT")
+
+    reader = cur.connection.cursor()
+    reader.execute("SELECT rowid, tweet FROM bookmarks")
+    updates = []
+    while True:
+        rows = reader.fetchmany(1000)
+        if not rows:
+            break
+        for rowid, tweet in rows:
+            try:
+                tweet_id = extract_tweet_id(json.loads(tweet))
+            except ValueError:
+                continue
+            if tweet_id is not None:
+                updates.append((tweet_id, rowid))
+    cur.executemany("UPDATE bookmarks SET tweet_id = ? WHERE rowid = ?", updates)
+
+    # 削除されていないもの、その中で最後に保存されたものを残す
+    cur.execute("""
+        DELETE FROM bookmarks
+        WHERE rowid IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (
+                    PARTITION BY tweet_id ORDER BY is_deleted, created_at DESC, rowid DESC
+                ) AS position
+                FROM bookmarks
+                WHERE tweet_id IS NOT NULL
+            )
+            WHERE position > 1
+        )
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bookmarks_tweet_id ON bookmarks (tweet_id)")
+
+def _v7_add_tweet_columns(cur: sqlite3.Cursor):
+    """
+    投稿者・本文・投稿日時・メディアの有無の列と URL のテーブルを追加し、既存のブックマークから値を埋める
+    （JSON をデコードせずに SQL で絞り込めるようにする。元の JSON は tweet 列にそのまま残す）
+    """
+    cur.execute("ALTER TABLE bookmarks ADD COLUMN screen_name TEXT COLLATE NOCASE")
+    cur.execute("ALTER TABLE bookmarks ADD COLUMN tweet_text TEXT")
+    cur.execute("ALTER TABLE bookmarks ADD COLUMN tweeted_at DATETIME")
+    cur.execute("ALTER TABLE bookmarks ADD COLUMN has_media INTEGER NOT NULL DEFAULT 0")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bookmark_urls (
+            bookmark_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            PRIMARY KEY (bookmark_id, url),
+            FOREIGN KEY (bookmark_id) REFERENCES bookmarks(id)
+        ) WITHOUT ROWID
+    """)
+    # ブックマークを物理削除した場合は URL も消す
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookmark_urls_ad AFTER DELETE ON bookmarks BEGIN
+            DELETE FROM bookmark_urls WHERE bookmark_id = old.id;
+        END
+    """)
+
+    reader = cur.connection.cursor()
+    reader.execute("SELECT id, tweet FROM bookmarks")
+    while True:
+        rows = reader.fetchmany(1000)
+        if not rows:
+            break
+        updates = []
+        urls = []
+        for bookmark_id, tweet in rows:
+            try:
+                fields = extract_tweet_fields(json.loads(tweet))
+            except ValueError:
+                continue
+            updates.append((
+                fields["screen_name"], fields["tweet_text"], fields["tweeted_at"], int(fields["has_media"]), bookmark_id
+            ))
+            urls.extend((bookmark_id, url, url_domain(url)) for url in fields["urls"])
+        cur.executemany(
+            "UPDATE bookmarks SET screen_name = ?, tweet_text = ?, tweeted_at = ?, has_media = ? WHERE id = ?",
+            updates
+        )
+        cur.executemany("INSERT OR IGNORE INTO bookmark_urls (bookmark_id, url, domain) VALUES (?, ?, ?)", urls)
+
+    # 投稿者別の一覧: WHERE screen_name = ? AND is_deleted = 0 ORDER BY created_at DESC, id DESC
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookmarks_screen_name_created_id
+        ON bookmarks (screen_name, is_deleted, created_at, id)
+    """)
+    # 投稿日時の範囲での絞り込み
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_tweeted_at ON bookmarks (is_deleted, tweeted_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookmark_urls_domain ON bookmark_urls (domain, bookmark_id)")
+
+def _v8_add_category_labels(cur: sqlite3.Cursor):
+    """
+    ブックマークに複数のカテゴリを付けられるようにし、カテゴリに親カテゴリを追加する
+    カテゴリごとの件数は category_counts にトリガーで増減させ、件数の取得でブックマークを数えずに済むようにする
+    （bookmark_count は bookmarks.categorize_id（主カテゴリ）、label_count は bookmark_categories の件数。どちらも論理削除分を除く）
+    """
+    cur.execute("ALTER TABLE bookmarks_category ADD COLUMN parent_id INTEGER REFERENCES bookmarks_category(id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_category_parent ON bookmarks_category (parent_id)")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bookmark_categories (
+            bookmark_id TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            PRIMARY KEY (bookmark_id, category_id),
+            FOREIGN KEY (bookmark_id) REFERENCES bookmarks(id),
+            FOREIGN KEY (category_id) REFERENCES bookmarks_category(id)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookmark_categories_category ON bookmark_categories (category_id, bookmark_id)")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS category_counts (
+            category_id INTEGER NOT NULL PRIMARY KEY,
+            bookmark_count INTEGER NOT NULL DEFAULT 0,
+            label_count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (category_id) REFERENCES bookmarks_category(id)
+        )
+    """)
+
+    # 主カテゴリは常にカテゴリの1つとして付ける
+    cur.execute("""
+        INSERT INTO bookmark_categories (bookmark_id, category_id)
+        SELECT id, categorize_id FROM bookmarks WHERE categorize_id IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """)
+    cur.execute("""
+        INSERT INTO category_counts (category_id, bookmark_count, label_count)
+        SELECT c.id,
+            (SELECT COUNT(*) FROM bookmarks b WHERE b.categorize_id = c.id AND b.is_deleted = 0),
+            (SELECT COUNT(*) FROM bookmark_categories bc JOIN bookmarks b ON b.id = bc.bookmark_id
+             WHERE bc.category_id = c.id AND b.is_deleted = 0)
+        FROM bookmarks_category c
+    """)
+
+    # 主カテゴリの付け替えと件数（bookmark_count）
+    cur.execute(BOOKMARKS_CATEGORY_AI_TRIGGER)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookmarks_category_au AFTER UPDATE OF categorize_id, is_deleted ON bookmarks
+        WHEN old.categorize_id IS NOT new.categorize_id OR old.is_deleted != new.is_deleted BEGIN
+            UPDATE category_counts SET bookmark_count = bookmark_count - 1
+            WHERE category_id = old.categorize_id AND old.is_deleted = 0;
+            INSERT INTO category_counts (category_id, bookmark_count)
+            SELECT new.categorize_id, new.is_deleted = 0 WHERE new.categorize_id IS NOT NULL
+            ON CONFLICT (category_id) DO UPDATE SET bookmark_count = bookmark_count + excluded.bookmark_count;
+        END
+    """)
+    cur.execute(BOOKMARKS_CATEGORY_MOVED_TRIGGER)
+
+    # カテゴリの付け外しと件数（label_count）
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookmark_categories_ai AFTER INSERT ON bookmark_categories BEGIN
+            INSERT INTO category_counts (category_id, label_count)
+            SELECT new.category_id, 1 FROM bookmarks WHERE id = new.bookmark_id AND is_deleted = 0
+            ON CONFLICT (category_id) DO UPDATE SET label_count = label_count + 1;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookmark_categories_ad AFTER DELETE ON bookmark_categories BEGIN
+            UPDATE category_counts SET label_count = label_count - 1
+            WHERE category_id = old.category_id
+            AND EXISTS (SELECT 1 FROM bookmarks WHERE id = old.bookmark_id AND is_deleted = 0);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookmarks_labels_deleted AFTER UPDATE OF is_deleted ON bookmarks
+        WHEN old.is_deleted != new.is_deleted BEGIN
+            UPDATE category_counts SET label_count = label_count + (CASE WHEN new.is_deleted = 0 THEN 1 ELSE -1 END)
+            WHERE category_id IN (SELECT category_id FROM bookmark_categories WHERE bookmark_id = new.id);
+        END
+    """)
+    # 物理削除の場合は、ブックマークが消えた後に bookmark_categories_ad が減らせないのでここで減らす
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookmarks_category_ad AFTER DELETE ON bookmarks BEGIN
+            UPDATE category_counts SET bookmark_count = bookmark_count - 1
+            WHERE category_id = old.categorize_id AND old.is_deleted = 0;
+            UPDATE category_counts SET label_count = label_count - 1
+            WHERE old.is_deleted = 0
+            AND category_id IN (SELECT category_id FROM bookmark_categories WHERE bookmark_id = old.id);
+            DELETE FROM bookmark_categories WHERE bookmark_id = old.id;
+        END
+    """)
+
+def _v9_add_categorize_failures(cur: sqlite3.Cursor):
+    """
+    分類に失敗したブックマークを保存するテーブル（デッドレター）を追加する
+    同じツイートが再び失敗した場合は行を増やさず、attempts を増やして最後のエラーで上書きする
+    （failure_key はツイートID、取り出せない場合はツイート内容のハッシュ）
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS categorize_failures (
+            id INTEGER NOT NULL PRIMARY KEY,
+            failure_key TEXT NOT NULL UNIQUE,
+            tweet_id TEXT,
+            tweet TEXT NOT NULL,
+            error TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 1,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _v10_fix_category_triggers(cur: sqlite3.Cursor):
+    """
+    v8 で作成した主カテゴリのトリガーを作り直す
+    （ブックマークの UPSERT で、追加のカテゴリとして付いているカテゴリに主カテゴリを変えると UNIQUE 制約違反になっていた）
+    """
+    cur.execute("DROP TRIGGER IF EXISTS bookmarks_category_ai")
+    cur.execute("DROP TRIGGER IF EXISTS bookmarks_category_moved")
+    cur.execute(BOOKMARKS_CATEGORY_AI_TRIGGER)
+    cur.execute(BOOKMARKS_CATEGORY_MOVED_TRIGGER)
+
+def _v11_add_job_error(cur: sqlite3.Cursor):
+    """分類ジョブの実行自体が失敗した場合のエラー内容を保存する列を追加する"""
+    cur.execute("ALTER TABLE categorize_jobs ADD COLUMN error TEXT")
+
+def _v12_add_category_source(cur: sqlite3.Cursor):
+    """
+    主カテゴリをどこで分類したか（'dify' / 'local'）を保存する列を追加する
+    ローカル分類の学習に自分の予測を混ぜないために使う（既存の行は不明なので NULL のまま）
+    """
+    cur.execute("ALTER TABLE bookmarks ADD COLUMN category_source TEXT")
+
+def _v13_add_job_item_status_index(cur: sqlite3.Cursor):
+    """
+    ジョブの進捗（ステータスごとの件数）の集計に使うインデックスを追加する
+    ポーリングのたびに実行されるため、アイテムを読まずにインデックスだけで数える。未処理・完了アイテムの順番の読み出しにも使う
+    """
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_categorize_job_items_status
+        ON categorize_job_items (job_id, status, item_index)
+    """)
+
+def _v14_index_normalized_tweet_columns(cur: sqlite3.Cursor):
+    """
+    全文検索の索引の本文と投稿者を、JSON からの独自の抽出ではなく保存済みの tweet_text・screen_name 列から作り直す
+    （username だけのツイートなどで、全文検索と screen_name の絞り込みの結果が食い違わないようにする）
+    """
+    cur.execute("DROP TRIGGER IF EXISTS bookmarks_fts_ai")
+    cur.execute("DROP TRIGGER IF EXISTS bookmarks_fts_au")
+    cur.execute(f"""
+        CREATE TRIGGER bookmarks_fts_ai AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts (rowid, text, screen_name, name)
+            VALUES (new.rowid, {BOOKMARKS_FTS_VALUES.format(t="new.")});
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER bookmarks_fts_au AFTER UPDATE OF tweet, tweet_text, screen_name ON bookmarks BEGIN
+            DELETE FROM bookmarks_fts WHERE rowid = old.rowid;
+            INSERT INTO bookmarks_fts (rowid, text, screen_name, name)
+            VALUES (new.rowid, {BOOKMARKS_FTS_VALUES.format(t="new.")});
+        END
+    """)
+    cur.execute("DELETE FROM bookmarks_fts")
+    cur.execute(f"""
+        INSERT INTO bookmarks_fts (rowid, text, screen_name, name)
+        SELECT rowid, {BOOKMARKS_FTS_VALUES.format(t="")} FROM bookmarks
+    """)
+
+
+MIGRATIONS = [
+    _v1_create_tables,
+    _v2_add_list_indexes,
+    _v3_add_keyset_indexes,
+    _v4_add_search_index,
+    _v5_add_x_sync_tables,
+    _v6_dedupe_by_tweet_id,
+    _v7_add_tweet_columns,
+    _v8_add_category_labels,
+    _v9_add_categorize_failures,
+    _v10_fix_category_triggers,
+    _v11_add_job_error,
+    _v12_add_category_source,
+    _v13_add_job_item_status_index,
+    _v14_index_normalized_tweet_columns,
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """
+    DBのスキーマバージョンを取得する
+
+    Returns:
+        int: 適用済みのマイグレーションのバージョン（未適用の場合は0）
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> list[int]:
+    """
+    未適用のマイグレーションを順番に適用する
+    マイグレーションごとに1トランザクションで適用し、バージョンを更新する
+
+    Args:
+        conn: DB接続
+
+    Returns:
+        list: 適用したマイグレーションのバージョンのリスト
+    """
+    applied = []
+    current_version = get_schema_version(conn)
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if version <= current_version:
+            continue
+        cur = conn.cursor()
+        try:
+            # DDL もロールバックできるよう明示的にトランザクションを開始する
+            cur.execute("BEGIN")
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        applied.append(version)
+    return applied
@@ -0,0 +1,122 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class DataVersion:
+    """
+    ブックマーク・カテゴリの書き込みごとに増えるカウンター
+    読み取りキャッシュと ETag はこの値が変わるまで同じ結果を返してよいとみなす
+    """
+
+    def __init__(self) -> None:
+        self._value = 0
+        # プロセスを再起動してカウンターが0に戻っても、以前の ETag と一致しないようにする
+        self._epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def bump(self) -> int:
+        """書き込みをコミットした後に呼び出す"""
+        with self._lock:
+            self._value += 1
+            return self._value
+
+    def etag(self, key: str = "") -> str:
+        """
+        現在のデータに対する ETag を返す
+
+        Args:
+            key: レスポンスの種類（一覧とカテゴリなどで ETag を区別する）
+        """
+        return f'W/"{self._epoch}-{self._value}-{key}"'
+
+
+class ReadCache:
+    """
+    crud の読み取り結果を保持する LRU キャッシュ
+    データのバージョンが変わったエントリは使わず、ttl_seconds を過ぎたエントリも読み直す
+    （別のプロセスから書き込まれた場合に古い結果を返し続けないようにする）
+    """
+
+    def __init__(self, data_version: DataVersion, max_entries: int = 256, ttl_seconds: float | None = 60.0) -> None:
+        self.data_version = data_version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: tuple, loader):
+        """
+        キャッシュされた結果を返す（ない場合は loader を呼び出して保存する）
+
+        Args:
+            key: 関数名と引数のタプル
+            loader: 引数なしで結果を返す関数
+
+        Returns:
+            loader の結果（呼び出し側で変更しないこと）
+        """
+        found, value, version, now = self._lookup(key)
+        if found:
+            return value
+        # DB の読み取り中はロックを持たない（同じキーを同時に読み込んでも結果は同じ）
+        value = loader()
+        self._store(key, value, version, now)
+        return value
+
+    async def aget_or_load(self, key: tuple, loader):
+        """
+        get_or_load の非同期版（loader は引数なしのコルーチン関数）
+        キャッシュにある場合は DB のスレッドに切り替えずにそのまま返す
+        """
+        found, value, version, now = self._lookup(key)
+        if found:
+            return value
+        value = await loader()
+        self._store(key, value, version, now)
+        return value
+
+    def _lookup(self, key: tuple) -> tuple[bool, object, int, float]:
+        """(見つかったか, 値, 読み込み前のバージョン, 現在時刻) を返す"""
+        version = self.data_version.value
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, loaded_at, value = entry
+                if entry_version == version and (self.ttl_seconds is None or now - loaded_at < self.ttl_seconds):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value, version, now
+                del self._entries[key]
+            self.misses += 1
+        return False, None, version, now
+
+    def _store(self, key: tuple, value, version: int, now: float) -> None:
+        with self._lock:
+            # 読み込み中に書き込まれた場合は、古いかもしれない結果を保存しない
+            if self.data_version.value == version:
+                self._entries[key] = (version, now, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """ヒット・ミス数とエントリ数"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+# ブックマーク・カテゴリを書き込む関数（crud）が更新する
+data_version = DataVersion()
@@ -0,0 +1,114 @@
+import json
+import sys
+from .database import get_connection, init_db
+from .crud import build_filter_conditions
+from .migrations import BOOKMARKS_FTS_VALUES
+
+# trigram トークナイザは3文字未満の語を索引から引けないため、短い語は LIKE で絞り込む
+MIN_MATCH_TERM_LENGTH = 3
+
+# bookmarks から検索対象の列を取り出す式（マイグレーションのトリガーと同じ）
+FTS_VALUES_SQL = BOOKMARKS_FTS_VALUES.format(t="")
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_bookmarks(query: str, category_id: int = None, limit: int = 20, offset: int = 0, **filters):
+    """
+    ツイート本文と投稿者（スクリーンネーム・表示名）を全文検索する
+    空白区切りの語はすべてを含むもの（AND）に絞り込み、関連度（bm25）順に返す
+
+    Args:
+        query: 検索語
+        category_id: カテゴリID（Noneの場合は全カテゴリ）
+        limit: 1ページの件数
+        offset: 取得開始位置
+        filters: crud.build_filter_conditions の絞り込み条件
+
+    Returns:
+        tuple: (ブックマークのリスト, 次のページの開始位置（最終ページの場合はNone）)
+    """
+    terms = query.split()
+    if not terms:
+        return [], None
+
+    match_terms = [term for term in terms if len(term) >= MIN_MATCH_TERM_LENGTH]
+    like_terms = [term for term in terms if len(term) < MIN_MATCH_TERM_LENGTH]
+
+    conditions = ["b.is_deleted = 0"]
+    params = []
+    if match_terms:
+        conditions.append("bookmarks_fts MATCH ?")
+        # 各語をフレーズとして扱い、FTS5 の構文として解釈されないようにする
+        params.append(" AND ".join('"' + term.replace('"', '""') + '"' for term in match_terms))
+    for term in like_terms:
+        conditions.append(
+            "(f.text LIKE ? ESCAPE '\\' OR f.screen_name LIKE ? ESCAPE '\\' OR f.name LIKE ? ESCAPE '\\')"
+        )
+        params.extend([f"%{_escape_like(term)}%"] * 3)
+    if category_id is not None:
+        conditions.append("b.categorize_id = ?")
+        params.append(category_id)
+    filter_conditions, filter_params = build_filter_conditions(**filters)
+    conditions.extend(filter_conditions)
+    params.extend(filter_params)
+    order_by = "f.rank" if match_terms else "b.created_at DESC, b.id DESC"
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # 次のページの有無を判定するため1件多く取得する
+        cur.execute(f"""
+            SELECT b.id, c.categorize_name, b.tweet, b.created_at
+            FROM bookmarks_fts f
+            JOIN bookmarks b ON b.rowid = f.rowid
+            JOIN bookmarks_category c ON b.categorize_id = c.id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {order_by}
+            LIMIT ? OFFSET ?
+        """, (*params, limit + 1, offset))
+        rows = cur.fetchall()
+
+    bookmarks = [
+        {
+            "id": row[0],
+            "category": row[1],
+            "tweet": json.loads(row[2]),
+            "created_at": row[3]
+        }
+        for row in rows[:limit]
+    ]
+    next_offset = offset + limit if len(rows) > limit else None
+    return bookmarks, next_offset
+
+def rebuild_search_index() -> int:
+    """
+    全文検索の索引を bookmarks から作り直す
+    （索引導入前のDBや、VACUUM で rowid が振り直された場合に実行する）
+
+    Returns:
+        int: 索引に登録した件数
+    """
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM bookmarks_fts")
+            cur.execute(f"""
+                INSERT INTO bookmarks_fts (rowid, text, screen_name, name)
+                SELECT rowid, {FTS_VALUES_SQL} FROM bookmarks
+            """)
+            count = cur.rowcount
+            cur.execute("INSERT INTO bookmarks_fts (bookmarks_fts) VALUES ('optimize')")
+            conn.commit()
+            return count
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+
+if __name__ == "__main__":
+    # python -m bookmarks_categorize.modules.search rebuild
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python -m bookmarks_categorize.modules.search rebuild")
+        sys.exit(1)
+    init_db()
+    print(f"全文検索の索引を再構築しました: {rebuild_search_index()} 件")
@@ -0,0 +1,120 @@
+import asyncio
+from .database import get_connection, db_executor
+from .jobs import create_job
+from .x import XModule
+
+
+def get_sync_state(user_id: str):
+    """
+    ユーザーの同期状態を取得する
+
+    Returns:
+        dict: 最新のツイートID・取り込み件数・最終同期日時（未同期の場合はNone）
+    """
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT user_id, newest_tweet_id, synced_count, last_synced_at FROM x_sync_state WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    return {
+        "user_id": row[0],
+        "newest_tweet_id": row[1],
+        "synced_count": row[2],
+        "last_synced_at": row[3]
+    }
+
+def _get_synced_tweet_ids(user_id: str, tweet_ids: list[str]) -> set[str]:
+    """tweet_ids のうち取り込み済みのものを返す"""
+    if not tweet_ids:
+        return set()
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"SELECT tweet_id FROM x_synced_tweets WHERE user_id = ? AND tweet_id IN ({','.join('?' * len(tweet_ids))})",
+            (user_id, *tweet_ids)
+        ).fetchall()
+    return {row[0] for row in rows}
+
+async def collect_new_bookmarks(x_module: XModule, user_id: str, access_token: str, stop_tweet_id: str | None = None) -> tuple[list[dict], int]:
+    """
+    新しく追加されたブックマークを新しい順に取得する
+    ブックマークは追加された順の降順で返ってくるため、前回の同期の最新のツイート（stop_tweet_id）か
+    取り込み済みのツイートに到達した時点で取得をやめる（X API の呼び出しはスレッドで、DB の読み取りは db_executor で実行する）
+
+    Returns:
+        tuple: (新しいブックマークのリスト, 取得したページ数)
+    """
+    loop = asyncio.get_running_loop()
+    page_iter = x_module.iter_bookmark_pages(user_id, access_token)
+    new_bookmarks = []
+    pages = 0
+    while (page := await loop.run_in_executor(None, next, page_iter, None)) is not None:
+        pages += 1
+        tweets = page.get("data", [])
+        tweet_ids = [tweet["id"] for tweet in tweets]
+        if stop_tweet_id in tweet_ids:
+            tweets = tweets[:tweet_ids.index(stop_tweet_id)]
+        synced = await db_executor.read(_get_synced_tweet_ids, user_id, [tweet["id"] for tweet in tweets])
+        for tweet in tweets:
+            if tweet["id"] in synced:
+                return new_bookmarks, pages
+            new_bookmarks.append(XModule.to_bookmark_json(tweet, page.get("includes", {})))
+        if len(tweets) < len(tweet_ids):
+            return new_bookmarks, pages
+    return new_bookmarks, pages
+
+def record_synced(user_id: str, bookmarks: list[dict]) -> str | None:
+    """
+    取り込んだブックマークを分類ジョブとして登録し、ツイートIDとユーザーの同期状態（最新位置）を記録する
+
+    Args:
+        user_id: X のユーザーID
+        bookmarks: 取り込んだブックマーク（新しい順）
+
+    Returns:
+        str: 分類ジョブID（新しいブックマークがない場合はNone）
+    """
+    job_id = create_job(bookmarks) if bookmarks else None
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.executemany(
+                "INSERT OR IGNORE INTO x_synced_tweets (user_id, tweet_id, job_id) VALUES (?, ?, ?)",
+                [(user_id, bookmark["tweet_id"], job_id) for bookmark in bookmarks]
+            )
+            cur.execute("""
+                INSERT INTO x_sync_state (user_id, newest_tweet_id, synced_count)
+                VALUES (?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    newest_tweet_id = coalesce(excluded.newest_tweet_id, newest_tweet_id),
+                    synced_count = synced_count + excluded.synced_count,
+                    last_synced_at = CURRENT_TIMESTAMP
+            """, (user_id, bookmarks[0]["tweet_id"] if bookmarks else None, len(bookmarks)))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+    return job_id
+
+async def sync_bookmarks(x_module: XModule, access_token: str, user_id: str | None = None) -> dict:
+    """
+    X のブックマークを前回の同期以降に追加された分だけ取得し、分類ジョブとして登録する
+    （ジョブの実行は呼び出し側で開始する。DB の書き込みは db_executor の書き込みスレッドで実行する）
+
+    Args:
+        x_module: XModule
+        access_token: ユーザーのアクセストークン
+        user_id: X のユーザーID（Noneの場合はアクセストークンから取得）
+
+    Returns:
+        dict: ユーザーID・分類ジョブID（新しいブックマークがない場合はNone）・新しいブックマーク数・取得したページ数
+    """
+    if user_id is None:
+        user_id = await asyncio.get_running_loop().run_in_executor(None, x_module.get_user_id, access_token)
+
+    state = await db_executor.read(get_sync_state, user_id)
+    stop_tweet_id = state["newest_tweet_id"] if state is not None else None
+    new_bookmarks, pages = await collect_new_bookmarks(x_module, user_id, access_token, stop_tweet_id)
+    job_id = await db_executor.write(record_synced, user_id, new_bookmarks)
+    return {"user_id": user_id, "job_id": job_id, "new": len(new_bookmarks), "pages": pages}
@@ -0,0 +1,89 @@
+import re
+import zlib
+from .tweet import extract_tweet_fields, url_domain
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy がない環境ではベクトルを使う機能（ローカル分類など）を無効にする
+    np = None
+
+_URL = re.compile(r"https?://\S+")
+_SPACES = re.compile(r"\s+")
+
+# 文字 n-gram のハッシュに使う定数（n ごとに別の値にして、同じ文字列の 2-gram と 3-gram を区別する）
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_NGRAM_SEEDS = {2: 0x632BE59BD9B4E019, 3: 0x85EBCA77C2B2AE63}
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+def _hash_ngrams(codes, n: int):
+    """文字コードの配列から n-gram のハッシュ値を NumPy でまとめて計算する（プロセスをまたいで同じ値になる）"""
+    hashes = np.full(len(codes) - n + 1, _NGRAM_SEEDS[n], dtype=np.uint64)
+    for offset in range(n):
+        # uint64 の桁あふれは折り返す（ハッシュとしてはそれでよい）
+        hashes = (hashes ^ codes[offset:len(codes) - n + 1 + offset]) * np.uint64(_HASH_MULTIPLIER)
+    return hashes >> np.uint64(17)
+
+def _feature_hashes(tweet: dict):
+    """ツイートの文字 2-gram・3-gram と投稿者・URLのドメインのハッシュ値の配列（特徴がない場合は空の配列）"""
+    fields = extract_tweet_fields(tweet)
+    text = _SPACES.sub(" ", _URL.sub(" ", fields["tweet_text"] or "")).strip().lower()
+
+    hashes = []
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    for n in _NGRAM_SEEDS:
+        if len(codes) >= n:
+            hashes.append(_hash_ngrams(codes, n))
+    # 投稿者とリンク先のドメインは分類の手がかりになるので、別の特徴として加える
+    tokens = []
+    if fields["screen_name"]:
+        tokens.append("@" + fields["screen_name"].lower())
+    tokens.extend("domain:" + url_domain(url) for url in fields["urls"])
+    if tokens:
+        hashes.append(np.array([zlib.crc32(token.encode("utf-8")) for token in tokens], dtype=np.uint64))
+    if not hashes:
+        return np.zeros(0, dtype=np.uint64)
+    return np.concatenate(hashes)
+
+def hashed_features(tweet: dict, dim: int):
+    """
+    ツイートを文字 2-gram・3-gram と投稿者・URLのドメインの出現頻度のベクトル（hashing trick）にする
+    日本語は単語に区切られていないため、単語ではなく文字の n-gram を使う
+
+    Args:
+        tweet: ツイート内容の辞書
+        dim: ベクトルの次元数
+
+    Returns:
+        tuple: (次元のインデックスの配列, 重みの配列)。重みは 1 + log(出現回数) を L2 正規化したもの。特徴がない場合は空の配列
+    """
+    hashes = _feature_hashes(tweet)
+    if len(hashes) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    indices, counts = np.unique(hashes % np.uint64(dim), return_counts=True)
+    weights = (1.0 + np.log(counts)).astype(np.float32)
+    weights /= np.linalg.norm(weights)
+    return indices.astype(np.int64), weights
+
+def dense_vector(tweet: dict, dim: int):
+    """
+    hashed_features と同じ特徴を少ない次元の密なベクトルにする（類似検索用）
+    次元を小さくすると衝突が増えるため、特徴ごとに符号を付けて衝突が打ち消し合うようにする（signed hashing）
+
+    Returns:
+        numpy.ndarray: L2 正規化した float32 のベクトル（特徴がない場合はゼロベクトル）
+    """
+    hashes = _feature_hashes(tweet)
+    vector = np.zeros(dim, dtype=np.float32)
+    if len(hashes) == 0:
+        return vector
+    features, counts = np.unique(hashes, return_counts=True)
+    # 次元の選択とは別のビットを混ぜて符号を決める
+    signs = 1.0 - 2.0 * ((features * np.uint64(_HASH_MULTIPLIER)) >> np.uint64(63)).astype(np.float32)
+    vector += np.bincount((features % np.uint64(dim)).astype(np.int64), weights=signs * (1.0 + np.log(counts)), minlength=dim)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
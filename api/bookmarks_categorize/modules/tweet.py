@@ -0,0 +1,139 @@
+import re
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+# https://x.com/{screen_name}/status/{id} / https://twitter.com/{screen_name}/statuses/{id}
+_STATUS_URL = re.compile(r"/status(?:es)?/(\d+)")
+_URL = re.compile(r"https?://[^\s<>\"'、。）)]+")
+
+
+def extract_tweet_id(tweet: dict) -> str | None:
+    """
+    ツイート内容の辞書から X のツイートIDを取り出す
+    id_str / tweet_id / id のいずれか、なければ tweet_url の /status/{id} を使う
+
+    Args:
+        tweet: ツイート内容の辞書
+
+    Returns:
+        str: ツイートID（取り出せない場合はNone）
+    """
+    if not isinstance(tweet, dict):
+        return None
+    for key in ("id_str", "tweet_id", "id"):
+        value = tweet.get(key)
+        # JSON の数値のIDは桁あふれしていない前提で文字列に揃える
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value)
+        if isinstance(value, str) and value.isdigit():
+            return value
+    for key in ("tweet_url", "url"):
+        value = tweet.get(key)
+        if isinstance(value, str):
+            match = _STATUS_URL.search(value)
+            if match:
+                return match.group(1)
+    return None
+
+def extract_screen_name(tweet: dict) -> str | None:
+    """投稿者のスクリーンネーム（@なし）を取り出す"""
+    user = tweet.get("user") if isinstance(tweet.get("user"), dict) else {}
+    for value in (tweet.get("screen_name"), tweet.get("username"), user.get("screen_name"), user.get("username")):
+        if isinstance(value, str) and value:
+            return value.lstrip("@")
+    return None
+
+def extract_text(tweet: dict) -> str | None:
+    """本文を取り出す（長文ツイートは note_tweet_text を優先する）"""
+    for key in ("note_tweet_text", "full_text", "text"):
+        value = tweet.get(key)
+        if isinstance(value, str) and value:
+            return value
+    return None
+
+def normalize_timestamp(value) -> str | None:
+    """
+    投稿日時を created_at と同じ UTC の "YYYY-MM-DD HH:MM:SS" 形式に揃える
+    ISO 8601（X API v2）、"Wed Oct 10 20:19:24 +0000 2018"（X API v1.1）、UNIX 時間（秒・ミリ秒）に対応する
+
+    Returns:
+        str: 揃えた日時（解釈できない場合はNone）
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            parsed = datetime.fromtimestamp(value / 1000 if value > 1e11 else value, tz=timezone.utc)
+        elif isinstance(value, str):
+            value = value.strip()
+            try:
+                parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                parsed = datetime.strptime(value, "%a %b %d %H:%M:%S %z %Y")
+        else:
+            # 辞書やリストなど、日時として解釈できない型
+            return None
+    except (ValueError, OverflowError, OSError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+def extract_tweeted_at(tweet: dict) -> str | None:
+    """投稿日時を取り出す"""
+    for key in ("tweeted_at", "created_at"):
+        tweeted_at = normalize_timestamp(tweet.get(key))
+        if tweeted_at is not None:
+            return tweeted_at
+    return None
+
+def extract_urls(tweet: dict) -> list[str]:
+    """ツイートに含まれるURL（短縮URLは展開後のURL）を重複なく取り出す"""
+    urls = []
+    entities = tweet.get("entities") if isinstance(tweet.get("entities"), dict) else {}
+    for entity in entities.get("urls") or []:
+        if isinstance(entity, dict):
+            urls.append(entity.get("unwound_url") or entity.get("expanded_url") or entity.get("url"))
+    for value in tweet.get("urls") or []:
+        urls.append(value.get("expanded_url") or value.get("url") if isinstance(value, dict) else value)
+    text = extract_text(tweet) or ""
+    # 本文中の t.co の短縮URLは展開先が分からないので除く
+    urls.extend(url for url in _URL.findall(text) if url_domain(url) != "t.co")
+    return list(dict.fromkeys(url for url in urls if isinstance(url, str) and url.startswith(("http://", "https://"))))
+
+def url_domain(url: str) -> str:
+    """URLのドメインを小文字・www. なしで返す"""
+    domain = urlsplit(url).hostname or ""
+    return domain[4:] if domain.startswith("www.") else domain
+
+def has_media(tweet: dict) -> bool:
+    """画像・動画が添付されているか"""
+    attachments = tweet.get("attachments") if isinstance(tweet.get("attachments"), dict) else {}
+    extended_entities = tweet.get("extended_entities") if isinstance(tweet.get("extended_entities"), dict) else {}
+    for value in (tweet.get("extended_media"), tweet.get("media"), attachments.get("media_keys"), extended_entities.get("media")):
+        if isinstance(value, str):
+            # CSV エクスポートでは JSON 文字列のまま入っていることがある
+            value = value.strip()
+            if value and value not in ("[]", "null"):
+                return True
+        elif value:
+            return True
+    return False
+
+def extract_tweet_fields(tweet: dict) -> dict:
+    """
+    検索・絞り込みに使う項目をまとめて取り出す
+
+    Returns:
+        dict: tweet_id, screen_name, tweet_text, tweeted_at, has_media, urls
+    """
+    if not isinstance(tweet, dict):
+        return {"tweet_id": None, "screen_name": None, "tweet_text": None, "tweeted_at": None, "has_media": False, "urls": []}
+    return {
+        "tweet_id": extract_tweet_id(tweet),
+        "screen_name": extract_screen_name(tweet),
+        "tweet_text": extract_text(tweet),
+        "tweeted_at": extract_tweeted_at(tweet),
+        "has_media": has_media(tweet),
+        "urls": extract_urls(tweet)
+    }
@@ -0,0 +1,358 @@
+import codecs
+import csv
+import io
+import json
+import re
+from typing import BinaryIO
+from fastapi import UploadFile
+from .tweet import extract_tweet_id
+
+# 一度に読み込むバイト数
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# 1件のブックマークの上限（不正なファイルでバッファが際限なく大きくならないようにする）
+MAX_ITEM_BYTES = 16 * 1024 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_EXPECT_ARRAY_START = 0
+_EXPECT_VALUE_OR_END = 1
+_EXPECT_VALUE = 2
+_EXPECT_COMMA_OR_END = 3
+_DONE = 4
+
+# X のブックマークのエクスポート（CSV）の列。アプリで使うツイート内容の辞書のキーと同じ名前にする
+CSV_EXPORT_COLUMNS = (
+    "screen_name",
+    "name",
+    "full_text",
+    "note_tweet_text",
+    "tweeted_at",
+    "extended_media",
+    "tweet_url",
+    "profile_image_url_https"
+)
+_MEDIA_URL = re.compile(r"https?://[^\s,\]\"']+")
+
+
+class JSONArrayParser:
+    """
+    JSON 配列を少しずつ受け取り、デコードできた要素から順に返すパーサー
+    ファイル全体を読み込まずに済むため、メモリ使用量は要素1件分とチャンク1つ分に収まる
+    """
+
+    def __init__(self, max_item_bytes: int = MAX_ITEM_BYTES) -> None:
+        self.max_item_bytes = max_item_bytes
+        self._decoder = json.JSONDecoder()
+        # BOM 付きの UTF-8 も受け付ける
+        self._text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buffer = ""
+        self._state = _EXPECT_ARRAY_START
+        # 要素のデコードに失敗したときの未処理部分の長さ（倍になるまで再試行しない）
+        self._retry_length = 0
+
+    def feed(self, data: bytes) -> list:
+        """
+        データを追加し、新たにデコードできた要素を返す
+
+        Args:
+            data: ファイルから読み込んだバイト列
+
+        Returns:
+            list: デコードできた要素のリスト
+        """
+        self._buffer += self._text_decoder.decode(data)
+        return self._parse(final=False)
+
+    def close(self) -> list:
+        """
+        入力の終わりを通知し、残りの要素を返す
+
+        Returns:
+            list: デコードできた要素のリスト
+
+        Raises:
+            json.JSONDecodeError: 配列が閉じられていない場合
+        """
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        items = self._parse(final=True)
+        if self._state != _DONE:
+            raise json.JSONDecodeError("JSON配列が途中で終わっています", self._buffer, len(self._buffer))
+        return items
+
+    def _parse(self, final: bool) -> list:
+        items = []
+        buffer = self._buffer
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+
+            if self._state == _EXPECT_ARRAY_START:
+                if char != "[":
+                    raise json.JSONDecodeError("JSONファイルの最上位が配列ではありません", buffer, pos)
+                pos += 1
+                self._state = _EXPECT_VALUE_OR_END
+            elif self._state == _EXPECT_VALUE_OR_END and char == "]":
+                pos += 1
+                self._state = _DONE
+            elif self._state in (_EXPECT_VALUE_OR_END, _EXPECT_VALUE):
+                remaining = len(buffer) - pos
+                if not final and remaining < self._retry_length * 2:
+                    break
+                try:
+                    item, end = self._decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # 要素の途中までしか届いていない可能性があるので、続きを待つ
+                    if final:
+                        raise
+                    if remaining > self.max_item_bytes:
+                        raise json.JSONDecodeError("1件のサイズが上限を超えています", buffer, pos)
+                    self._retry_length = remaining
+                    break
+                if end == len(buffer) and not final:
+                    # 数値などは続きがある可能性があるので、区切り文字が届くまで待つ
+                    self._retry_length = 0
+                    break
+                items.append(item)
+                pos = end
+                self._retry_length = 0
+                self._state = _EXPECT_COMMA_OR_END
+            elif self._state == _EXPECT_COMMA_OR_END:
+                if char == ",":
+                    self._state = _EXPECT_VALUE
+                elif char == "]":
+                    self._state = _DONE
+                else:
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+                pos += 1
+            else:
+                raise json.JSONDecodeError("Extra data", buffer, pos)
+
+        # 処理済みの部分を捨て、未処理の部分だけを残す
+        self._buffer = buffer[pos:]
+        return items
+
+
+def parse_csv_media(value: str) -> list[dict]:
+    """
+    CSV の extended_media 列を {"type": ..., "media_url_https": ...} のリストにする
+    JSON 配列（X API の形式）でも、URL を並べただけの文字列でも受け付ける
+    """
+    value = (value or "").strip()
+    if not value or value in ("[]", "null"):
+        return []
+    if value.startswith("["):
+        try:
+            items = json.loads(value)
+        except ValueError:
+            items = None
+        if isinstance(items, list):
+            media = []
+            for item in items:
+                if isinstance(item, dict):
+                    url = item.get("media_url_https") or item.get("url") or item.get("preview_image_url")
+                    if url:
+                        media.append({"type": item.get("type"), "media_url_https": url})
+                elif isinstance(item, str) and item:
+                    media.append({"type": None, "media_url_https": item})
+            return media
+    return [{"type": None, "media_url_https": url} for url in _MEDIA_URL.findall(value)]
+
+def csv_row_to_bookmark_json(row: dict) -> dict:
+    """
+    CSV の1行（列名をキーにした辞書）をツイート内容の辞書にする
+    キーは X API から取り込んだブックマーク（XModule.to_bookmark_json）と揃える
+
+    Args:
+        row: csv.DictReader と同じ形式の1行
+
+    Returns:
+        dict: ツイート内容の辞書
+    """
+    # ツイートIDの列（tweet_id / id_str / id）がなければ tweet_url の /status/{id} から取り出す
+    bookmark_json = {"tweet_id": extract_tweet_id(row)}
+    for column in CSV_EXPORT_COLUMNS:
+        value = row.get(column) or ""
+        if column == "extended_media":
+            bookmark_json[column] = parse_csv_media(value)
+        elif column == "note_tweet_text":
+            # 長文ツイートの場合だけ入れる
+            if value:
+                bookmark_json[column] = value
+        elif column == "tweeted_at":
+            bookmark_json[column] = value or None
+        else:
+            bookmark_json[column] = value
+    return bookmark_json
+
+
+class CSVExportParser:
+    """
+    X のブックマークのエクスポート（CSV）を少しずつ受け取り、読み込めた行から順にツイート内容の辞書にして返すパーサー
+    引用符で囲まれた改行を含む行も扱えるよう、引用符の外にある改行までを切り出して csv モジュールに渡す
+    メモリ使用量は1行分とチャンク1つ分に収まる
+    """
+
+    def __init__(self, max_item_bytes: int = MAX_ITEM_BYTES) -> None:
+        self.max_item_bytes = max_item_bytes
+        # BOM 付きの UTF-8（表計算ソフトで保存した CSV）も受け付ける
+        self._text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buffer = ""
+        # バッファの先頭から調べ終えた位置と、そこまでの引用符の数の偶奇
+        self._scanned = 0
+        self._quoted = False
+        self._header = None
+
+    def feed(self, data: bytes) -> list[dict]:
+        """
+        データを追加し、新たに読み込めた行を返す
+
+        Args:
+            data: ファイルから読み込んだバイト列
+
+        Returns:
+            list: ツイート内容の辞書のリスト
+        """
+        self._buffer += self._text_decoder.decode(data)
+        return self._parse(final=False)
+
+    def close(self) -> list[dict]:
+        """
+        入力の終わりを通知し、残りの行を返す
+
+        Returns:
+            list: ツイート内容の辞書のリスト
+
+        Raises:
+            csv.Error: 引用符が閉じられていない場合、またはヘッダーに必要な列がない場合
+        """
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        # 末尾の改行のない行も含めて引用符の数が奇数なら、閉じられていない
+        if self._quoted != (self._buffer.count('"', self._scanned) % 2 == 1):
+            raise csv.Error("CSVの引用符が閉じられていません")
+        return self._parse(final=True)
+
+    def _parse(self, final: bool) -> list[dict]:
+        buffer = self._buffer
+        pos = self._scanned
+        # 引用符の外にある最後の改行の直後（ここまでは行として完結している）
+        cut = 0
+        while True:
+            newline = buffer.find("\n", pos)
+            if newline < 0:
+                break
+            if buffer.count('"', pos, newline) % 2:
+                self._quoted = not self._quoted
+            pos = newline + 1
+            if not self._quoted:
+                cut = pos
+        if final:
+            cut = len(buffer)
+        elif len(buffer) - cut > self.max_item_bytes:
+            raise csv.Error("1件のサイズが上限を超えています")
+
+        self._buffer = buffer[cut:]
+        self._scanned = pos - cut if not final else 0
+        if cut == 0:
+            return []
+
+        items = []
+        for row in csv.reader(io.StringIO(buffer[:cut], newline="")):
+            if not row:
+                continue
+            if self._header is None:
+                self._header = [column.strip() for column in row]
+                if not set(self._header) & {"full_text", "tweet_url"}:
+                    raise csv.Error("CSVのヘッダーに full_text または tweet_url の列がありません")
+                continue
+            items.append(csv_row_to_bookmark_json(dict(zip(self._header, row))))
+        return items
+
+
+def iter_json_array(file: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """
+    ファイルの JSON 配列の要素を少しずつ読み込みながら返すジェネレーター
+
+    Args:
+        file: バイナリモードのファイルオブジェクト
+        chunk_size: 一度に読み込むバイト数
+
+    Yields:
+        要素（ブックマークの場合はツイート内容の辞書）
+    """
+    parser = JSONArrayParser()
+    while True:
+        data = file.read(chunk_size)
+        if not data:
+            break
+        yield from parser.feed(data)
+    yield from parser.close()
+
+async def aiter_upload_json_array(file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """
+    アップロードされたファイルの JSON 配列の要素を少しずつ読み込みながら返す非同期ジェネレーター
+
+    Args:
+        file: アップロードされたファイル
+        chunk_size: 一度に読み込むバイト数
+
+    Yields:
+        要素（ブックマークの場合はツイート内容の辞書）
+    """
+    parser = JSONArrayParser()
+    while True:
+        data = await file.read(chunk_size)
+        if not data:
+            break
+        for item in parser.feed(data):
+            yield item
+    for item in parser.close():
+        yield item
+
+def iter_csv_export(file: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """
+    X のブックマークのエクスポート（CSV）を少しずつ読み込みながら、1行ずつツイート内容の辞書にして返すジェネレーター
+
+    Args:
+        file: バイナリモードのファイルオブジェクト
+        chunk_size: 一度に読み込むバイト数
+
+    Yields:
+        dict: ツイート内容の辞書
+    """
+    parser = CSVExportParser()
+    while True:
+        data = file.read(chunk_size)
+        if not data:
+            break
+        yield from parser.feed(data)
+    yield from parser.close()
+
+async def aiter_upload_csv_export(file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """
+    アップロードされた X のブックマークのエクスポート（CSV）を少しずつ読み込みながら返す非同期ジェネレーター
+
+    Args:
+        file: アップロードされたファイル
+        chunk_size: 一度に読み込むバイト数
+
+    Yields:
+        dict: ツイート内容の辞書
+    """
+    parser = CSVExportParser()
+    while True:
+        data = await file.read(chunk_size)
+        if not data:
+            break
+        for item in parser.feed(data):
+            yield item
+    for item in parser.close():
+        yield item
+
+def is_csv_upload(file: UploadFile) -> bool:
+    """アップロードされたファイルが CSV か（拡張子または Content-Type で判定する）"""
+    filename = (file.filename or "").lower()
+    content_type = (file.content_type or "").lower()
+    return filename.endswith(".csv") or content_type in ("text/csv", "application/csv")
@@ -0,0 +1,224 @@
+import json
+import os
+import sys
+import threading
+from .database import db_path, get_connection, init_db
+from .text_vectors import dense_vector, np
+
+# bookmarks.db と同じディレクトリに保存する
+vector_index_path = os.path.join(os.path.dirname(db_path), "bookmark_vectors.f32")
+
+# 類似検索のベクトルの次元数（10万件で約100MB）
+VECTOR_DIM = 256
+
+# IN (...) で一度に引く rowid・ID の数（SQLite のプレースホルダ数の上限を超えないようにする）
+SQL_IN_CHUNK_SIZE = 500
+
+
+class VectorIndex:
+    """
+    ブックマークのベクトルを bookmarks の rowid の位置に並べたメモリマップ行列
+    類似検索は全件との内積（総当たり）で行う。10万件 × 256 次元でも1回の行列ベクトル積で済む
+
+    ベクトルがない行（未登録・特徴のないツイート）はゼロベクトルのままにする
+    """
+
+    # ファイルを拡張するときの最小の行数
+    MIN_CAPACITY = 1024
+
+    def __init__(self, path: str, dim: int = VECTOR_DIM) -> None:
+        if np is None:
+            raise RuntimeError("類似検索には NumPy が必要です")
+        self.path = path
+        self.dim = dim
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def _open(self, min_rows: int = 0):
+        """行列を開き、min_rows 行に足りない場合はファイルを倍々で拡張する（ロックを持って呼び出す）"""
+        rows = self._matrix.shape[0] if self._matrix is not None else 0
+        if self._matrix is None and os.path.exists(self.path):
+            rows = os.path.getsize(self.path) // (self.dim * 4)
+        if self._matrix is None or rows < min_rows:
+            if rows < min_rows:
+                rows = max(min_rows, rows * 2, self.MIN_CAPACITY)
+                if self._matrix is not None:
+                    self._matrix.flush()
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                # 拡張した部分は0で埋まる（ゼロベクトル = 未登録）
+                with open(self.path, "ab") as f:
+                    f.truncate(rows * self.dim * 4)
+            self._matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(rows, self.dim)) if rows else None
+        return self._matrix
+
+    def set_vectors(self, rowids: list[int], tweets: list[dict]) -> None:
+        """rowid の位置にツイートのベクトルを書き込む"""
+        if not rowids:
+            return
+        vectors = np.stack([dense_vector(tweet, self.dim) for tweet in tweets])
+        with self._lock:
+            matrix = self._open(max(rowids) + 1)
+            matrix[rowids] = vectors
+
+    def get_vector(self, rowid: int):
+        """rowid のベクトル（未登録の場合はNone）"""
+        with self._lock:
+            matrix = self._open()
+            if matrix is None or rowid >= matrix.shape[0]:
+                return None
+            vector = np.array(matrix[rowid])
+        return vector if vector.any() else None
+
+    def on_bookmarks_written(self, bookmarks: list[tuple[str, str | None, dict]]) -> None:
+        """crud でブックマークを書き込んだ後に呼び出され、ベクトルを更新する（crud.add_write_listener で登録する）"""
+        by_tweet_id = {tweet_id: tweet for _, tweet_id, tweet in bookmarks if tweet_id is not None}
+        by_bookmark_id = {bookmark_id: tweet for bookmark_id, tweet_id, tweet in bookmarks if tweet_id is None}
+        rowids = []
+        tweets = []
+        with get_connection() as conn:
+            # ツイートIDが同じ既存の行を更新した場合は、その行の rowid に書き込む
+            for column, mapping in (("tweet_id", by_tweet_id), ("id", by_bookmark_id)):
+                keys = list(mapping)
+                for start in range(0, len(keys), SQL_IN_CHUNK_SIZE):
+                    chunk = keys[start:start + SQL_IN_CHUNK_SIZE]
+                    for rowid, key in conn.execute(
+                        f"SELECT rowid, {column} FROM bookmarks WHERE {column} IN ({','.join('?' * len(chunk))})", chunk
+                    ):
+                        rowids.append(rowid)
+                        tweets.append(mapping[key])
+        self.set_vectors(rowids, tweets)
+
+    def sync_from_db(self, batch_size: int = 1000) -> int:
+        """
+        ベクトルが未登録のブックマークを登録する（起動時や、別のプロセスで書き込まれた場合に実行する）
+
+        Returns:
+            int: 登録した件数
+        """
+        with self._lock:
+            matrix = self._open()
+            if matrix is not None:
+                missing = ~matrix.any(axis=1)
+                rows = matrix.shape[0]
+        added = 0
+        with get_connection() as conn:
+            cur = conn.execute("SELECT rowid, tweet FROM bookmarks ORDER BY rowid")
+            while True:
+                batch = cur.fetchmany(batch_size)
+                if not batch:
+                    break
+                todo = [(rowid, tweet) for rowid, tweet in batch if matrix is None or rowid >= rows or missing[rowid]]
+                parsed = []
+                for rowid, tweet in todo:
+                    try:
+                        parsed.append((rowid, json.loads(tweet)))
+                    except ValueError:
+                        continue
+                self.set_vectors([rowid for rowid, _ in parsed], [tweet for _, tweet in parsed])
+                added += len(parsed)
+        return added
+
+    def rebuild(self) -> int:
+        """ベクトルを作り直す（VACUUM で rowid が振り直された場合に実行する）"""
+        with self._lock:
+            self._matrix = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        return self.sync_from_db()
+
+    def close(self) -> None:
+        """書き込んだベクトルをファイルに書き出して閉じる"""
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        """行列の行数（ゼロベクトルの行を含む）"""
+        with self._lock:
+            matrix = self._open()
+        return matrix.shape[0] if matrix is not None else 0
+
+    def search(self, vector, limit: int):
+        """
+        内積（コサイン類似度）の大きい順に rowid を返す
+
+        Returns:
+            list: (rowid, 類似度) のリスト
+        """
+        with self._lock:
+            matrix = self._open()
+        if matrix is None:
+            return []
+        scores = matrix @ vector
+        limit = min(limit, len(scores))
+        # 全件をソートせず、上位 limit 件だけを取り出してから並べる
+        top = np.argpartition(scores, -limit)[-limit:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(rowid), float(scores[rowid])) for rowid in top if scores[rowid] > 0]
+
+    def similar_bookmarks(self, bookmark_id: str, limit: int = 10):
+        """
+        ブックマークに似ているブックマークを類似度の高い順に取得する（自分自身と論理削除したものは除く）
+
+        Args:
+            bookmark_id: ブックマークID
+            limit: 取得する件数
+
+        Returns:
+            list: ブックマークのリスト（score に類似度を入れる）。ブックマークが存在しない場合はNone
+        """
+        with get_connection() as conn:
+            row = conn.execute("SELECT rowid, tweet FROM bookmarks WHERE id = ? AND is_deleted = 0", (bookmark_id,)).fetchone()
+        if row is None:
+            return None
+        rowid, tweet = row
+        vector = self.get_vector(rowid)
+        if vector is None:
+            vector = dense_vector(json.loads(tweet), self.dim)
+            if not vector.any():
+                return []
+
+        # 論理削除したものを除いても足りるよう多めに取り出し、足りなければ行数を上限に広げる
+        total = len(self)
+        candidates_limit = min(limit * 2 + 1, total)
+        while True:
+            candidates = [(candidate, score) for candidate, score in self.search(vector, candidates_limit) if candidate != rowid]
+            scores = dict(candidates)
+            rowids = list(scores)
+            rows = []
+            with get_connection() as conn:
+                for start in range(0, len(rowids), SQL_IN_CHUNK_SIZE):
+                    chunk = rowids[start:start + SQL_IN_CHUNK_SIZE]
+                    # is_deleted のインデックスで全件を辿らないよう、単項 + でインデックスの対象から外して rowid で引かせる
+                    rows.extend(conn.execute(f"""
+                        SELECT b.rowid, b.id, c.categorize_name, b.tweet, b.created_at
+                        FROM bookmarks b
+                        JOIN bookmarks_category c ON b.categorize_id = c.id
+                        WHERE +b.is_deleted = 0 AND b.rowid IN ({','.join('?' * len(chunk))})
+                    """, chunk).fetchall())
+            exhausted = len(candidates) < candidates_limit - 1 or candidates_limit >= total
+            if len(rows) >= limit or exhausted:
+                break
+            candidates_limit = min(candidates_limit * 4, total)
+
+        rows.sort(key=lambda row: scores[row[0]], reverse=True)
+        return [
+            {
+                "id": row[1],
+                "category": row[2],
+                "tweet": json.loads(row[3]),
+                "created_at": row[4],
+                "score": scores[row[0]]
+            }
+            for row in rows[:limit]
+        ]
+
+
+if __name__ == "__main__":
+    # python -m bookmarks_categorize.modules.vector_index rebuild
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python -m bookmarks_categorize.modules.vector_index rebuild")
+        sys.exit(1)
+    init_db()
+    print(f"類似検索のベクトルを再構築しました: {VectorIndex(vector_index_path).rebuild()} 件")
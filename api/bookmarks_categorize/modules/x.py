@@ -2,10 +2,21 @@ import base64
 import hashlib
 import os
 import re
-import json
-import requests
 from requests.auth import AuthBase, HTTPBasicAuth
 from requests_oauthlib import OAuth2Session
+from .http_client import HTTPClient
+from .metrics import time_call, x_request_seconds
+
+
+# The bookmarks endpoint returns at most 100 tweets per page
+BOOKMARKS_MAX_RESULTS = 100
+BOOKMARKS_FIELDS = {
+    "expansions": "author_id,attachments.media_keys",
+    "tweet.fields": "created_at,author_id,attachments,entities,note_tweet",
+    "user.fields": "name,username,profile_image_url",
+    "media.fields": "type,url,preview_image_url",
+}
+X_API_BASE_URL = "https://api.twitter.com/2"
 
 
 class XModule:
@@ -16,12 +27,20 @@ class XModule:
             client_id: str,
             client_secret: str,
             redirect_uri: str,
-            scopes: list[str]
+            scopes: list[str],
+            timeout: float = 30.0,
+            client: HTTPClient | None = None,
+            api_base_url: str = X_API_BASE_URL
         ) -> None:
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_uri = redirect_uri
         self.scopes = scopes
+        self.timeout = timeout
+        # Overridable so the benchmarks can point the module at a local stand-in
+        self.api_base_url = api_base_url.rstrip("/")
+        # Connection reuse, retries and rate limiting are handled by the shared client
+        self.client = client or HTTPClient(timeout=timeout)
         # self.client_id = os.environ.get("CLIENT_ID")
         # self.client_secret = os.environ.get("CLIENT_SECRET")
         # self.redirect_uri = "http://localhost:8081/"
@@ -69,27 +88,81 @@ class XModule:
     
     def get_user_id(self, access_token):
         """Get the user ID using the access token."""
-        user_me = requests.request(
-            "GET",
-            "https://api.twitter.com/2/users/me",
-            headers={"Authorization": f"Bearer {access_token}"},
-        ).json()
+        with time_call(x_request_seconds, endpoint="users_me"):
+            user_me = self.client.get(
+                f"{self.api_base_url}/users/me",
+                headers={"Authorization": f"Bearer {access_token}"},
+            ).json()
         user_id = user_me["data"]["id"]
         return user_id
     
-    def get_bookmarks(self, user_id, access_token):
-        """Get the bookmarks for the user."""
-        url = f"https://api.twitter.com/2/users/{user_id}/bookmarks"
+    def get_bookmarks(self, user_id, access_token, pagination_token=None, max_results=BOOKMARKS_MAX_RESULTS):
+        """
+        Get one page of bookmarks for the user.
+        Author and media expansions are requested in the same call, so no follow-up lookups are needed.
+
+        Returns:
+            dict: The parsed response ("data", "includes" and "meta" with "next_token" if more pages remain).
+        """
+        url = f"{self.api_base_url}/users/{user_id}/bookmarks"
         headers = {
             "Authorization": f"Bearer {access_token}",
             "User-Agent": "BookmarksSampleCode",
         }
-        response = requests.request("GET", url, headers=headers)
-        if response.status_code != 200:
-            raise Exception(
-                f"Request returned an error: {response.status_code} {response.text}"
-            )
-        print(f"Response code: {response.status_code}")
-        json_response = response.json()
-        print(json.dumps(json_response, indent=4, sort_keys=True))
-        return json.dumps(json_response, indent=4, sort_keys=True)
+        params = dict(BOOKMARKS_FIELDS, max_results=max_results)
+        if pagination_token:
+            params["pagination_token"] = pagination_token
+        with time_call(x_request_seconds, endpoint="bookmarks"):
+            response = self.client.get(url, headers=headers, params=params)
+            if response.status_code != 200:
+                raise Exception(
+                    f"Request returned an error: {response.status_code} {response.text}"
+                )
+            return response.json()
+
+    def iter_bookmark_pages(self, user_id, access_token):
+        """
+        Iterate over all bookmark pages, newest bookmark first, following meta.next_token.
+
+        Yields:
+            dict: The parsed response of each page.
+        """
+        pagination_token = None
+        while True:
+            page = self.get_bookmarks(user_id, access_token, pagination_token)
+            yield page
+            pagination_token = page.get("meta", {}).get("next_token")
+            if not pagination_token:
+                break
+
+    @staticmethod
+    def to_bookmark_json(tweet, includes):
+        """
+        Convert an X API v2 tweet and the page's expansions into the bookmark JSON used by the app
+        (the same keys as the bookmarks export: screen_name, name, full_text, tweet_url, ...).
+        """
+        users = {user["id"]: user for user in includes.get("users", [])}
+        media = {item["media_key"]: item for item in includes.get("media", [])}
+        author = users.get(tweet.get("author_id"), {})
+        screen_name = author.get("username", "")
+
+        bookmark_json = {
+            "tweet_id": tweet["id"],
+            "screen_name": screen_name,
+            "name": author.get("name", ""),
+            "full_text": tweet.get("text", ""),
+            "tweeted_at": tweet.get("created_at"),
+            "tweet_url": f"https://x.com/{screen_name or 'i'}/status/{tweet['id']}",
+            "profile_image_url_https": author.get("profile_image_url"),
+            "extended_media": [
+                {
+                    "type": media[key].get("type"),
+                    "media_url_https": media[key].get("url") or media[key].get("preview_image_url"),
+                }
+                for key in tweet.get("attachments", {}).get("media_keys", [])
+                if key in media
+            ],
+        }
+        if "note_tweet" in tweet:
+            bookmark_json["note_tweet_text"] = tweet["note_tweet"].get("text")
+        return bookmark_json
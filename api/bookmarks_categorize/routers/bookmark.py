@@ -1,108 +1,550 @@
-import ast
+import csv
 import json
+import logging
+import time
 import uuid
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Request as HTTPRequest, Response as HTTPResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from ..modules.dify import DifyModule
+from ..modules.http_client import HTTPClient
+from ..modules.categorizer import CategorizeEngine
+from ..modules.cache import CategorizeCache, cache_db_path
+from ..modules.read_cache import ReadCache, data_version
+from ..modules.metrics import observe_stage
+from ..modules.local_classifier import LocalClassifier
+from ..modules.text_vectors import numpy_available
+from ..modules.vector_index import VectorIndex, vector_index_path
+from ..modules.upload import aiter_upload_json_array, aiter_upload_csv_export, is_csv_upload
+from ..modules.jobs import JobRunner, JOB_ITEMS_CHUNK_SIZE
+from ..modules.failures import format_error
 from ..modules.x import XModule
-from ..modules.crud import get_or_create_category, insert_bookmark, get_bookmarks_by_category, get_all_categories
-from ..schemas.bookmark import Request, Response
+from ..modules.sync import sync_bookmarks, get_sync_state
+from ..modules.crud import get_category_by_tweet, iter_bookmarks_ndjson
+from ..modules.database import PoolTimeoutError
+# DB の読み書きは専用スレッドで実行し、イベントループを塞がない
+from ..modules.async_crud import db_executor, aiter_bookmarks_ndjson, get_or_create_category, bulk_insert_bookmarks, get_bookmarks_json, get_bookmarks_page, get_all_categories, get_category, get_categories_with_counts, set_category_parent, set_bookmark_categories, search_bookmarks, open_job, append_job_items, queue_job, delete_job, get_job, get_job_results, record_failures, resolve_failures, get_failures, count_failures
+from ..schemas.bookmark import Request, Response, categorized_bookmarks_adapter
 from ..config import Settings
 
 class CategoryCreate(BaseModel):
     name: str
+    parent_id: int | None = None
+
+class BookmarkCategoriesUpdate(BaseModel):
+    category_ids: list[int]
+
+class XSyncRequest(BaseModel):
+    access_token: str
+    user_id: str | None = None
 
 router = APIRouter()
 
 settings = Settings()
+logger = logging.getLogger(__name__)
+
+difyClient = HTTPClient(
+    timeout = settings.dify_timeout,
+    max_retries = settings.http_max_retries,
+    backoff_base = settings.http_backoff_base_seconds,
+    backoff_max = settings.http_backoff_max_seconds,
+    rate_limit_per_second = settings.dify_rate_limit_per_second,
+    rate_limit_burst = settings.dify_rate_limit_burst,
+    pool_maxsize = settings.dify_concurrency
+)
 
 difyModule = DifyModule(
     dify_api_key_categorize_json = settings.dify_api_key_categorize_json,
-    dify_api_key_csv_to_json = settings.dify_api_key_csv_to_json,
     dify_base_url = settings.dify_base_url,
-    dify_user = settings.dify_user
+    dify_user = settings.dify_user,
+    timeout = settings.dify_timeout,
+    pool_maxsize = settings.dify_concurrency,
+    dify_api_key_categorize_json_batch = settings.dify_api_key_categorize_json_batch,
+    client = difyClient
+)
+
+# 分類キャッシュ・ローカル分類・類似検索のベクトルはファイルや DB を開くので、import 時ではなく
+# 起動時に open_categorize_resources で作る（それまでは無効として扱う）
+categorizeCache: CategorizeCache | None = None
+localClassifier: LocalClassifier | None = None
+vectorIndex: VectorIndex | None = None
+
+categorizeEngine = CategorizeEngine(
+    dify_module = difyModule,
+    concurrency = settings.dify_concurrency,
+    # 再試行を含めて待てるようにする
+    # ワークフローの POST はタイムアウトを再試行しないので、期限は最後の1回のタイムアウトとバックオフの分
+    timeout = difyClient.max_elapsed_seconds(idempotent=False),
+    batch_max_items = settings.dify_batch_max_items,
+    batch_max_bytes = settings.dify_batch_max_bytes,
+    known_category = get_category_by_tweet
+)
+
+jobRunner = JobRunner(
+    categorize_engine = categorizeEngine,
+    commit_batch_size = settings.categorize_commit_batch_size,
+    commit_interval_seconds = settings.categorize_commit_interval_seconds
+)
+
+readCache = ReadCache(
+    data_version = data_version,
+    max_entries = settings.read_cache_max_entries,
+    ttl_seconds = settings.read_cache_ttl_seconds
 )
 
+def open_categorize_resources() -> None:
+    """分類キャッシュ・ローカル分類・類似検索のベクトルを作り、分類エンジンに設定する（main の lifespan で呼び出す）"""
+    global categorizeCache, localClassifier, vectorIndex
+    categorizeCache = CategorizeCache(
+        path = cache_db_path,
+        namespace = CategorizeCache.make_namespace(
+            settings.dify_api_key_categorize_json,
+            settings.dify_workflow_version,
+            # バッチ実行の場合はバッチ用のワークフローの結果もキャッシュに入る
+            settings.dify_api_key_categorize_json_batch if settings.dify_batch_max_items > 1 else None
+        ),
+        ttl_seconds = settings.categorize_cache_ttl_seconds,
+        max_entries = settings.categorize_cache_max_entries
+    ) if settings.categorize_cache_enabled else None
+
+    localClassifier = LocalClassifier(
+        threshold = settings.local_classifier_threshold,
+        min_similarity = settings.local_classifier_min_similarity,
+        min_samples = settings.local_classifier_min_samples
+    ) if settings.local_classifier_enabled and numpy_available() else None
+
+    if (settings.local_classifier_enabled or settings.vector_index_enabled) and not numpy_available():
+        logger.warning("NumPy がないため、ローカル分類と類似検索は無効です（poetry install -E vectors）")
+
+    # ファイルは最初に使うときに開く
+    vectorIndex = VectorIndex(vector_index_path) if settings.vector_index_enabled and numpy_available() else None
+
+    categorizeEngine.cache = categorizeCache
+    categorizeEngine.local_classifier = localClassifier
+
+def close_categorize_resources() -> None:
+    """open_categorize_resources で作ったものを閉じる（main の lifespan で呼び出す）"""
+    global categorizeCache, localClassifier, vectorIndex
+    categorizeEngine.cache = None
+    categorizeEngine.local_classifier = None
+    if vectorIndex is not None:
+        vectorIndex.close()
+    if categorizeCache is not None:
+        categorizeCache.close()
+    categorizeCache = None
+    localClassifier = None
+    vectorIndex = None
+
+def _server_error(status_code: int, message: str, error: Exception) -> HTTPException:
+    """
+    例外をエラーレスポンスにする
+    接続プールの接続が空かなかった場合は一時的な混雑なので、status_code ではなく 503 にする
+    """
+    if isinstance(error, PoolTimeoutError):
+        return HTTPException(status_code=503, detail=f"{message}: {str(error)}", headers={"Retry-After": "1"})
+    return HTTPException(status_code=status_code, detail=f"{message}: {str(error)}")
+
+def _etag_matches(request: HTTPRequest, etag: str) -> bool:
+    """If-None-Match が現在の ETag と一致するか（弱い比較）"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
 xModule = XModule(
     client_id = settings.x_client_id,
     client_secret = settings.x_client_secret,
     redirect_uri = settings.x_redirect_uri,
-    scopes = settings.x_scopes
+    scopes = settings.x_scopes,
+    timeout = settings.x_timeout,
+    api_base_url = settings.x_api_base_url,
+    client = HTTPClient(
+        timeout = settings.x_timeout,
+        max_retries = settings.http_max_retries,
+        backoff_base = settings.http_backoff_base_seconds,
+        backoff_max = settings.http_backoff_max_seconds,
+        rate_limit_per_second = settings.x_rate_limit_per_second,
+        rate_limit_burst = settings.x_rate_limit_burst
+    )
 )
 
-# , response_model=Response.categorizeBookmark
-@router.post("/categorize")
+async def _store_as_completed(results, tweets) -> tuple[list[tuple], list[tuple]]:
+    """
+    分類が完了したものから順に保存する
+    成功したものは CATEGORIZE_COMMIT_BATCH_SIZE 件ごと（または CATEGORIZE_COMMIT_INTERVAL_SECONDS 秒ごと）にコミットし、
+    失敗したものはデッドレターに保存する（1件の失敗で他のアイテムを巻き込まない）
+
+    Args:
+        results: categorize_as_completed が返す (キー, 分類項目, 例外, 分類の出所) の非同期イテレーター
+        tweets: キーからツイート内容の辞書を引けるもの（リストまたは辞書）
+
+    Returns:
+        tuple: (成功した (キー, 分類項目) のリスト, 失敗した (キー, エラー内容) のリスト)
+    """
+    succeeded = []
+    failed = []
+    # まだコミットしていない分（成功したものは (キー, 分類項目, 分類の出所)）
+    pending_succeeded = []
+    pending_failed = []
+    pending_since = None
+
+    async def flush():
+        nonlocal pending_succeeded, pending_failed, pending_since
+        if pending_succeeded:
+            # 同じツイートIDのブックマークは新しいIDで挿入されず、既存の行が更新される
+            await bulk_insert_bookmarks([
+                (str(uuid.uuid4()), category, tweets[key], source) for key, category, source in pending_succeeded
+            ])
+            # 以前に失敗してデッドレターに残っているものは取り除く
+            await resolve_failures([tweets[key] for key, _, _ in pending_succeeded])
+        if pending_failed:
+            await record_failures([(tweets[key], error) for key, error in pending_failed])
+        succeeded.extend((key, category) for key, category, _ in pending_succeeded)
+        failed.extend(pending_failed)
+        pending_succeeded = []
+        pending_failed = []
+        pending_since = None
+
+    async for key, category, error, source in results:
+        if error is None:
+            pending_succeeded.append((key, category, source))
+        else:
+            pending_failed.append((key, format_error(error)))
+        if pending_since is None:
+            pending_since = time.perf_counter()
+        if (len(pending_succeeded) + len(pending_failed) >= settings.categorize_commit_batch_size
+                or time.perf_counter() - pending_since >= settings.categorize_commit_interval_seconds):
+            await flush()
+    await flush()
+    return succeeded, failed
+
+@router.post("/categorize", response_model=list[Response.categorizedBookmark])
 async def categorize_bookmarks(file: UploadFile = File(...)):
-    # ファイルの内容を読み込む
-    content = await file.read()
-    # try:
-    bookmarks_json_list = json.loads(content.decode("utf-8"))
-    run_workflow_result_list = []
-    for bookmark_json in bookmarks_json_list:
-        # print(f"type(bookmark_json): \n{type(bookmark_json)}\nEnd")
-        bookmark_json_str = json.dumps(bookmark_json, ensure_ascii=False)
-        # print(f"len(bookmark_json_str): \n{len(bookmark_json_str)}\nEnd")
-        run_workflow_result = difyModule.categorized_json(bookmark_json_str)
-        run_workflow_result_list.append(run_workflow_result)
-
-    #　分類結果をbookmark_jsonと統合
-    categorized_bookmark_json_list = []
-    for i in range(len(run_workflow_result_list)):
-        # 理想の形 → {"分類項目1": {"LLM": {bookmarkの中身}}}
-        categorized_bookmark_json_result = run_workflow_result_list[i]["data"]["outputs"]["categorized_bookmark_json"]
-        categorized_bookmark_json = json.loads(categorized_bookmark_json_result)["分類項目"]
-        categorized_bookmark_json_list.append(ast.literal_eval("{ " + f"\"bookmark_category\": \"{categorized_bookmark_json}\", " + f"\"tweet_content\": {bookmarks_json_list[i]}" + "}"))
-        # categorized_bookmark_json_list.append(ast.literal_eval("{ " + f"\"分類項目{i+1}\": " + "{" + f"\"{categorized_bookmark_json}\": {bookmarks_json_list[i]}" + "} }"))
-
-    # 分類されたbookmark_jsonをDBに保存
+    """
+    ブックマークを分類して保存し、分類できたものを入力と同じ順序で返す
+    JSON 配列のほか、X のブックマークのエクスポート（CSV）もそのまま受け付ける
+    分類に失敗したものはデッドレターに保存し、件数を X-Categorize-Failed ヘッダーで返す
+    """
+    # ファイルを少しずつ読み込み、デコードできたブックマークから分類に回す
+    bookmarks_json_list = []
+    # 読み込みは分類と交互に進むので、次のアイテムを待っていた時間だけを合計する
+    parse_seconds = 0.0
+
+    async def read_bookmarks():
+        nonlocal parse_seconds
+        started_at = time.perf_counter()
+        items = aiter_upload_csv_export(file) if is_csv_upload(file) else aiter_upload_json_array(file)
+        async for bookmark_json in items:
+            parse_seconds += time.perf_counter() - started_at
+            bookmarks_json_list.append(bookmark_json)
+            yield len(bookmarks_json_list) - 1, bookmark_json
+            started_at = time.perf_counter()
+        parse_seconds += time.perf_counter() - started_at
+
+    categorize_started_at = time.perf_counter()
+    try:
+        # Dify への分類リクエストを並列に実行し、完了したものから保存する
+        succeeded, failed = await _store_as_completed(
+            categorizeEngine.categorize_as_completed(read_bookmarks()),
+            bookmarks_json_list
+        )
+    except json.JSONDecodeError as e:
+        # 不正な箇所より前に分類できたものは保存済み
+        raise HTTPException(status_code=400, detail=f"JSONファイルの形式が不正です: {str(e)}")
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"CSVファイルの形式が不正です: {str(e)}")
+    except Exception as e:
+        raise _server_error(500, "データベース保存エラー", e)
+    finally:
+        observe_stage("upload_parse", parse_seconds, len(bookmarks_json_list))
+    # 読み込みを待っていた時間を除いた分類と保存の時間
+    observe_stage("categorize", time.perf_counter() - categorize_started_at - parse_seconds, len(succeeded) + len(failed))
+
+    # 分類結果とツイート内容をまとめる（ツイート内容はアップロードから読み込んだ辞書をそのまま使い、検証も変換もしない）
+    merge_started_at = time.perf_counter()
+    succeeded.sort()
+    categorized_bookmark_json_list = [
+        Response.categorizedBookmark.model_construct(bookmark_category=category, tweet_content=bookmarks_json_list[index])
+        for index, category in succeeded
+    ]
+    observe_stage("merge", time.perf_counter() - merge_started_at, len(categorized_bookmark_json_list))
+
+    # response_model の検証と変換を通さず、1回で JSON にして返す
+    return HTTPResponse(
+        content=categorized_bookmarks_adapter.dump_json(categorized_bookmark_json_list),
+        media_type="application/json",
+        headers={"X-Categorize-Failed": str(len(failed))}
+    )
+
+@router.get("/categorize/failures")
+async def get_categorize_failures(limit: int | None = Query(default=None, ge=1)):
+    """分類に失敗したブックマーク（デッドレター）をエラー内容と試行回数つきで取得する"""
+    return {"failures": await get_failures(limit), "total": await count_failures()}
+
+@router.post("/categorize/failures/retry")
+async def retry_categorize_failures(limit: int | None = Query(default=None, ge=1)):
+    """
+    デッドレターのブックマークだけを分類し直す
+    成功したものは保存してデッドレターから取り除き、再び失敗したものは試行回数を増やして残す
+    """
+    failures = await get_failures(limit)
+    tweets = {failure["id"]: failure["tweet"] for failure in failures}
+    try:
+        succeeded, failed = await _store_as_completed(
+            categorizeEngine.categorize_as_completed(list(tweets.items())),
+            tweets
+        )
+    except Exception as e:
+        raise _server_error(500, "データベース保存エラー", e)
+    return {
+        "retried": len(failures),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "remaining": await count_failures()
+    }
+
+async def _register_job_items(file: UploadFile) -> tuple[str, int]:
+    """
+    アップロードされたファイルを少しずつ読み込みながら、ジョブのアイテムとして登録する
+    読み込み（解析）はリクエストのタスクで行い、JOB_ITEMS_CHUNK_SIZE 件ごとに短いトランザクションで登録する
+    （書き込み用のスレッドでファイルの読み込みを待たないので、他の書き込みを待たせない）
+    読み込みに失敗した場合は登録途中のジョブを削除する
+
+    Returns:
+        tuple: (ジョブID, アイテム数)
+    """
+    items = aiter_upload_csv_export(file) if is_csv_upload(file) else aiter_upload_json_array(file)
+    job_id = None
+    total = 0
+    chunk = []
+    try:
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) >= JOB_ITEMS_CHUNK_SIZE:
+                # 小さい不正なファイルはジョブを作る前にエラーになる
+                if job_id is None:
+                    job_id = await open_job()
+                total += await append_job_items(job_id, total, chunk)
+                chunk = []
+        if job_id is None:
+            job_id = await open_job()
+        total += await append_job_items(job_id, total, chunk)
+        await queue_job(job_id)
+    except Exception:
+        if job_id is not None:
+            await delete_job(job_id)
+        raise
+    return job_id, total
+
+@router.post("/categorize/jobs", status_code=202)
+async def create_categorize_job(file: UploadFile = File(...)):
+    """ブックマークの分類をバックグラウンドジョブとして登録し、ジョブIDを即座に返す（JSON 配列と CSV に対応）"""
+    try:
+        job_id, total = await _register_job_items(file)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"JSONファイルの形式が不正です: {str(e)}")
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"CSVファイルの形式が不正です: {str(e)}")
+    except Exception as e:
+        raise _server_error(500, "ジョブ登録エラー", e)
+
+    jobRunner.start(job_id)
+    return {"job_id": job_id, "total": total}
+
+@router.get("/categorize/jobs/{job_id}")
+async def get_categorize_job(job_id: str):
+    """分類ジョブの進捗（done/failed/total）と完了時の集計結果を取得する"""
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return {"job": job}
+
+@router.get("/categorize/jobs/{job_id}/results")
+async def get_categorize_job_results(job_id: str):
+    """分類ジョブの結果を取得する（実行中の場合は完了済みのアイテムのみ）"""
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return {"job": job, "results": await get_job_results(job_id)}
+
+@router.post("/x/sync", status_code=202)
+async def sync_x_bookmarks(request: XSyncRequest):
+    """X のブックマークのうち前回の同期以降に追加された分を取得し、分類ジョブとして登録する"""
     try:
-        for item in categorized_bookmark_json_list:
-            category_name = item["bookmark_category"]
-            tweet = item["tweet_content"]
-            
-            # 1. カテゴリ登録 or 取得
-            cat_id = get_or_create_category(category_name)
-            
-            # 2. Bookmark 登録（tweet の中にユニークIDが含まれている前提）
-            bookmark_id = str(uuid.uuid4())
-            insert_bookmark(bookmark_id, cat_id, tweet)
+        result = await sync_bookmarks(xModule, request.access_token, request.user_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"データベース保存エラー: {str(e)}")
+        raise _server_error(502, "X のブックマーク同期エラー", e)
+
+    if result["job_id"] is not None:
+        jobRunner.start(result["job_id"])
+    return result
+
+@router.get("/x/sync/{user_id}")
+async def get_x_sync_state(user_id: str):
+    """X のブックマークの同期状態を取得する"""
+    state = await db_executor.read(get_sync_state, user_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="同期状態が見つかりません")
+    return {"state": state}
+
+@router.get("/categorize/cache")
+async def get_categorize_cache_stats():
+    """分類キャッシュのヒット・ミス数と節約できた時間の見積もりを取得する"""
+    return {"cache": categorizeEngine.cache_stats()}
 
-    return categorized_bookmark_json_list
-    #     json_string = json.dumps(json_content, ensure_ascii=False, indent=2)
-    #     return {"json_string": json_string}
-    # except json.JSONDecodeError:
-    #     return {"error": "Invalid JSON file"}
+@router.get("/categorize/local")
+async def get_local_classifier_stats():
+    """ローカル分類で Dify に送らずに済んだ件数と割合を取得する"""
+    return {"local": categorizeEngine.local_stats()}
 
 @router.get("/categories")
-async def get_categories():
-    """全てのカテゴリを取得する"""
+async def get_categories(request: HTTPRequest, response: HTTPResponse, with_counts: bool = False):
+    """
+    全てのカテゴリを取得する（変更がなければ If-None-Match に 304 を返す）
+    with_counts=1 の場合は親カテゴリIDとブックマーク数を含める
+    """
+    etag = data_version.etag("categories-counts" if with_counts else "categories")
+    if _etag_matches(request, etag):
+        return HTTPResponse(status_code=304, headers={"ETag": etag})
     try:
-        categories = get_all_categories()
+        if with_counts:
+            categories = await readCache.aget_or_load(("get_categories_with_counts",), get_categories_with_counts)
+        else:
+            categories = await readCache.aget_or_load(("get_all_categories",), get_all_categories)
+        response.headers["ETag"] = etag
         return {"categories": categories}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"カテゴリ取得エラー: {str(e)}")
+        raise _server_error(500, "カテゴリ取得エラー", e)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+class BookmarkFilters(BaseModel):
+    """投稿者・投稿日時・メディアの有無・URLのドメインによる絞り込み条件（一覧と検索で共通）"""
+    screen_name: str | None = None
+    since: str | None = None
+    until: str | None = None
+    has_media: bool | None = None
+    domain: str | None = None
+    label_id: int | None = None
+
+    def to_kwargs(self) -> dict:
+        """指定された条件だけを crud に渡す"""
+        return self.model_dump(exclude_none=True)
 
 @router.get("/")
-async def get_bookmarks(category_id: int = None):
-    """ブックマークを取得する（カテゴリIDが指定されている場合はそのカテゴリのみ）"""
+async def get_bookmarks(
+        request: HTTPRequest,
+        response: HTTPResponse,
+        category_id: int = None,
+        limit: int | None = Query(default=None, ge=1, le=500),
+        cursor: str | None = None,
+        stream: bool = False,
+        filters: BookmarkFilters = Depends()
+    ):
+    """
+    ブックマークを取得する（カテゴリIDが指定されている場合はそのカテゴリのみ）
+    limit または cursor が指定されている場合は1ページ分だけ返し、次のページのカーソルを next_cursor に入れる
+    stream=1 または Accept: application/x-ndjson の場合は1件1行の NDJSON で少しずつ返す
+    screen_name / since / until / has_media / domain で絞り込める
+    前回から変更がなければ If-None-Match に 304 を返す
+    """
+    stream = stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    # 同じURLでも NDJSON と JSON では別の ETag にする
+    etag = data_version.etag("bookmarks-ndjson" if stream else "bookmarks")
+    if _etag_matches(request, etag):
+        return HTTPResponse(status_code=304, headers={"ETag": etag})
+
+    if stream:
+        try:
+            lines = iter_bookmarks_ndjson(category_id, limit, cursor, **filters.to_kwargs())
+            # 最初のバッチまで読み出し、クエリのエラーはストリーム開始前にステータスコードで返す
+            first = await db_executor.read(next, lines, b"")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise _server_error(500, "ブックマーク取得エラー", e)
+
+        async def body():
+            yield first
+            async for chunk in aiter_bookmarks_ndjson(lines):
+                yield chunk
+        return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE, headers={"ETag": etag})
+
+    kwargs = filters.to_kwargs()
+    filter_key = tuple(sorted(kwargs.items()))
     try:
-        bookmarks = get_bookmarks_by_category(category_id)
-        return {"bookmarks": bookmarks}
+        if limit is None and cursor is None:
+            # 全件の結果は大きいため読み取りキャッシュには載せず、保存済みの JSON をそのまま本文にする
+            body = await get_bookmarks_json(category_id, **kwargs)
+            return HTTPResponse(content=body, media_type="application/json", headers={"ETag": etag})
+        bookmarks, next_cursor = await readCache.aget_or_load(
+            ("get_bookmarks_page", category_id, limit or 50, cursor, filter_key),
+            lambda: get_bookmarks_page(category_id, limit or 50, cursor, **kwargs)
+        )
+        response.headers["ETag"] = etag
+        return {"bookmarks": bookmarks, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"ブックマーク取得エラー: {str(e)}")
+        raise _server_error(500, "ブックマーク取得エラー", e)
+
+@router.get("/search")
+async def search(
+        q: str = Query(min_length=1),
+        category_id: int = None,
+        limit: int = Query(default=20, ge=1, le=100),
+        offset: int = Query(default=0, ge=0),
+        filters: BookmarkFilters = Depends()
+    ):
+    """ツイート本文と投稿者を全文検索する（関連度順、category_id と一覧と同じ条件で絞り込み可能）"""
+    try:
+        bookmarks, next_offset = await search_bookmarks(q, category_id, limit, offset, **filters.to_kwargs())
+        return {"bookmarks": bookmarks, "next_offset": next_offset}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise _server_error(500, "ブックマーク検索エラー", e)
+
+@router.get("/{bookmark_id}/similar")
+async def get_similar_bookmarks(bookmark_id: str, limit: int = Query(default=10, ge=1, le=100)):
+    """ブックマークに似ているブックマークを類似度の高い順に取得する"""
+    if vectorIndex is None:
+        raise HTTPException(status_code=503, detail="類似検索は無効です（NumPy が必要です）")
+    try:
+        bookmarks = await db_executor.read(vectorIndex.similar_bookmarks, bookmark_id, limit)
+    except Exception as e:
+        raise _server_error(500, "類似検索エラー", e)
+    if bookmarks is None:
+        raise HTTPException(status_code=404, detail="ブックマークが見つかりません")
+    return {"bookmarks": bookmarks}
 
 @router.post("/categories")
 async def create_category(category: CategoryCreate):
-    """新しいカテゴリを作成する"""
+    """新しいカテゴリを作成する（parent_id を指定した場合は親カテゴリを設定する）"""
     try:
-        category_id = get_or_create_category(category.name)
+        category_id = await get_or_create_category(category.name)
+        if category.parent_id is not None:
+            await set_category_parent(category_id, category.parent_id)
         # 作成したカテゴリを取得
-        categories = get_all_categories()
-        for cat in categories:
-            if cat["id"] == category_id:
-                return {"category": cat}
+        cat = await get_category(category_id)
+        if cat is not None:
+            return {"category": cat}
         raise HTTPException(status_code=500, detail="カテゴリの作成に成功しましたが、取得に失敗しました")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise _server_error(500, "カテゴリ作成エラー", e)
+
+@router.put("/{bookmark_id}/categories")
+async def update_bookmark_categories(bookmark_id: str, update: BookmarkCategoriesUpdate):
+    """ブックマークに付けるカテゴリを置き換える（主カテゴリは常に残る）"""
+    try:
+        category_ids = await set_bookmark_categories(bookmark_id, update.category_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"カテゴリ作成エラー: {str(e)}")
+        raise _server_error(500, "カテゴリ更新エラー", e)
+    if category_ids is None:
+        raise HTTPException(status_code=404, detail="ブックマークが見つかりません")
+    return {"bookmark_id": bookmark_id, "category_ids": category_ids}
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..modules.metrics import registry
+
+router = APIRouter()
+
+# Prometheus のテキスト形式のバージョン
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """ルートごとのレイテンシ・取り込みの処理段階・Dify / X API の呼び出し・DB のクエリの計測値を Prometheus のテキスト形式で返す"""
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_MEDIA_TYPE)
@@ -1,8 +1,16 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 class Request:
     pass
 
 class Response:
     class categorizeBookmark(BaseModel):
-        categorized_bookmark_json: list[dict] = []
\ No newline at end of file
+        categorized_bookmark_json: list[dict] = []
+
+    class categorizedBookmark(BaseModel):
+        """分類結果1件（POST /bookmarks/categorize のレスポンスの要素）"""
+        bookmark_category: str
+        tweet_content: dict
+
+# 分類結果のリストを1回で JSON にする（FastAPI の検証と jsonable_encoder を通さない）
+categorized_bookmarks_adapter = TypeAdapter(list[Response.categorizedBookmark])
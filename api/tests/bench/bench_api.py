@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+API のベンチマーク（分類の取り込みと一覧・カテゴリの読み取り）
+
+フェイクの Dify・X API を起動し、合成コーパスの件数ごとに一時ファイルの DB を作って
+POST /bookmarks/categorize、GET /bookmarks/、GET /bookmarks/categories、POST /bookmarks/x/sync の
+スループットとレイテンシ（p50/p95/p99）を測り、結果を JSON に保存する
+
+    cd api
+    python -m tests.bench.bench_api run --sizes 1000,10000,100000
+    python -m tests.bench.bench_api compare tests/bench/results/old.json tests/bench/results/new.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+from .bench_corpus import make_corpus, classify_text
+from .bench_fakes import FakeDifyServer, FakeXServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """最近傍順位法のパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+def summarize(latencies: list[float], elapsed: float, items: int | None = None, errors: int = 0) -> dict:
+    """
+    レイテンシのリストを集計する
+
+    Args:
+        latencies: 1リクエストごとの秒数
+        elapsed: 全体の秒数（スループットの計算に使う）
+        items: 処理したアイテム数（分類・同期の場合）
+        errors: 失敗したリクエスト数
+    """
+    values = sorted(latencies)
+    result = {
+        "requests": len(values),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0
+    }
+    if items is not None:
+        result["items"] = items
+        result["items_per_second"] = round(items / elapsed, 2) if elapsed else 0.0
+    return result
+
+def git_revision() -> dict:
+    """ベンチマークしたコミット（git がない場合は None）"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def configure_environment(args, dify_url: str, x_url: str) -> None:
+    """アプリを import する前に、接続先をフェイクに向け、リポジトリの DB・キャッシュに書き込まない設定にする"""
+    os.environ.update({
+        "DIFY_BASE_URL": dify_url,
+        "DIFY_API_KEY_CATEGORIZE_JSON": "bench",
+        "DIFY_USER": "bench",
+        "DIFY_CONCURRENCY": str(args.dify_concurrency),
+        "DIFY_BATCH_MAX_ITEMS": str(args.dify_batch_max_items),
+        "HTTP_BACKOFF_BASE_SECONDS": "0.01",
+        "HTTP_BACKOFF_MAX_SECONDS": "0.1",
+        "X_API_BASE_URL": f"{x_url}/2",
+        "X_RATE_LIMIT_PER_SECOND": "100000",
+        "CATEGORIZE_CACHE_ENABLED": "false",
+        "LOCAL_CLASSIFIER_ENABLED": "false",
+        "VECTOR_INDEX_ENABLED": "false"
+    })
+
+
+class Bench:
+    """1つのコーパスの件数についてシナリオを順に実行する"""
+
+    def __init__(self, args, client, x_server: FakeXServer) -> None:
+        self.args = args
+        self.client = client
+        self.x_server = x_server
+
+    async def run_requests(self, make_request, count: int, concurrency: int) -> dict:
+        """make_request(i) のリクエストを concurrency 本ずつ並行に count 回送って集計する"""
+        from bookmarks_categorize.routers.bookmark import readCache
+
+        latencies = []
+        errors = 0
+        next_index = 0
+
+        async def worker():
+            nonlocal next_index, errors
+            while next_index < count:
+                i = next_index
+                next_index += 1
+                # 既定ではキャッシュを空にして、毎回 DB から読み出す時間を測る
+                if not self.args.read_cache:
+                    readCache.clear()
+                started_at = time.perf_counter()
+                response = await make_request(i)
+                latencies.append(time.perf_counter() - started_at)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(latencies, time.perf_counter() - started_at, errors=errors)
+
+    async def categorize(self, corpus: list[dict]) -> dict:
+        """チャンクごとに POST /bookmarks/categorize を送る（分類は Dify のフェイクで行う）"""
+        latencies = []
+        errors = 0
+        chunk_size = self.args.chunk_size
+        started_at = time.perf_counter()
+        for start in range(0, len(corpus), chunk_size):
+            body = json.dumps(corpus[start:start + chunk_size], ensure_ascii=False).encode("utf-8")
+            request_started_at = time.perf_counter()
+            response = await self.client.post(
+                "/bookmarks/categorize", files={"file": ("bookmarks.json", body, "application/json")}
+            )
+            latencies.append(time.perf_counter() - request_started_at)
+            if response.status_code >= 400:
+                errors += 1
+        return summarize(latencies, time.perf_counter() - started_at, items=len(corpus), errors=errors)
+
+    def seed(self, corpus: list[dict]) -> dict:
+        """分類済みとして残りのブックマークを直接保存する（読み取りのシナリオの件数を揃えるため）"""
+        from bookmarks_categorize.modules.crud import bulk_insert_bookmarks
+
+        started_at = time.perf_counter()
+        bulk_insert_bookmarks([
+            (f"seed_{bookmark['tweet_id']}", classify_text(bookmark["full_text"]), bookmark)
+            for bookmark in corpus
+        ])
+        return summarize([], time.perf_counter() - started_at, items=len(corpus))
+
+    async def list_pages(self) -> dict:
+        """GET /bookmarks/?limit=50 で次のページのカーソルを辿る（最後まで行ったら先頭に戻る）"""
+        cursor = None
+
+        async def request(i):
+            nonlocal cursor
+            params = {"limit": 50}
+            if cursor:
+                params["cursor"] = cursor
+            response = await self.client.get("/bookmarks/", params=params)
+            cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+            return response
+        # カーソルを順に辿るので並行にしない
+        return await self.run_requests(request, self.args.read_requests, 1)
+
+    async def list_filtered(self) -> dict:
+        """GET /bookmarks/?limit=50&screen_name=... （投稿者で絞り込んだ1ページ目）"""
+        return await self.run_requests(
+            lambda i: self.client.get("/bookmarks/", params={"limit": 50, "screen_name": f"user_{i % 2000}"}),
+            self.args.read_requests, self.args.concurrency
+        )
+
+    async def list_all(self) -> dict:
+        """GET /bookmarks/ （ページ分けしない全件の一覧）"""
+        return await self.run_requests(lambda i: self.client.get("/bookmarks/"), self.args.full_list_requests, 1)
+
+    async def categories(self, with_counts: bool) -> dict:
+        """GET /bookmarks/categories（with_counts=1 の場合はブックマーク数付き）"""
+        params = {"with_counts": 1} if with_counts else {}
+        return await self.run_requests(
+            lambda i: self.client.get("/bookmarks/categories", params=params),
+            self.args.read_requests, self.args.concurrency
+        )
+
+    async def x_sync(self, corpus: list[dict]) -> dict:
+        """POST /bookmarks/x/sync で X のフェイクからブックマークを取得してジョブに登録する（ジョブは実行しない）"""
+        self.x_server.set_bookmarks(corpus)
+        with patch("bookmarks_categorize.routers.bookmark.jobRunner.start"):
+            started_at = time.perf_counter()
+            response = await self.client.post("/bookmarks/x/sync", json={"access_token": "bench", "user_id": FakeXServer.USER_ID})
+            elapsed = time.perf_counter() - started_at
+        result = response.json() if response.status_code == 202 else {}
+        return summarize([elapsed], elapsed, items=result.get("new", 0), errors=int(response.status_code >= 400))
+
+    async def run(self, size: int) -> dict:
+        corpus = make_corpus(size, seed=self.args.seed)
+        categorize_items = min(size, self.args.categorize_items)
+        results = {"categorize": await self.categorize(corpus[:categorize_items])}
+        results["seed"] = self.seed(corpus[categorize_items:])
+        results["list_page"] = await self.list_pages()
+        results["list_filtered"] = await self.list_filtered()
+        results["list_all"] = await self.list_all()
+        results["categories"] = await self.categories(False)
+        results["categories_with_counts"] = await self.categories(True)
+        # 同期は DB にないツイートだけを取り込むので、別のコーパスを使う
+        x_corpus = make_corpus(min(size, self.args.x_items), seed=self.args.seed + 1)
+        for bookmark in x_corpus:
+            bookmark["tweet_id"] = "9" + bookmark["tweet_id"]
+        results["x_sync"] = await self.x_sync(x_corpus)
+        return results
+
+
+async def run_sizes(args, dify_server: FakeDifyServer, x_server: FakeXServer) -> dict:
+    import httpx
+    from bookmarks_categorize.modules import database
+    from bookmarks_categorize.modules.database import init_db, close_pool
+    from bookmarks_categorize.modules.async_crud import db_executor
+
+    # DB の初期化はサイズごとに一時ディレクトリで行う（main の import 時の初期化もそちらに向ける）
+    with tempfile.TemporaryDirectory() as tmp_dir, patch("builtins.print"):
+        database.db_path = os.path.join(tmp_dir, "import.db")
+        from bookmarks_categorize.main import app
+    results = {}
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with patch.object(database, "db_path", os.path.join(tmp_dir, "bookmarks.db")):
+                with patch("builtins.print"):
+                    init_db()
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                    results[str(size)] = await Bench(args, client, x_server).run(size)
+                db_executor.shutdown()
+                close_pool()
+        print(f"{size} 件: " + ", ".join(
+            f"{name} p99={result['p99_ms']}ms" for name, result in results[str(size)].items() if name != "seed"
+        ), file=sys.stderr)
+    return results
+
+def run(args) -> dict:
+    with FakeDifyServer(args.dify_latency, args.dify_jitter, args.dify_error_rate, args.seed) as dify_server, \
+            FakeXServer(args.x_latency) as x_server:
+        configure_environment(args, dify_server.url, x_server.url)
+        results = asyncio.run(run_sizes(args, dify_server, x_server))
+        report = {
+            **git_revision(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("func", "output")},
+            "fake_dify": dify_server.stats(),
+            "results": results
+        }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (report["commit"] or "nogit")[:12]
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {output}", file=sys.stderr)
+    return report
+
+def run_command(args) -> int:
+    run(args)
+    return 0
+
+def compare(args) -> int:
+    """
+    2つの結果の p50/p99 とスループットを比べる
+
+    Returns:
+        int: p99 が threshold 以上悪化したシナリオがあれば 1
+    """
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    def change(old, new):
+        return (new - old) / old * 100 if old else 0.0
+
+    regressed = False
+    print(f"{'size':>7} {'scenario':<24} {'p50 ms':>18} {'p99 ms':>26} {'req/s':>20}")
+    for size, scenarios in current["results"].items():
+        for name, result in scenarios.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if old is None or name == "seed":
+                continue
+            p99_change = change(old["p99_ms"], result["p99_ms"])
+            mark = ""
+            if p99_change >= args.threshold:
+                regressed = True
+                mark = " !"
+            print(
+                f"{size:>7} {name:<24} "
+                f"{old['p50_ms']:>8.2f}→{result['p50_ms']:<8.2f} "
+                f"{old['p99_ms']:>8.2f}→{result['p99_ms']:<8.2f}({p99_change:+5.0f}%) "
+                f"{old['requests_per_second']:>8.1f}→{result['requests_per_second']:<8.1f}{mark}"
+            )
+    return 1 if regressed else 0
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="API のベンチマーク")
+    subparsers = parser.add_subparsers(required=True)
+
+    run_parser = subparsers.add_parser("run", help="ベンチマークを実行して結果を JSON に保存する")
+    run_parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=[1000, 10000, 100000],
+                            help="コーパスの件数（カンマ区切り）")
+    run_parser.add_argument("--categorize-items", type=int, default=2000, help="POST /bookmarks/categorize で分類する件数の上限（残りは直接保存する）")
+    run_parser.add_argument("--chunk-size", type=int, default=250, help="1回の POST /bookmarks/categorize で送る件数")
+    run_parser.add_argument("--read-requests", type=int, default=200, help="読み取りのシナリオごとのリクエスト数")
+    run_parser.add_argument("--full-list-requests", type=int, default=5, help="全件の一覧のリクエスト数")
+    run_parser.add_argument("--concurrency", type=int, default=8, help="読み取りの並行リクエスト数")
+    run_parser.add_argument("--read-cache", action="store_true", help="読み取りキャッシュを空にせずに測る")
+    run_parser.add_argument("--x-items", type=int, default=1000, help="X の同期で取り込む件数の上限")
+    run_parser.add_argument("--x-latency", type=float, default=0.0, help="X のフェイクの1ページあたりの秒数")
+    run_parser.add_argument("--dify-latency", type=float, default=0.02, help="Dify のフェイクの1回あたりの秒数")
+    run_parser.add_argument("--dify-jitter", type=float, default=0.01, help="Dify のフェイクの秒数のばらつき")
+    run_parser.add_argument("--dify-error-rate", type=float, default=0.0, help="Dify のフェイクが 500 を返す割合")
+    run_parser.add_argument("--dify-concurrency", type=int, default=8, help="DIFY_CONCURRENCY")
+    run_parser.add_argument("--dify-batch-max-items", type=int, default=1, help="DIFY_BATCH_MAX_ITEMS")
+    run_parser.add_argument("--seed", type=int, default=0, help="コーパスと Dify のフェイクの乱数のシード")
+    run_parser.add_argument("--output", help="結果の JSON のパス（既定は tests/bench/results/<日時>-<コミット>.json）")
+    run_parser.set_defaults(func=run_command)
+
+    compare_parser = subparsers.add_parser("compare", help="2つの結果を比べる")
+    compare_parser.add_argument("baseline", help="基準の結果の JSON")
+    compare_parser.add_argument("current", help="比べる結果の JSON")
+    compare_parser.add_argument("--threshold", type=float, default=20.0, help="悪化とみなす p99 の増加率（%%）")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+ベンチマーク用の合成ブックマーク（X のエクスポートと同じ形式）
+同じ件数・シードからは常に同じコーパスができるので、コミット間で結果を比べられる
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+# 分類項目ごとの語彙（フェイクの Dify はこの語彙で分類項目を決める）
+TOPICS = {
+    "テクノロジー": ["Python", "Rust", "型ヒント", "コンパイラ", "データベース", "インデックス", "非同期", "API", "GPU", "Linux"],
+    "料理": ["カレー", "スパイス", "レシピ", "発酵", "パン", "ラーメン", "出汁", "オーブン", "味噌", "燻製"],
+    "旅行": ["京都", "温泉", "ホテル", "フライト", "絶景", "登山", "キャンプ", "島", "鉄道", "美術館"],
+    "ビジネス": ["起業", "採用", "マーケティング", "決算", "資金調達", "SaaS", "組織", "営業", "戦略", "KPI"],
+    "健康": ["睡眠", "筋トレ", "ランニング", "瞑想", "食事", "ストレッチ", "姿勢", "サウナ", "体幹", "散歩"],
+    "エンタメ": ["映画", "アニメ", "ライブ", "漫画", "ゲーム", "ドラマ", "小説", "配信", "声優", "フェス"]
+}
+CATEGORIES = list(TOPICS)
+
+_FILLERS = ["について", "のまとめ", "が良かった", "を試した", "の話", "メモ", "入門", "の比較", "のコツ", "、最高"]
+_DOMAINS = ["example.com", "zenn.dev", "qiita.com", "note.com", "github.com", "youtube.com"]
+
+# ツイートID・投稿日時の起点（新しいものほどIDが大きい）
+_BASE_TWEET_ID = 1_800_000_000_000_000_000
+_BASE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def classify_text(text: str) -> str:
+    """本文に含まれる語彙から分類項目を決める（フェイクの Dify と DB の初期データで共通）"""
+    for category, words in TOPICS.items():
+        if any(word in text for word in words):
+            return category
+    return CATEGORIES[0]
+
+def make_bookmark(i: int, rng: random.Random) -> dict:
+    """i 番目のブックマーク"""
+    category = CATEGORIES[rng.randrange(len(CATEGORIES))]
+    words = rng.sample(TOPICS[category], 3)
+    text = " ".join(word + rng.choice(_FILLERS) for word in words) + f" #{i}"
+    # 約3割はリンク付き、約2割は画像付き
+    if rng.random() < 0.3:
+        text += f" https://{rng.choice(_DOMAINS)}/posts/{i}"
+    screen_name = f"user_{rng.randrange(2000)}"
+    tweet_id = str(_BASE_TWEET_ID + i)
+    bookmark = {
+        "tweet_id": tweet_id,
+        "screen_name": screen_name,
+        "name": f"ユーザー{screen_name[5:]}",
+        "full_text": text,
+        "tweeted_at": (_BASE_TIME + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "tweet_url": f"https://x.com/{screen_name}/status/{tweet_id}",
+        "profile_image_url_https": f"https://pbs.twimg.com/profile_images/{screen_name}.jpg",
+        "extended_media": []
+    }
+    if rng.random() < 0.2:
+        bookmark["extended_media"].append({"type": "photo", "media_url_https": f"https://pbs.twimg.com/media/{tweet_id}.jpg"})
+    return bookmark
+
+def make_corpus(size: int, seed: int = 0) -> list[dict]:
+    """
+    size 件のブックマークを作る
+
+    Args:
+        size: 件数（1k〜100k を想定）
+        seed: 乱数のシード
+
+    Returns:
+        list: ブックマークのリスト（古い順）
+    """
+    rng = random.Random(seed)
+    return [make_bookmark(i, rng) for i in range(size)]
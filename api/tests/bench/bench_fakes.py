@@ -0,0 +1,184 @@
+"""
+ベンチマーク用のローカルの Dify（/workflows/run）と X API（ブックマーク取得）の代役
+どちらも 127.0.0.1 の空いているポートで別スレッドの HTTP サーバーとして動く
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from .bench_corpus import classify_text
+
+
+class FakeServer:
+    """スレッドで動く HTTP サーバー（with で起動・停止する）"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # 接続を使い回せるようにする（HTTPClient は keep-alive で送る）
+            protocol_version = "HTTP/1.1"
+            # ヘッダーと本文を別々に書き込むため、Nagle と遅延 ACK で約40ms待たされないようにする
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server._dispatch(self, "GET")
+
+            def do_POST(self):
+                server._dispatch(self, "POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _dispatch(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        with self._lock:
+            self.requests += 1
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        url = urlparse(handler.path)
+        status, payload = self.handle(method, url.path, parse_qs(url.query), body)
+        if status >= 400:
+            with self._lock:
+                self.errors += 1
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def handle(self, method: str, path: str, query: dict, body: bytes) -> tuple[int, dict]:
+        """(ステータスコード, レスポンスの JSON) を返す"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors}
+
+
+class FakeDifyServer(FakeServer):
+    """
+    Dify の /workflows/run の代役
+    入力 bookmark_json が配列の場合はバッチ用ワークフローと同じ形式（[{"index": 0, "分類項目": "..."}, ...]）で返す
+
+    Args:
+        latency: 1回の実行にかける秒数
+        jitter: latency に加える 0〜jitter 秒のばらつき
+        error_rate: 500 を返す割合（HTTPClient が再試行する）
+        seed: ばらつきとエラーの乱数のシード
+    """
+
+    def __init__(self, latency: float = 0.02, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+
+    def handle(self, method, path, query, body):
+        if method != "POST" or not path.endswith("/workflows/run"):
+            return 404, {"message": "not found"}
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            failed = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        if failed:
+            return 500, {"code": "internal_server_error", "message": "injected error"}
+
+        bookmark_json = json.loads(json.loads(body)["inputs"]["bookmark_json"])
+        if isinstance(bookmark_json, list):
+            outputs = [{"index": i, "分類項目": classify_text(item.get("full_text", ""))} for i, item in enumerate(bookmark_json)]
+        else:
+            outputs = {"分類項目": classify_text(bookmark_json.get("full_text", ""))}
+        return 200, {"data": {"status": "succeeded", "outputs": {"categorized_bookmark_json": json.dumps(outputs, ensure_ascii=False)}}}
+
+
+class FakeXServer(FakeServer):
+    """
+    X API v2 の /users/me と /users/{id}/bookmarks の代役（展開した users・media を含めて返す）
+    set_bookmarks で渡したブックマークを新しい順にページ分けして返す
+
+    Args:
+        latency: 1回の取得にかける秒数
+    """
+
+    USER_ID = "bench_user"
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency
+        self._bookmarks = []
+
+    def set_bookmarks(self, bookmarks: list[dict]) -> None:
+        """返すブックマーク（bench_corpus の形式、古い順）"""
+        self._bookmarks = list(reversed(bookmarks))
+
+    def handle(self, method, path, query, body):
+        time.sleep(self.latency)
+        if path.endswith("/users/me"):
+            return 200, {"data": {"id": self.USER_ID, "username": "bench"}}
+        if not path.endswith(f"/users/{self.USER_ID}/bookmarks"):
+            return 404, {"title": "Not Found"}
+
+        max_results = int(query.get("max_results", ["100"])[0])
+        start = int(query.get("pagination_token", ["0"])[0])
+        page = self._bookmarks[start:start + max_results]
+        meta = {"result_count": len(page)}
+        if start + max_results < len(self._bookmarks):
+            meta["next_token"] = str(start + max_results)
+        return 200, {
+            "data": [self._to_tweet(bookmark) for bookmark in page],
+            "includes": {
+                "users": [self._to_user(bookmark) for bookmark in page],
+                "media": [
+                    {"media_key": f"{bookmark['tweet_id']}_{i}", "type": media["type"], "url": media["media_url_https"]}
+                    for bookmark in page
+                    for i, media in enumerate(bookmark["extended_media"])
+                ]
+            },
+            "meta": meta
+        }
+
+    @staticmethod
+    def _to_tweet(bookmark: dict) -> dict:
+        tweet = {
+            "id": bookmark["tweet_id"],
+            "text": bookmark["full_text"],
+            "author_id": bookmark["screen_name"],
+            "created_at": bookmark["tweeted_at"]
+        }
+        if bookmark["extended_media"]:
+            tweet["attachments"] = {"media_keys": [f"{bookmark['tweet_id']}_{i}" for i in range(len(bookmark["extended_media"]))]}
+        return tweet
+
+    @staticmethod
+    def _to_user(bookmark: dict) -> dict:
+        return {
+            "id": bookmark["screen_name"],
+            "username": bookmark["screen_name"],
+            "name": bookmark["name"],
+            "profile_image_url": bookmark["profile_image_url_https"]
+        }
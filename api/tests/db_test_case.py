@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+from bookmarks_categorize.modules.database import init_db, close_pool
+
+
+class TempDBMixin:
+    """
+    一時ディレクトリのSQLiteを使うテストの準備と後始末
+
+    setUp で一時ディレクトリの bookmarks.db を初期化し、テストクラスの tearDown の後に
+    接続プールを閉じて一時ディレクトリを削除する（addCleanup なので setUp の途中で失敗しても後始末される）。
+    テストクラスで setUp・tearDown を定義する場合は super() を呼び出す。
+
+    Attributes:
+        tmp_dir: 一時ディレクトリ（ベクトルファイルなど DB 以外のファイルにも使える）
+        db_path: 一時ディレクトリの bookmarks.db のパス
+    """
+
+    def setUp(self):
+        """各テスト前の準備"""
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db_path = os.path.join(self.tmp_dir.name, "bookmarks.db")
+        db_path_patcher = patch('bookmarks_categorize.modules.database.db_path', self.db_path)
+        db_path_patcher.start()
+        self.addCleanup(db_path_patcher.stop)
+        self.addCleanup(close_pool)
+        with patch('builtins.print'):
+            init_db()
+
+
+class TempDBTestCase(TempDBMixin, unittest.TestCase):
+    """一時ファイルのSQLiteを使うテストの基底クラス"""
+
+
+class AsyncTempDBTestCase(TempDBMixin, unittest.IsolatedAsyncioTestCase):
+    """一時ファイルのSQLiteを使う非同期のテストの基底クラス"""
@@ -0,0 +1,128 @@
+import unittest
+import asyncio
+import threading
+import time
+from bookmarks_categorize.modules.async_crud import (
+    DBExecutor,
+    db_executor,
+    bulk_insert_bookmarks,
+    get_bookmarks_page,
+    get_all_categories,
+    aiter_bookmarks_ndjson
+)
+from bookmarks_categorize.modules.crud import iter_bookmarks_ndjson
+from tests.db_test_case import TempDBTestCase
+
+
+class TestDBExecutor(unittest.TestCase):
+    """DBExecutorクラスのテスト"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.executor = DBExecutor(read_workers=2)
+
+    def tearDown(self):
+        """各テスト後の後始末"""
+        self.executor.shutdown()
+
+    def test_runs_outside_event_loop(self):
+        """読み取りと書き込みがイベントループとは別の専用スレッドで実行されるテスト"""
+        async def run():
+            return (
+                threading.current_thread().name,
+                await self.executor.read(lambda: threading.current_thread().name),
+                await self.executor.write(lambda: threading.current_thread().name)
+            )
+
+        loop_thread, read_thread, write_thread = asyncio.run(run())
+
+        self.assertNotEqual(read_thread, loop_thread)
+        self.assertTrue(read_thread.startswith("db-read"))
+        self.assertTrue(write_thread.startswith("db-write"))
+
+    def test_event_loop_not_blocked(self):
+        """DBの処理中も他のコルーチンが進むテスト"""
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(self.executor.read(time.sleep, 0.1), ticker())
+
+        started_at = time.perf_counter()
+        asyncio.run(run())
+
+        # 遅いクエリの完了を待たずに ticker が最後まで進んでいる
+        self.assertEqual(len(ticks), 5)
+        self.assertLess(ticks[-1] - started_at, 0.1)
+
+    def test_writes_serialized(self):
+        """書き込みは同時に1つずつ順に実行されるテスト"""
+        running = []
+        overlaps = []
+        order = []
+
+        def write(i):
+            running.append(i)
+            overlaps.append(len(running))
+            time.sleep(0.01)
+            order.append(i)
+            running.remove(i)
+
+        async def run():
+            await asyncio.gather(*(self.executor.write(write, i) for i in range(5)))
+
+        asyncio.run(run())
+
+        self.assertEqual(max(overlaps), 1)
+        self.assertEqual(order, list(range(5)))
+
+    def test_restart_after_shutdown(self):
+        """シャットダウン後に呼び出すとスレッドプールを作り直すテスト"""
+        asyncio.run(self.executor.read(int, "1"))
+        self.executor.shutdown()
+
+        self.assertEqual(asyncio.run(self.executor.read(int, "2")), 2)
+
+
+class TestAsyncCrud(TempDBTestCase):
+    """async_crudモジュールの関数のテスト（一時ファイルのSQLiteを使用）"""
+
+    def tearDown(self):
+        """各テスト後の後始末"""
+        db_executor.shutdown()
+        super().tearDown()
+
+    def test_insert_and_get(self):
+        """非同期版の関数で保存・取得できるテスト"""
+        async def run():
+            await bulk_insert_bookmarks([
+                ("bookmark_1", "テクノロジー", {"tweet_id": "1", "full_text": "Python"}),
+                ("bookmark_2", "料理", {"tweet_id": "2", "full_text": "カレー"})
+            ])
+            return await get_all_categories(), (await get_bookmarks_page())[0]
+
+        categories, bookmarks = asyncio.run(run())
+
+        self.assertEqual(sorted(category["name"] for category in categories), ["テクノロジー", "料理"])
+        self.assertEqual(sorted(bookmark["id"] for bookmark in bookmarks), ["bookmark_1", "bookmark_2"])
+
+    def test_aiter_bookmarks_ndjson(self):
+        """NDJSONのジェネレーターを専用スレッドで読み進めるテスト"""
+        async def run():
+            await bulk_insert_bookmarks([
+                (f"bookmark_{i}", "テクノロジー", {"tweet_id": str(i), "full_text": "Python"})
+                for i in range(5)
+            ])
+            return [chunk async for chunk in aiter_bookmarks_ndjson(iter_bookmarks_ndjson(batch_size=2))]
+
+        chunks = asyncio.run(run())
+
+        self.assertEqual(sum(chunk.count(b"\n") for chunk in chunks), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+from bookmarks_categorize.modules.cache import CategorizeCache
+
+
+class TestCategorizeCache(unittest.TestCase):
+    """CategorizeCacheクラスのテスト（一時ファイルのSQLiteを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "categorize_cache.db")
+        self.namespace = CategorizeCache.make_namespace("app-key", "1")
+        self.cache = CategorizeCache(self.path, self.namespace, ttl_seconds=60, max_entries=2)
+        self.test_tweet = {
+            "tweet_id": "1234567890",
+            "text": "これはテスト用のツイートです",
+            "user": {"screen_name": "test_user", "name": "Test User"}
+        }
+
+    def tearDown(self):
+        """各テスト後の後始末"""
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_get_set(self):
+        """ミス後に保存した分類項目がヒットするテスト"""
+        self.assertIsNone(self.cache.get(self.test_tweet))
+        self.cache.set(self.test_tweet, "テクノロジー")
+
+        self.assertEqual(self.cache.get(self.test_tweet), "テクノロジー")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_key_is_normalized(self):
+        """キーの順序が異なる同じツイートが同じキーになるテスト"""
+        reordered = {"user": {"name": "Test User", "screen_name": "test_user"}, "text": self.test_tweet["text"], "tweet_id": "1234567890"}
+
+        self.assertEqual(self.cache.make_key(self.test_tweet), self.cache.make_key(reordered))
+
+    def test_namespace_separates_workflows(self):
+        """ワークフローのバージョンが変わるとキャッシュが共有されないテスト"""
+        self.cache.set(self.test_tweet, "テクノロジー")
+        other = CategorizeCache(self.path, CategorizeCache.make_namespace("app-key", "2"))
+
+        self.assertIsNone(other.get(self.test_tweet))
+        self.assertNotIn("app-key", self.namespace)
+        other.close()
+
+    def test_namespace_includes_batch_workflow(self):
+        """バッチ実行のワークフローのAPIキーが変わると名前空間が変わるテスト"""
+        self.assertEqual(CategorizeCache.make_namespace("app-key", "1", None), self.namespace)
+        self.assertNotEqual(CategorizeCache.make_namespace("app-key", "1", "batch-key"), self.namespace)
+        self.assertNotEqual(
+            CategorizeCache.make_namespace("app-key", "1", "batch-key"),
+            CategorizeCache.make_namespace("app-key", "1", "other-batch-key")
+        )
+
+    def test_hit_does_not_commit(self):
+        """ヒットごとにはコミットせず、最終参照日時の更新をまとめて書き込むテスト"""
+        self.assertEqual(self.cache._conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        with patch('bookmarks_categorize.modules.cache.time.time', return_value=1000.0):
+            self.cache.set(self.test_tweet, "テクノロジー")
+        changes = self.cache._conn.total_changes
+
+        with patch('bookmarks_categorize.modules.cache.time.time', return_value=1010.0):
+            for _ in range(3):
+                self.assertEqual(self.cache.get(self.test_tweet), "テクノロジー")
+        self.assertEqual(self.cache._conn.total_changes, changes)
+
+        self.cache.flush()
+        accessed_at = self.cache._conn.execute("SELECT accessed_at FROM categorize_cache").fetchone()[0]
+        self.assertEqual(accessed_at, 1010.0)
+        self.assertEqual(self.cache._conn.total_changes, changes + 1)
+
+    def test_touch_flush_size(self):
+        """最終参照日時の更新が上限件数までたまったら書き込まれるテスト"""
+        tweets = [dict(self.test_tweet, tweet_id=str(i)) for i in range(2)]
+        for tweet in tweets:
+            self.cache.set(tweet, "テクノロジー")
+        changes = self.cache._conn.total_changes
+
+        with patch.object(CategorizeCache, 'TOUCH_FLUSH_SIZE', 2):
+            self.cache.get(tweets[0])
+            self.assertEqual(self.cache._conn.total_changes, changes)
+            self.cache.get(tweets[1])
+        self.assertEqual(self.cache._conn.total_changes, changes + 2)
+
+    def test_ttl(self):
+        """TTLを過ぎたエントリがミスになるテスト"""
+        with patch('bookmarks_categorize.modules.cache.time.time', return_value=1000.0):
+            self.cache.set(self.test_tweet, "テクノロジー")
+        with patch('bookmarks_categorize.modules.cache.time.time', return_value=1061.0):
+            self.assertIsNone(self.cache.get(self.test_tweet))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_evict_by_size(self):
+        """上限件数を超えたときに最終参照が古いエントリから削除されるテスト"""
+        tweets = [dict(self.test_tweet, tweet_id=str(i)) for i in range(3)]
+        for i, tweet in enumerate(tweets):
+            with patch('bookmarks_categorize.modules.cache.time.time', return_value=1000.0 + i):
+                self.cache.set(tweet, f"カテゴリ{i}")
+        # 最も古いエントリを参照して最近使ったことにする
+        with patch('bookmarks_categorize.modules.cache.time.time', return_value=1010.0):
+            self.cache.get(tweets[0])
+            deleted = self.cache.evict()
+
+        self.assertEqual(deleted, 1)
+        self.assertEqual(self.cache.stats()["entries"], 2)
+        with patch('bookmarks_categorize.modules.cache.time.time', return_value=1011.0):
+            self.assertIsNone(self.cache.get(tweets[1]))
+            self.assertEqual(self.cache.get(tweets[0]), "カテゴリ0")
+
+
+if __name__ == '__main__':
+    unittest.main()
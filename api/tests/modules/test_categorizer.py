@@ -0,0 +1,258 @@
+import unittest
+from unittest.mock import MagicMock
+import json
+import threading
+import time
+from bookmarks_categorize.modules.categorizer import CategorizeEngine
+
+
+def make_result(category: str) -> dict:
+    """Difyワークフローの実行結果を模したレスポンスを作成する"""
+    return {
+        "data": {
+            "outputs": {
+                "categorized_bookmark_json": json.dumps({"分類項目": category}, ensure_ascii=False)
+            }
+        }
+    }
+
+
+class TestCategorizeEngine(unittest.IsolatedAsyncioTestCase):
+    """CategorizeEngineクラスのテスト"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.dify_module = MagicMock()
+        self.bookmarks_json_list = [{"tweet_id": str(i), "text": f"ツイート{i}"} for i in range(10)]
+
+    async def test_categorize_all_keeps_input_order(self):
+        """完了順に関わらず入力順で結果が返ることのテスト"""
+        def categorized_json(bookmark_json_str):
+            tweet = json.loads(bookmark_json_str)
+            # 後ろの要素ほど早く返るようにする
+            time.sleep(0.001 * (10 - int(tweet["tweet_id"])))
+            return make_result(f"カテゴリ{tweet['tweet_id']}")
+        self.dify_module.categorized_json.side_effect = categorized_json
+
+        engine = CategorizeEngine(self.dify_module, concurrency=4, timeout=5)
+        result = await engine.categorize_all(self.bookmarks_json_list)
+
+        self.assertEqual(result, [f"カテゴリ{i}" for i in range(10)])
+        self.assertEqual(self.dify_module.categorized_json.call_count, 10)
+
+    async def test_categorize_all_respects_concurrency(self):
+        """同時実行数が上限を超えないことのテスト"""
+        lock = threading.Lock()
+        state = {"running": 0, "max_running": 0}
+
+        def categorized_json(bookmark_json_str):
+            with lock:
+                state["running"] += 1
+                state["max_running"] = max(state["max_running"], state["running"])
+            time.sleep(0.01)
+            with lock:
+                state["running"] -= 1
+            return make_result("テクノロジー")
+        self.dify_module.categorized_json.side_effect = categorized_json
+
+        engine = CategorizeEngine(self.dify_module, concurrency=3, timeout=5)
+        await engine.categorize_all(self.bookmarks_json_list)
+
+        self.assertLessEqual(state["max_running"], 3)
+        self.assertGreater(state["max_running"], 1)
+
+    async def test_categorize_as_completed_bounds_pending(self):
+        """非同期イテレーターの入力を分類待ちの上限までしか先読みしないことのテスト"""
+        def categorized_json(bookmark_json_str):
+            time.sleep(0.01)
+            return make_result("テクノロジー")
+        self.dify_module.categorized_json.side_effect = categorized_json
+        state = {"read": 0, "yielded": 0, "max_pending": 0}
+
+        async def read_bookmarks():
+            for i, bookmark_json in enumerate(self.bookmarks_json_list):
+                state["max_pending"] = max(state["max_pending"], state["read"] - state["yielded"])
+                state["read"] += 1
+                yield i, bookmark_json
+
+        engine = CategorizeEngine(self.dify_module, concurrency=2, timeout=5)
+        indexes = []
+        async for index, category, error, _ in engine.categorize_as_completed(read_bookmarks(), max_pending=3):
+            self.assertIsNone(error)
+            state["yielded"] += 1
+            indexes.append(index)
+
+        self.assertEqual(sorted(indexes), list(range(10)))
+        self.assertLessEqual(state["max_pending"], 3)
+
+    async def test_categorize_all_async_iterable(self):
+        """非同期イテレーターを入力順で分類するテスト"""
+        self.dify_module.categorized_json.side_effect = (
+            lambda bookmark_json_str: make_result(f"カテゴリ{json.loads(bookmark_json_str)['tweet_id']}")
+        )
+
+        async def read_bookmarks():
+            for bookmark_json in self.bookmarks_json_list:
+                yield bookmark_json
+
+        engine = CategorizeEngine(self.dify_module, concurrency=4, timeout=5, batch_max_items=1)
+        result = await engine.categorize_all(read_bookmarks())
+
+        self.assertEqual(result, [f"カテゴリ{i}" for i in range(10)])
+
+    async def test_categorize_skips_known_tweets(self):
+        """保存済みのツイートは Dify を呼び出さないテスト"""
+        self.dify_module.categorized_json.return_value = make_result("テクノロジー")
+        known = {"0": "ニュース", "1": "ニュース"}
+
+        engine = CategorizeEngine(
+            self.dify_module, concurrency=4, timeout=5,
+            known_category=lambda bookmark_json: known.get(bookmark_json["tweet_id"])
+        )
+        result = await engine.categorize_all(self.bookmarks_json_list[:4])
+
+        self.assertEqual(result, ["ニュース", "ニュース", "テクノロジー", "テクノロジー"])
+        self.assertEqual(self.dify_module.categorized_json.call_count, 2)
+        self.assertEqual(engine.known_hits, 2)
+
+    async def test_categorize_uses_cache(self):
+        """キャッシュにヒットした場合にDifyを呼ばないテスト"""
+        cache = MagicMock()
+        cache.get.side_effect = lambda tweet: "ニュース" if tweet["tweet_id"] == "0" else None
+        self.dify_module.categorized_json.return_value = make_result("テクノロジー")
+
+        engine = CategorizeEngine(self.dify_module, concurrency=2, timeout=5, cache=cache)
+        result = await engine.categorize_all(self.bookmarks_json_list[:2])
+
+        self.assertEqual(result, ["ニュース", "テクノロジー"])
+        self.dify_module.categorized_json.assert_called_once()
+        cache.set.assert_called_once_with(self.bookmarks_json_list[1], "テクノロジー")
+        self.assertEqual(engine.dify_calls, 1)
+
+    async def test_categorize_uses_local_classifier(self):
+        """ローカル分類で確信できたものは Dify を呼ばず、Dify の結果で重心を更新するテスト"""
+        local_classifier = MagicMock()
+        local_classifier.classify.side_effect = lambda tweet: "ニュース" if tweet["tweet_id"] == "0" else None
+        self.dify_module.categorized_json.return_value = make_result("テクノロジー")
+
+        engine = CategorizeEngine(self.dify_module, concurrency=2, timeout=5, local_classifier=local_classifier)
+        result = await engine.categorize_all(self.bookmarks_json_list[:2])
+
+        self.assertEqual(result, ["ニュース", "テクノロジー"])
+        self.dify_module.categorized_json.assert_called_once()
+        # ローカルで分類した結果は重心に加えない（自分の予測で学習しない）
+        local_classifier.add.assert_called_once_with(self.bookmarks_json_list[1], "テクノロジー")
+
+    async def test_lookup_and_learn_off_event_loop(self):
+        """保存済みのツイート・キャッシュの参照と更新がイベントループのスレッドで実行されないテスト"""
+        threads = []
+        def known_category(bookmark_json):
+            threads.append(threading.current_thread())
+            return None
+        cache = MagicMock()
+        cache.get.side_effect = lambda _: None
+        cache.set.side_effect = lambda *_: threads.append(threading.current_thread())
+        self.dify_module.categorized_json.return_value = make_result("テクノロジー")
+
+        engine = CategorizeEngine(self.dify_module, concurrency=2, timeout=5, cache=cache, known_category=known_category)
+        await engine.categorize_all(self.bookmarks_json_list[:3])
+
+        self.assertEqual(len(threads), 6)
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertTrue(all(thread.name.startswith("categorize-lookup") for thread in threads))
+
+    async def test_categorize_all_in_batches(self):
+        """バッチ実行で結果が対応付けられ、欠落したアイテムだけ1件ずつ分類されるテスト"""
+        def categorized_json_batch(bookmark_json_str_list):
+            # 各バッチの最後のアイテムの結果を欠落させる
+            return [json.loads(tweet)["tweet_id"] for tweet in bookmark_json_str_list[:-1]] + [None]
+        self.dify_module.categorized_json_batch.side_effect = categorized_json_batch
+        self.dify_module.categorized_json.side_effect = lambda tweet: make_result("単発" + json.loads(tweet)["tweet_id"])
+
+        engine = CategorizeEngine(self.dify_module, concurrency=2, timeout=5, batch_max_items=4)
+        result = await engine.categorize_all(self.bookmarks_json_list)
+
+        self.assertEqual(result, ["0", "1", "2", "単発3", "4", "5", "6", "単発7", "8", "単発9"])
+        self.assertEqual(self.dify_module.categorized_json_batch.call_count, 3)
+        self.assertEqual(self.dify_module.categorized_json.call_count, 3)
+        self.assertEqual(engine.dify_items, 13)
+
+    async def test_categorize_batches_respect_max_bytes(self):
+        """件数とバイト数の上限内でバッチに詰められ、上限を超える1件はそれだけで1バッチになるテスト"""
+        bookmarks_json_list = [{"tweet_id": str(i), "text": text} for i, text in enumerate(["a", "b", "c", "d" * 40, "e"])]
+        sizes = [len(json.dumps(tweet, ensure_ascii=False).encode("utf-8")) for tweet in bookmarks_json_list]
+        batches = []
+        def categorized_json_batch(bookmark_json_str_list):
+            batches.append([json.loads(tweet)["tweet_id"] for tweet in bookmark_json_str_list])
+            return ["テクノロジー"] * len(bookmark_json_str_list)
+        self.dify_module.categorized_json_batch.side_effect = categorized_json_batch
+
+        # 件数の上限で区切る
+        engine = CategorizeEngine(self.dify_module, concurrency=1, timeout=5, batch_max_items=2, batch_max_bytes=10_000)
+        await engine.categorize_all(bookmarks_json_list)
+        self.assertEqual(sorted(batches), [["0", "1"], ["2", "3"], ["4"]])
+
+        # バイト数の上限で区切る（2件分は入るが3件分は入らない）
+        batches.clear()
+        engine = CategorizeEngine(self.dify_module, concurrency=1, timeout=5, batch_max_items=10, batch_max_bytes=sizes[0] * 2)
+        await engine.categorize_all(bookmarks_json_list)
+        self.assertEqual(sorted(batches), [["0", "1"], ["2"], ["3"], ["4"]])
+        self.dify_module.categorized_json.assert_not_called()
+
+    async def test_categorize_batch_failure_falls_back(self):
+        """バッチ実行自体が失敗した場合に1件ずつ分類されるテスト"""
+        self.dify_module.categorized_json_batch.side_effect = RuntimeError("API接続エラー")
+        self.dify_module.categorized_json.return_value = make_result("テクノロジー")
+
+        engine = CategorizeEngine(self.dify_module, concurrency=2, timeout=5, batch_max_items=5)
+        result = await engine.categorize_all(self.bookmarks_json_list)
+
+        self.assertEqual(result, ["テクノロジー"] * 10)
+        self.assertEqual(self.dify_module.categorized_json.call_count, 10)
+
+    async def test_categorize_batch_fallback_runs_concurrently(self):
+        """バッチが失敗した場合の1件ずつの分類が同時実行数の上限まで並列に実行されるテスト"""
+        lock = threading.Lock()
+        state = {"running": 0, "max_running": 0}
+
+        def categorized_json(bookmark_json_str):
+            with lock:
+                state["running"] += 1
+                state["max_running"] = max(state["max_running"], state["running"])
+            time.sleep(0.02)
+            with lock:
+                state["running"] -= 1
+            return make_result("テクノロジー")
+        self.dify_module.categorized_json_batch.side_effect = RuntimeError("API接続エラー")
+        self.dify_module.categorized_json.side_effect = categorized_json
+
+        engine = CategorizeEngine(self.dify_module, concurrency=3, timeout=5, batch_max_items=10)
+        result = await engine.categorize_all(self.bookmarks_json_list)
+
+        self.assertEqual(result, ["テクノロジー"] * 10)
+        self.assertEqual(state["max_running"], 3)
+
+    async def test_categorize_batch_timeout_is_per_call(self):
+        """バッチの期限が件数倍ではなく1回の呼び出しの期限で、超えた場合は1件ずつ分類されるテスト"""
+        self.dify_module.categorized_json_batch.side_effect = (
+            lambda bookmark_json_str_list: time.sleep(0.15) or ["バッチ"] * len(bookmark_json_str_list)
+        )
+        self.dify_module.categorized_json.return_value = make_result("単発")
+
+        engine = CategorizeEngine(self.dify_module, concurrency=4, timeout=0.05, batch_max_items=4)
+        result = await engine.categorize_all(self.bookmarks_json_list[:4])
+
+        self.assertEqual(result, ["単発"] * 4)
+
+    async def test_categorize_timeout(self):
+        """1件あたりのタイムアウトを超えた場合のテスト"""
+        self.dify_module.categorized_json.side_effect = lambda _: time.sleep(0.2) or make_result("テクノロジー")
+
+        engine = CategorizeEngine(self.dify_module, concurrency=1, timeout=0.05)
+
+        with self.assertRaises(TimeoutError):
+            await engine.categorize(self.bookmarks_json_list[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
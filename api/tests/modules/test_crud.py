@@ -2,12 +2,29 @@ import unittest
 from unittest.mock import patch, MagicMock
 import json
 import sqlite3
+from bookmarks_categorize.modules.database import get_connection, get_pool
 from bookmarks_categorize.modules.crud import (
     get_or_create_category,
     insert_bookmark,
-    get_bookmarks_by_category,
-    get_all_categories
+    bulk_insert_bookmarks,
+    get_bookmarks_json,
+    get_bookmarks_page,
+    iter_bookmarks_ndjson,
+    get_all_categories,
+    encode_cursor,
+    decode_cursor,
+    get_category_by_tweet,
+    get_category,
+    get_categories_with_counts,
+    get_bookmark_category_ids,
+    set_bookmark_categories,
+    set_category_parent,
+    add_write_listener,
+    remove_write_listener,
+    UPSERT_BOOKMARK_SQL
 )
+from bookmarks_categorize.modules.read_cache import data_version
+from tests.db_test_case import TempDBTestCase
 
 class TestCrudFunctions(unittest.TestCase):
     """CRUDモジュールの関数のテスト"""
@@ -94,65 +111,208 @@ class TestCrudFunctions(unittest.TestCase):
         
         # アサーション
         mock_cursor.execute.assert_called_once_with(
-            "INSERT OR IGNORE INTO bookmarks (id, categorize_id, tweet) VALUES (?, ?, ?)",
-            (self.test_bookmark_id, self.test_category_id, json.dumps(self.test_tweet, ensure_ascii=False))
+            UPSERT_BOOKMARK_SQL,
+            (
+                self.test_bookmark_id, self.test_category_id, json.dumps(self.test_tweet, ensure_ascii=False),
+                "1234567890", "test_user", "これはテスト用のツイートです", None, 0, None
+            )
         )
         mock_conn.commit.assert_called_once()
 
     @patch('bookmarks_categorize.modules.crud.get_connection')
-    def test_get_bookmarks_by_category_with_id(self, mock_get_connection):
-        """特定のカテゴリのブックマークを取得するテスト"""
+    def test_bulk_insert_bookmarks(self, mock_get_connection):
+        """ブックマークをまとめて挿入するテスト"""
         # モックの設定
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
         mock_conn.cursor.return_value = mock_cursor
         mock_get_connection.return_value.__enter__.return_value = mock_conn
-        
-        # カーソルの戻り値を設定
+        mock_cursor.fetchall.side_effect = [
+            [(self.test_category_name, self.test_category_id)],
+            [("ニュース", 2)]
+        ]
+        mock_cursor.rowcount = 2
+        bookmarks = [
+            ("bookmark_1", self.test_category_name, self.test_tweet),
+            ("bookmark_2", self.test_category_name, self.test_tweet),
+            ("bookmark_3", "ニュース", self.test_tweet, "local")
+        ]
+
+        # 関数実行（2件ずつコミット）
+        result = bulk_insert_bookmarks(bookmarks, batch_size=2)
+
+        # アサーション
+        self.assertEqual(result, 4)
+        self.assertEqual(mock_conn.commit.call_count, 2)
+        # 2バッチ目では解決済みのカテゴリを再検索しない
+        self.assertEqual(mock_cursor.execute.call_count, 2)
+        args, kwargs = mock_cursor.execute.call_args
+        self.assertEqual(args[1], ["ニュース"])
+        bookmark_inserts = [
+            call for call in mock_cursor.executemany.call_args_list
+            if call[0][0] == UPSERT_BOOKMARK_SQL
+        ]
+        self.assertEqual(bookmark_inserts[1][0][1], [
+            ("bookmark_3", 2, json.dumps(self.test_tweet, ensure_ascii=False), "1234567890", "test_user", "これはテスト用のツイートです", None, 0, "local")
+        ])
+
+    @patch('bookmarks_categorize.modules.crud.get_connection')
+    def test_bulk_insert_bookmarks_rollback(self, mock_get_connection):
+        """まとめて挿入中にエラーが発生した場合のテスト"""
+        # モックの設定
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value = mock_cursor
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_cursor.executemany.side_effect = sqlite3.Error("テスト用のエラー")
+
+        # 関数実行
+        with self.assertRaises(sqlite3.Error):
+            bulk_insert_bookmarks([("bookmark_1", self.test_category_name, self.test_tweet)])
+
+        # アサーション
+        mock_conn.rollback.assert_called_once()
+        mock_conn.commit.assert_not_called()
+
+    @patch('bookmarks_categorize.modules.crud.get_connection')
+    def test_get_bookmarks_page(self, mock_get_connection):
+        """キーセットページネーションでブックマークを取得するテスト"""
+        # モックの設定
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value = mock_cursor
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+
+        # limit + 1 件返ってきた場合は次のページがある
         mock_cursor.fetchall.return_value = [
-            (self.test_bookmark_id, self.test_category_name, json.dumps(self.test_tweet), "2023-01-01 12:00:00")
+            ("bookmark_3", self.test_category_name, json.dumps(self.test_tweet), "2023-01-03 12:00:00"),
+            ("bookmark_2", self.test_category_name, json.dumps(self.test_tweet), "2023-01-02 12:00:00"),
+            ("bookmark_1", self.test_category_name, json.dumps(self.test_tweet), "2023-01-01 12:00:00")
         ]
-        
+        cursor = encode_cursor("2023-01-04 12:00:00", "bookmark_4")
+
         # 関数実行
-        result = get_bookmarks_by_category(self.test_category_id)
-        
+        result, next_cursor = get_bookmarks_page(self.test_category_id, 2, cursor)
+
         # アサーション
-        self.assertEqual(len(result), 1)
-        self.assertEqual(result[0]["id"], self.test_bookmark_id)
-        self.assertEqual(result[0]["category"], self.test_category_name)
-        self.assertEqual(result[0]["tweet"], self.test_tweet)
-        self.assertEqual(result[0]["created_at"], "2023-01-01 12:00:00")
-        
-        mock_cursor.execute.assert_called_once()
-        # WHERE句にカテゴリIDが含まれていることを確認
+        self.assertEqual([bookmark["id"] for bookmark in result], ["bookmark_3", "bookmark_2"])
+        self.assertEqual(decode_cursor(next_cursor), ("2023-01-02 12:00:00", "bookmark_2"))
         args, kwargs = mock_cursor.execute.call_args
-        self.assertIn("WHERE b.categorize_id = ?", args[0])
-        self.assertEqual(args[1], (self.test_category_id,))
+        self.assertIn("(b.created_at, b.id) < (?, ?)", args[0])
+        self.assertIn("ORDER BY b.created_at DESC, b.id DESC", args[0])
+        self.assertEqual(args[1], (self.test_category_id, "2023-01-04 12:00:00", "bookmark_4", 3))
 
     @patch('bookmarks_categorize.modules.crud.get_connection')
-    def test_get_bookmarks_by_category_all(self, mock_get_connection):
-        """全てのブックマークを取得するテスト"""
+    def test_get_bookmarks_page_last(self, mock_get_connection):
+        """最終ページではnext_cursorがNoneになるテスト"""
         # モックの設定
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
         mock_conn.cursor.return_value = mock_cursor
         mock_get_connection.return_value.__enter__.return_value = mock_conn
-        
-        # カーソルの戻り値を設定
         mock_cursor.fetchall.return_value = [
             (self.test_bookmark_id, self.test_category_name, json.dumps(self.test_tweet), "2023-01-01 12:00:00")
         ]
-        
+
         # 関数実行
-        result = get_bookmarks_by_category(None)
-        
+        result, next_cursor = get_bookmarks_page(None, 2)
+
         # アサーション
         self.assertEqual(len(result), 1)
-        mock_cursor.execute.assert_called_once()
-        # WHERE句にカテゴリIDが含まれていないことを確認
+        self.assertIsNone(next_cursor)
         args, kwargs = mock_cursor.execute.call_args
-        self.assertNotIn("WHERE b.categorize_id = ?", args[0])
-        self.assertIn("WHERE b.is_deleted = 0", args[0])
+        self.assertNotIn("b.categorize_id = ?", args[0])
+        self.assertEqual(args[1], (3,))
+
+    @patch('bookmarks_categorize.modules.crud.get_connection')
+    def test_get_bookmarks_json(self, mock_get_connection):
+        """保存済みの tweet をデコードせずに埋め込んだ JSON 本文を返すテスト"""
+        # モックの設定
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_conn.cursor.return_value = mock_cursor
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        tweet_json = json.dumps(self.test_tweet, ensure_ascii=False)
+        mock_cursor.__iter__.return_value = iter([
+            ("bookmark_2", self.test_category_name, tweet_json, "2023-01-02 12:00:00"),
+            ("bookmark_1", "ニュース", tweet_json, "2023-01-01 12:00:00")
+        ])
+
+        # 関数実行
+        with patch('bookmarks_categorize.modules.crud.json.loads') as mock_loads:
+            body = get_bookmarks_json(self.test_category_id)
+            mock_loads.assert_not_called()
+
+        # アサーション
+        self.assertEqual(json.loads(body), {"bookmarks": [
+            {"id": "bookmark_2", "category": self.test_category_name, "tweet": self.test_tweet, "created_at": "2023-01-02 12:00:00"},
+            {"id": "bookmark_1", "category": "ニュース", "tweet": self.test_tweet, "created_at": "2023-01-01 12:00:00"}
+        ]})
+        args, kwargs = mock_cursor.execute.call_args
+        self.assertIn("b.categorize_id = ?", args[0])
+        self.assertEqual(args[1], [self.test_category_id])
+
+        # 該当するブックマークがない場合は空の配列
+        mock_cursor.__iter__.return_value = iter([])
+        self.assertEqual(json.loads(get_bookmarks_json(None)), {"bookmarks": []})
+
+    @patch('bookmarks_categorize.modules.crud.get_connection')
+    def test_iter_bookmarks_ndjson(self, mock_get_connection):
+        """ブックマークをNDJSONとしてキーセットのバッチごとに読み出すテスト"""
+        # モックの設定
+        mock_conn = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        tweet_json = json.dumps(self.test_tweet, ensure_ascii=False)
+        mock_conn.execute.return_value.fetchall.side_effect = [
+            [
+                ("bookmark_2", self.test_category_name, tweet_json, "2023-01-02 12:00:00"),
+                ("bookmark_1", self.test_category_name, tweet_json, "2023-01-01 12:00:00")
+            ],
+            [(self.test_bookmark_id, "ニュース", tweet_json, "2023-01-01 00:00:00")]
+        ]
+
+        # 関数実行
+        chunks = list(iter_bookmarks_ndjson(self.test_category_id, batch_size=2))
+
+        # アサーション
+        self.assertEqual(len(chunks), 2)
+        lines = b"".join(chunks).decode("utf-8").splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {"id": "bookmark_2", "category": self.test_category_name, "tweet": self.test_tweet, "created_at": "2023-01-02 12:00:00"},
+            {"id": "bookmark_1", "category": self.test_category_name, "tweet": self.test_tweet, "created_at": "2023-01-01 12:00:00"},
+            {"id": self.test_bookmark_id, "category": "ニュース", "tweet": self.test_tweet, "created_at": "2023-01-01 00:00:00"}
+        ])
+        # バッチごとに接続を借りて返却する
+        self.assertEqual(mock_get_connection.call_count, 2)
+        (first_sql, first_params), (second_sql, second_params) = [call.args for call in mock_conn.execute.call_args_list]
+        self.assertNotIn("(b.created_at, b.id) < (?, ?)", first_sql)
+        self.assertEqual(first_params, [self.test_category_id, 2])
+        # 2回目は1回目の最後の行の続きから読み出す
+        self.assertIn("(b.created_at, b.id) < (?, ?)", second_sql)
+        self.assertEqual(second_params, [self.test_category_id, "2023-01-01 12:00:00", "bookmark_1", 2])
+
+    @patch('bookmarks_categorize.modules.crud.get_connection')
+    def test_iter_bookmarks_ndjson_with_cursor(self, mock_get_connection):
+        """カーソルと件数を指定してNDJSONを読み出すテスト"""
+        # モックの設定
+        mock_conn = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.execute.return_value.fetchall.return_value = []
+        cursor = encode_cursor("2023-01-04 12:00:00", "bookmark_4")
+
+        # 関数実行
+        self.assertEqual(list(iter_bookmarks_ndjson(None, 10, cursor)), [])
+
+        # アサーション
+        args, kwargs = mock_conn.execute.call_args
+        self.assertIn("(b.created_at, b.id) < (?, ?)", args[0])
+        self.assertIn("LIMIT ?", args[0])
+        self.assertEqual(args[1], ["2023-01-04 12:00:00", "bookmark_4", 10])
+
+    def test_decode_cursor_invalid(self):
+        """不正なカーソルのテスト"""
+        with self.assertRaises(ValueError):
+            decode_cursor("invalid")
 
     @patch('bookmarks_categorize.modules.crud.get_connection')
     def test_get_all_categories(self, mock_get_connection):
@@ -180,5 +340,279 @@ class TestCrudFunctions(unittest.TestCase):
         mock_cursor.execute.assert_called_once()
 
 
+
+class TestBookmarkUpsert(TempDBTestCase):
+    """ツイートIDによるブックマークの重複排除のテスト（一時ファイルのSQLiteを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        super().setUp()
+        self.tweets = [{"tweet_id": str(i), "full_text": f"ツイート{i}"} for i in range(3)]
+
+    def count_bookmarks(self) -> int:
+        with get_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM bookmarks").fetchone()[0]
+
+    def test_reimport_is_idempotent(self):
+        """同じツイートを再インポートしても重複しないテスト"""
+        bulk_insert_bookmarks([(f"first_{i}", "テクノロジー", tweet) for i, tweet in enumerate(self.tweets)])
+        updated = bulk_insert_bookmarks([(f"second_{i}", "テクノロジー", tweet) for i, tweet in enumerate(self.tweets)])
+
+        self.assertEqual(updated, 0)
+        self.assertEqual(self.count_bookmarks(), 3)
+        with get_connection() as conn:
+            ids = [row[0] for row in conn.execute("SELECT id FROM bookmarks ORDER BY id")]
+        self.assertEqual(ids, ["first_0", "first_1", "first_2"])
+
+    def test_reimport_updates_category(self):
+        """分類が変わったツイートは既存の行が更新されるテスト"""
+        bulk_insert_bookmarks([("first", "テクノロジー", self.tweets[0])])
+        insert_bookmark("second", get_or_create_category("ニュース"), self.tweets[0])
+
+        self.assertEqual(self.count_bookmarks(), 1)
+        self.assertEqual(get_category_by_tweet(self.tweets[0]), "ニュース")
+
+    def test_get_category_by_tweet(self):
+        """保存済みのツイートの分類項目を取得するテスト"""
+        bulk_insert_bookmarks([("first", "テクノロジー", self.tweets[0])])
+
+        self.assertEqual(get_category_by_tweet({"tweet_url": "https://x.com/u/status/0"}), "テクノロジー")
+        self.assertIsNone(get_category_by_tweet(self.tweets[1]))
+        self.assertIsNone(get_category_by_tweet({"full_text": "IDなし"}))
+
+    def test_writes_bump_data_version(self):
+        """書き込みごとに読み取りキャッシュのバージョンが上がるテスト"""
+        version = data_version.value
+        category_id = get_or_create_category("テクノロジー")
+        self.assertEqual(data_version.value, version + 1)
+
+        # 既存のカテゴリは書き込みがないので変わらない
+        get_or_create_category("テクノロジー")
+        insert_bookmark("first", category_id, self.tweets[0])
+        bulk_insert_bookmarks([("second", "ニュース", self.tweets[1])])
+        self.assertEqual(data_version.value, version + 3)
+
+    def test_get_category(self):
+        """カテゴリを1件取得するテスト"""
+        category_id = get_or_create_category("テクノロジー")
+
+        self.assertEqual(get_category(category_id)["name"], "テクノロジー")
+        self.assertIsNone(get_category(category_id + 1))
+
+    def test_listeners_called_after_release(self):
+        """書き込み後の処理は接続をプールに返却してから呼び出されるテスト"""
+        in_use = []
+
+        def listener(bookmarks):
+            pool = get_pool()
+            in_use.append(len(pool._connections) - pool._idle.qsize())
+        add_write_listener(listener)
+        try:
+            bulk_insert_bookmarks([(f"b_{i}", "テクノロジー", tweet) for i, tweet in enumerate(self.tweets)], batch_size=2)
+            insert_bookmark("c", get_or_create_category("ニュース"), {"tweet_id": "9"})
+        finally:
+            remove_write_listener(listener)
+
+        # 一括挿入はバッチごとではなく最後にまとめて1回
+        self.assertEqual(in_use, [0, 0])
+
+    def test_iter_bookmarks_ndjson_releases_connection(self):
+        """NDJSONの読み出し中はバッチの間で接続をプールに返却し、limit の件数で打ち切るテスト"""
+        bulk_insert_bookmarks([(f"b_{i}", "テクノロジー", {"tweet_id": str(i)}) for i in range(5)])
+        pool = get_pool()
+
+        lines = iter_bookmarks_ndjson(batch_size=2)
+        chunks = []
+        for chunk in lines:
+            chunks.append(chunk)
+            self.assertEqual(len(pool._connections) - pool._idle.qsize(), 0)
+        ids = [json.loads(line)["id"] for line in b"".join(chunks).splitlines()]
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sorted(ids), [f"b_{i}" for i in range(5)])
+        self.assertEqual(len(set(ids)), 5)
+        self.assertEqual(len(b"".join(iter_bookmarks_ndjson(limit=3, batch_size=2)).splitlines()), 3)
+
+    def test_tweets_without_id(self):
+        """ツイートIDを取り出せないブックマークはそれぞれ保存されるテスト"""
+        tweet = {"full_text": "IDなし"}
+        bulk_insert_bookmarks([("first", "テクノロジー", tweet), ("second", "テクノロジー", tweet)])
+
+        self.assertEqual(self.count_bookmarks(), 2)
+
+
+class TestBookmarkFilters(TempDBTestCase):
+    """投稿者・投稿日時・メディア・URLのドメインによる絞り込みのテスト（一時ファイルのSQLiteを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        super().setUp()
+        bulk_insert_bookmarks([
+            ("a", "テクノロジー", {
+                "tweet_id": "1", "screen_name": "Alice", "full_text": "https://github.com/x",
+                "tweeted_at": "2024-01-01T00:00:00Z", "extended_media": "[{}]"
+            }),
+            ("b", "テクノロジー", {
+                "tweet_id": "2", "screen_name": "bob", "full_text": "https://www.example.com/",
+                "tweeted_at": "2024-02-01T00:00:00Z"
+            }),
+            ("c", "ニュース", {
+                "tweet_id": "3", "screen_name": "alice", "full_text": "本文のみ",
+                "tweeted_at": "2024-03-01T00:00:00Z"
+            })
+        ])
+
+    def ids(self, **filters) -> list[str]:
+        bookmarks, _ = get_bookmarks_page(None, 50, None, **filters)
+        return sorted(bookmark["id"] for bookmark in bookmarks)
+
+    def test_filter_by_screen_name(self):
+        """投稿者で絞り込むテスト（大文字小文字と@は区別しない）"""
+        self.assertEqual(self.ids(screen_name="@ALICE"), ["a", "c"])
+
+    def test_filter_by_tweeted_at(self):
+        """投稿日時で絞り込むテスト（since 以上 until 未満）"""
+        self.assertEqual(self.ids(since="2024-02-01"), ["b", "c"])
+        self.assertEqual(self.ids(since="2024-01-15", until="2024-03-01"), ["b"])
+        with self.assertRaises(ValueError):
+            self.ids(since="先月")
+
+    def test_filter_by_media_and_domain(self):
+        """メディアの有無とURLのドメインで絞り込むテスト"""
+        self.assertEqual(self.ids(has_media=True), ["a"])
+        self.assertEqual(self.ids(has_media=False), ["b", "c"])
+        self.assertEqual(self.ids(domain="Example.com"), ["b"])
+        self.assertEqual(self.ids(domain="github.com", screen_name="bob"), [])
+
+    def test_filters_with_category(self):
+        """カテゴリと絞り込み条件を組み合わせるテスト"""
+        category_id = next(
+            category["id"] for category in get_all_categories() if category["name"] == "ニュース"
+        )
+        bookmarks, _ = get_bookmarks_page(category_id, 50, None, screen_name="alice")
+
+        self.assertEqual([bookmark["id"] for bookmark in bookmarks], ["c"])
+
+    def test_upsert_replaces_urls(self):
+        """再インポートで本文が変わった場合にURLが置き換わるテスト"""
+        bulk_insert_bookmarks([("a2", "ニュース", {"tweet_id": "1", "full_text": "https://docs.python.org/"})])
+
+        self.assertEqual(self.ids(domain="github.com"), [])
+        self.assertEqual(self.ids(domain="docs.python.org"), ["a"])
+
+
+class TestCategoryLabels(TempDBTestCase):
+    """複数カテゴリの付与・親カテゴリ・カテゴリごとの件数のテスト（一時ファイルのSQLiteを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        super().setUp()
+        bulk_insert_bookmarks([
+            ("a", "テクノロジー", {"tweet_id": "1"}),
+            ("b", "テクノロジー", {"tweet_id": "2"}),
+            ("c", "ニュース", {"tweet_id": "3"})
+        ])
+        self.ids = {category["name"]: category["id"] for category in get_all_categories()}
+
+    def counts(self) -> dict:
+        """カテゴリ名ごとの (bookmark_count, label_count)"""
+        return {
+            category["name"]: (category["bookmark_count"], category["label_count"])
+            for category in get_categories_with_counts()
+        }
+
+    def assert_counts_consistent(self):
+        """トリガーで更新した件数が数え直した件数と一致すること"""
+        with get_connection() as conn:
+            actual = conn.execute("""
+                SELECT c.id,
+                    (SELECT COUNT(*) FROM bookmarks b WHERE b.categorize_id = c.id AND b.is_deleted = 0),
+                    (SELECT COUNT(*) FROM bookmark_categories bc JOIN bookmarks b ON b.id = bc.bookmark_id
+                     WHERE bc.category_id = c.id AND b.is_deleted = 0)
+                FROM bookmarks_category c ORDER BY c.id
+            """).fetchall()
+        counts = {category["id"]: category for category in get_categories_with_counts()}
+        for category_id, bookmark_count, label_count in actual:
+            self.assertEqual(
+                (counts[category_id]["bookmark_count"], counts[category_id]["label_count"]),
+                (bookmark_count, label_count)
+            )
+
+    def test_counts_on_insert_and_move(self):
+        """挿入と主カテゴリの変更で件数が更新されるテスト"""
+        self.assertEqual(self.counts(), {"テクノロジー": (2, 2), "ニュース": (1, 1)})
+
+        # 再インポートで分類が変わると主カテゴリが付け替わる
+        bulk_insert_bookmarks([("a2", "ニュース", {"tweet_id": "1"})])
+
+        self.assertEqual(self.counts(), {"テクノロジー": (1, 1), "ニュース": (2, 2)})
+        self.assertEqual(get_bookmark_category_ids("a"), [self.ids["ニュース"]])
+        self.assert_counts_consistent()
+
+    def test_move_to_existing_label(self):
+        """追加のカテゴリとして付いているカテゴリに、再インポートで主カテゴリを変えられるテスト（UPSERT の経路）"""
+        news_id = self.ids["ニュース"]
+        set_bookmark_categories("a", [news_id])
+
+        insert_bookmark("a2", news_id, {"tweet_id": "1"})
+        self.assertEqual(get_bookmark_category_ids("a"), [news_id])
+
+        # 一括挿入でも同じ経路を通り、バッチの他の行も保存される
+        set_bookmark_categories("b", [news_id])
+        bulk_insert_bookmarks([("b2", "ニュース", {"tweet_id": "2"}), ("d", "ニュース", {"tweet_id": "4"})])
+
+        self.assertEqual(get_bookmark_category_ids("b"), [news_id])
+        self.assertEqual(self.counts(), {"テクノロジー": (0, 0), "ニュース": (4, 4)})
+        self.assert_counts_consistent()
+
+    def test_set_bookmark_categories(self):
+        """主カテゴリ以外のカテゴリを付け外しするテスト"""
+        news_id = self.ids["ニュース"]
+        tech_id = self.ids["テクノロジー"]
+
+        self.assertEqual(set_bookmark_categories("a", [news_id]), sorted([tech_id, news_id]))
+        self.assertEqual(self.counts(), {"テクノロジー": (2, 2), "ニュース": (1, 2)})
+        bookmarks, _ = get_bookmarks_page(None, 50, None, label_id=news_id)
+        self.assertEqual(sorted(bookmark["id"] for bookmark in bookmarks), ["a", "c"])
+
+        # 空にしても主カテゴリは残る
+        self.assertEqual(set_bookmark_categories("a", []), [tech_id])
+        self.assertEqual(self.counts(), {"テクノロジー": (2, 2), "ニュース": (1, 1)})
+
+        self.assertIsNone(set_bookmark_categories("missing", [news_id]))
+        with self.assertRaises(ValueError):
+            set_bookmark_categories("a", [9999])
+        self.assert_counts_consistent()
+
+    def test_counts_on_delete(self):
+        """論理削除・復元・物理削除で件数が更新されるテスト"""
+        set_bookmark_categories("a", [self.ids["ニュース"]])
+        with get_connection() as conn:
+            conn.execute("UPDATE bookmarks SET is_deleted = 1 WHERE id = 'a'")
+            conn.commit()
+        self.assertEqual(self.counts(), {"テクノロジー": (1, 1), "ニュース": (1, 1)})
+
+        with get_connection() as conn:
+            conn.execute("UPDATE bookmarks SET is_deleted = 0 WHERE id = 'a'")
+            conn.execute("DELETE FROM bookmarks WHERE id = 'b'")
+            conn.commit()
+        self.assertEqual(self.counts(), {"テクノロジー": (1, 1), "ニュース": (1, 2)})
+        self.assert_counts_consistent()
+
+    def test_set_category_parent(self):
+        """親カテゴリを設定するテスト（循環と存在しない親はエラー）"""
+        parent_id = get_or_create_category("学び")
+        set_category_parent(self.ids["テクノロジー"], parent_id)
+
+        self.assertEqual(get_category(self.ids["テクノロジー"])["parent_id"], parent_id)
+        with self.assertRaises(ValueError):
+            set_category_parent(parent_id, self.ids["テクノロジー"])
+        with self.assertRaises(ValueError):
+            set_category_parent(parent_id, 9999)
+
+        set_category_parent(self.ids["テクノロジー"], None)
+        self.assertIsNone(get_category(self.ids["テクノロジー"])["parent_id"])
+
+
 if __name__ == '__main__':
     unittest.main()
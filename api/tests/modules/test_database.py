@@ -2,16 +2,26 @@ import unittest
 from unittest.mock import patch, MagicMock, mock_open
 import os
 import sqlite3
-from bookmarks_categorize.modules.database import get_connection, init_db, db_path
+import tempfile
+from bookmarks_categorize.modules.database import get_connection, init_db, db_path, close_pool, ConnectionPool, PoolTimeoutError
 
 class TestDatabaseFunctions(unittest.TestCase):
     """データベースモジュールの関数のテスト"""
 
+    def setUp(self):
+        """各テスト前の準備"""
+        close_pool()
+
+    def tearDown(self):
+        """各テスト後の後始末"""
+        close_pool()
+
     @patch('bookmarks_categorize.modules.database.sqlite3.connect')
     def test_get_connection(self, mock_connect):
         """get_connectionコンテキストマネージャーのテスト"""
         # モックの設定
         mock_conn = MagicMock()
+        mock_conn.in_transaction = False
         mock_connect.return_value = mock_conn
         
         # コンテキストマネージャーの使用
@@ -19,21 +29,30 @@ class TestDatabaseFunctions(unittest.TestCase):
             # 接続が返されることを確認
             self.assertEqual(conn, mock_conn)
             # 正しいパスで接続が行われたことを確認
-            mock_connect.assert_called_once_with(db_path)
+            mock_connect.assert_called_once()
+            self.assertEqual(mock_connect.call_args[0][0], db_path)
+            # WAL モードが設定されることを確認
+            conn.execute.assert_any_call("PRAGMA journal_mode=WAL")
         
-        # コンテキストマネージャーを抜けた後に接続がクローズされることを確認
+        # コンテキストマネージャーを抜けても接続はクローズされずプールに返却される
+        mock_conn.close.assert_not_called()
+        with get_connection() as conn:
+            self.assertEqual(conn, mock_conn)
+        mock_connect.assert_called_once()
+
+        # プールをクローズすると接続がクローズされることを確認
+        close_pool()
         mock_conn.close.assert_called_once()
 
     @patch('bookmarks_categorize.modules.database.os.makedirs')
+    @patch('bookmarks_categorize.modules.database.migrate')
     @patch('bookmarks_categorize.modules.database.sqlite3.connect')
     @patch('bookmarks_categorize.modules.database.os.path.dirname')
-    def test_init_db(self, mock_dirname, mock_connect, mock_makedirs):
+    def test_init_db(self, mock_dirname, mock_connect, mock_migrate, mock_makedirs):
         """init_db関数のテスト"""
         # モックの設定
         mock_conn = MagicMock()
-        mock_cursor = MagicMock()
         mock_connect.return_value = mock_conn
-        mock_conn.cursor.return_value = mock_cursor
         mock_dirname.return_value = "/mock/path"
         
         # 関数実行
@@ -45,11 +64,8 @@ class TestDatabaseFunctions(unittest.TestCase):
         # 接続が行われることを確認
         mock_connect.assert_called_once_with(db_path)
         
-        # カーソルが取得されることを確認
-        mock_conn.cursor.assert_called_once()
-        
-        # テーブル作成のSQLが実行されることを確認
-        self.assertEqual(mock_cursor.execute.call_count, 2)  # 2つのテーブル作成
+        # マイグレーションが適用されることを確認
+        mock_migrate.assert_called_once_with(mock_conn)
         
         # コミットが行われることを確認
         mock_conn.commit.assert_called_once()
@@ -62,6 +78,7 @@ class TestDatabaseFunctions(unittest.TestCase):
         """get_connectionコンテキストマネージャーの例外処理のテスト"""
         # モックの設定
         mock_conn = MagicMock()
+        mock_conn.in_transaction = True
         mock_connect.return_value = mock_conn
         
         # 例外を発生させる
@@ -75,9 +92,67 @@ class TestDatabaseFunctions(unittest.TestCase):
         except sqlite3.Error:
             pass  # 期待通りの例外
         
-        # 例外が発生しても接続がクローズされることを確認
+        # 例外が発生しても未コミットの変更はロールバックされてプールに返却される
+        mock_conn.rollback.assert_called_once()
+        close_pool()
         mock_conn.close.assert_called_once()
 
 
+class TestConnectionPool(unittest.TestCase):
+    """ConnectionPoolクラスのテスト（一時ファイルのSQLiteを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp_dir.name, "bookmarks.db"), size=2, mmap_size=1024 * 1024)
+
+    def tearDown(self):
+        """各テスト後の後始末"""
+        self.pool.close()
+        self.tmp_dir.cleanup()
+
+    def test_pragmas(self):
+        """接続にPRAGMAが設定されることのテスト"""
+        conn = self.pool.acquire()
+
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+        self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 5000)
+        self.pool.release(conn)
+
+    def test_pool_size(self):
+        """上限数を超えて接続が作成されないことのテスト"""
+        conn1 = self.pool.acquire()
+        conn2 = self.pool.acquire()
+
+        with self.assertRaises(sqlite3.OperationalError):
+            self.pool.acquire(timeout=0.01)
+        self.pool.release(conn1)
+        self.assertIs(self.pool.acquire(timeout=0.01), conn1)
+        self.pool.release(conn2)
+
+    def test_acquire_default_timeout(self):
+        """待ち時間を指定しない場合もプールの既定の秒数で打ち切られることのテスト"""
+        pool = ConnectionPool(os.path.join(self.tmp_dir.name, "bookmarks.db"), size=1, acquire_timeout_seconds=0.01)
+        conn = pool.acquire()
+        try:
+            with self.assertRaises(PoolTimeoutError):
+                pool.acquire()
+        finally:
+            pool.release(conn)
+            pool.close()
+
+    def test_release_rollback(self):
+        """コミットされていない変更が返却時にロールバックされることのテスト"""
+        conn = self.pool.acquire()
+        conn.execute("CREATE TABLE t (v INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+        self.pool.release(conn)
+
+        conn = self.pool.acquire()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+        self.pool.release(conn)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,8 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import json
-from bookmarks_categorize.modules.dify import DifyModule
+import requests
+from bookmarks_categorize.modules.dify import DifyModule, DifyError
 from bookmarks_categorize.config import Settings
 
 class TestDifyModule(unittest.TestCase):
@@ -13,7 +14,6 @@ class TestDifyModule(unittest.TestCase):
         settings = Settings()
         self.dify_module = DifyModule(
             dify_api_key_categorize_json = settings.dify_api_key_categorize_json,
-            dify_api_key_csv_to_json = settings.dify_api_key_csv_to_json,
             dify_base_url = settings.dify_base_url,
             dify_user = settings.dify_user
         )
@@ -26,7 +26,7 @@ class TestDifyModule(unittest.TestCase):
             }
         })
 
-    @patch('bookmarks_categorize.modules.dify.requests.post')
+    @patch('bookmarks_categorize.modules.dify.requests.Session.post')
     def test_categorized_json_success(self, mock_post):
         """categorized_jsonメソッドが成功した場合のテスト"""
         # モックレスポンスの設定
@@ -55,8 +55,9 @@ class TestDifyModule(unittest.TestCase):
         self.assertIn("Authorization", kwargs["headers"])
         self.assertIn("Content-Type", kwargs["headers"])
         self.assertEqual(kwargs["headers"]["Content-Type"], "application/json")
+        self.assertEqual(kwargs["timeout"], self.dify_module.timeout)
 
-    @patch('bookmarks_categorize.modules.dify.requests.post')
+    @patch('bookmarks_categorize.modules.dify.requests.Session.post')
     def test_categorized_json_failure(self, mock_post):
         """categorized_jsonメソッドが失敗した場合のテスト"""
         # 例外を発生させるようにモックを設定
@@ -71,48 +72,83 @@ class TestDifyModule(unittest.TestCase):
         self.assertRaises(Exception, self.dify_module.categorized_json, self.test_bookmark_json)
         # mock_error.assert_called_once_with("ワークフロー実行エラー: API接続エラー")
 
-    @patch('bookmarks_categorize.modules.dify.requests.post')
-    def test_upload_file(self, mock_post):
-        """upload_fileメソッドのテスト"""
-        # モックファイルの作成
-        mock_file = MagicMock()
-        mock_file.name = "test.csv"
-        mock_file.read.return_value = b"test,data"
-        mock_file.type = "text/csv"
+    @patch('bookmarks_categorize.modules.dify.requests.Session.post')
+    def test_categorized_json_request_error(self, mock_post):
+        """通信エラーがDifyErrorとして元の例外付きで送出されるテスト"""
+        mock_post.side_effect = requests.exceptions.ConnectionError("API接続エラー")
 
-        # モックレスポンスの設定
-        mock_response = MagicMock()
-        mock_response.status_code = 201
-        mock_response.json.return_value = {"id": "file_123"}
-        mock_post.return_value = mock_response
+        with self.assertRaises(DifyError) as context:
+            self.dify_module.categorized_json(self.test_bookmark_json)
 
-        # メソッド実行
-        result = self.dify_module.upload_file(mock_file)
+        self.assertIn("ワークフロー実行エラー", str(context.exception))
+        self.assertIsInstance(context.exception.__cause__, requests.exceptions.ConnectionError)
 
-        # アサーション
-        self.assertEqual(result, {"id": "file_123"})
-        mock_post.assert_called_once()
+    def test_extract_category(self):
+        """extract_categoryメソッドのテスト"""
+        run_workflow_result = {
+            "data": {
+                "outputs": {
+                    "categorized_bookmark_json": '{"分類項目": "テクノロジー"}'
+                }
+            }
+        }
+
+        self.assertEqual(DifyModule.extract_category(run_workflow_result), "テクノロジー")
 
-    @patch('bookmarks_categorize.modules.dify.requests.post')
-    def test_convert_csv_to_json(self, mock_post):
-        """convert_csv_to_jsonメソッドのテスト"""
+    @patch('bookmarks_categorize.modules.dify.requests.Session.post')
+    def test_categorized_json_batch(self, mock_post):
+        """categorized_json_batchメソッドのテスト"""
         # モックレスポンスの設定
         mock_response = MagicMock()
         mock_response.json.return_value = {
             "data": {
                 "outputs": {
-                    "bookmarks_json": [{"tweet_id": "123", "text": "テスト"}]
+                    "categorized_bookmark_json": '[{"index": 1, "分類項目": "ニュース"}, {"index": 0, "分類項目": "テクノロジー"}]'
                 }
             }
         }
         mock_post.return_value = mock_response
 
         # メソッド実行
-        result = self.dify_module.convert_csv_to_json("file_123")
+        result = self.dify_module.categorized_json_batch([self.test_bookmark_json, self.test_bookmark_json])
 
         # アサーション
-        self.assertEqual(result["data"]["outputs"]["bookmarks_json"], [{"tweet_id": "123", "text": "テスト"}])
+        self.assertEqual(result, ["テクノロジー", "ニュース"])
         mock_post.assert_called_once()
+        args, kwargs = mock_post.call_args
+        self.assertEqual(json.loads(kwargs["json"]["inputs"]["bookmark_json"]), [json.loads(self.test_bookmark_json)] * 2)
+        self.assertEqual(kwargs["timeout"], self.dify_module.timeout * 2)
+
+    @patch('bookmarks_categorize.modules.dify.requests.Session.post')
+    def test_categorized_json_batch_request_error(self, mock_post):
+        """バッチ実行の通信エラー・応答の解析エラーがDifyErrorとして元の例外付きで送出されるテスト"""
+        mock_post.side_effect = requests.exceptions.ConnectionError("API接続エラー")
+        with self.assertRaises(DifyError) as context:
+            self.dify_module.categorized_json_batch([self.test_bookmark_json])
+        self.assertIsInstance(context.exception.__cause__, requests.exceptions.ConnectionError)
+
+        mock_response = MagicMock()
+        mock_response.json.side_effect = requests.exceptions.JSONDecodeError("Expecting value", "<html>", 0)
+        mock_post.side_effect = None
+        mock_post.return_value = mock_response
+        with self.assertRaises(DifyError) as context:
+            self.dify_module.categorized_json_batch([self.test_bookmark_json])
+        self.assertIsInstance(context.exception.__cause__, requests.exceptions.JSONDecodeError)
+
+    def test_extract_batch_categories_incomplete(self):
+        """バッチ実行の結果が不正・欠落している場合のテスト"""
+        def make_result(categorized_bookmark_json):
+            return {"data": {"outputs": {"categorized_bookmark_json": categorized_bookmark_json}}}
+
+        # 件数が足りない・不正な要素は None
+        self.assertEqual(
+            DifyModule.extract_batch_categories(make_result('[{"分類項目": "テクノロジー"}, {"foo": 1}]'), 3),
+            ["テクノロジー", None, None]
+        )
+        # 配列でない・JSONでない場合はすべて None
+        self.assertEqual(DifyModule.extract_batch_categories(make_result('{"分類項目": "テクノロジー"}'), 2), [None, None])
+        self.assertEqual(DifyModule.extract_batch_categories(make_result('not json'), 2), [None, None])
+        self.assertEqual(DifyModule.extract_batch_categories({"data": {}}, 1), [None])
 
 
 if __name__ == '__main__':
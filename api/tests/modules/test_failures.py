@@ -0,0 +1,69 @@
+import unittest
+from bookmarks_categorize.modules.failures import (
+    count_failures,
+    failure_key,
+    format_error,
+    get_failures,
+    record_failures,
+    resolve_failures
+)
+from tests.db_test_case import TempDBTestCase
+
+
+class TestFailures(TempDBTestCase):
+    """デッドレター（分類に失敗したブックマーク）のテスト（一時ファイルのSQLiteを使用）"""
+
+    def test_record_and_get(self):
+        """失敗したブックマークがエラー内容と試行回数つきで古い順に取得できるテスト"""
+        record_failures([
+            ({"tweet_id": "1", "full_text": "a"}, "DifyError: timeout"),
+            ({"tweet_id": "2", "full_text": "b"}, "KeyError: '分類項目'")
+        ])
+
+        failures = get_failures()
+
+        self.assertEqual([failure["tweet_id"] for failure in failures], ["1", "2"])
+        self.assertEqual(failures[0]["tweet"], {"tweet_id": "1", "full_text": "a"})
+        self.assertEqual(failures[0]["error"], "DifyError: timeout")
+        self.assertEqual(failures[0]["attempts"], 1)
+        self.assertEqual([failure["tweet_id"] for failure in get_failures(limit=1)], ["1"])
+        self.assertEqual(count_failures(), 2)
+
+    def test_record_same_tweet_increments_attempts(self):
+        """同じツイートが再び失敗した場合は行を増やさず試行回数を増やすテスト"""
+        record_failures([({"tweet_id": "1"}, "DifyError: timeout")])
+        record_failures([({"tweet_id": "1"}, "DifyError: 500")])
+
+        failures = get_failures()
+
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0]["attempts"], 2)
+        self.assertEqual(failures[0]["error"], "DifyError: 500")
+
+    def test_tweet_without_id(self):
+        """ツイートIDのないブックマークは内容のハッシュで重複を判定するテスト"""
+        record_failures([({"full_text": "a"}, "error"), ({"full_text": "a"}, "error"), ({"full_text": "b"}, "error")])
+
+        failures = get_failures()
+
+        self.assertEqual([failure["attempts"] for failure in failures], [2, 1])
+        self.assertIsNone(failures[0]["tweet_id"])
+        self.assertTrue(failure_key({"full_text": "a"}).startswith("sha256:"))
+        self.assertEqual(failure_key({"tweet_url": "https://x.com/a/status/123"}), "123")
+
+    def test_resolve_failures(self):
+        """分類に成功したツイートだけがデッドレターから取り除かれるテスト"""
+        record_failures([({"tweet_id": "1"}, "error"), ({"tweet_id": "2"}, "error")])
+
+        removed = resolve_failures([{"tweet_id": "1", "full_text": "更新後"}, {"tweet_id": "3"}])
+
+        self.assertEqual(removed, 1)
+        self.assertEqual([failure["tweet_id"] for failure in get_failures()], ["2"])
+
+    def test_format_error(self):
+        """例外を型名つきの文字列にするテスト"""
+        self.assertEqual(format_error(TimeoutError("timeout")), "TimeoutError: timeout")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import time
+import requests
+from bookmarks_categorize.modules.http_client import HTTPClient, TokenBucket
+
+
+def make_response(status_code: int, headers: dict | None = None) -> MagicMock:
+    """レスポンスのモックを作成する"""
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+class TestHTTPClient(unittest.TestCase):
+    """HTTPClientクラスのテスト"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.client = HTTPClient(timeout=5, max_retries=3, backoff_base=0.5, backoff_max=4)
+        # 待ち時間は実際には待たずに記録する
+        self.sleep_patcher = patch('bookmarks_categorize.modules.http_client.time.sleep')
+        self.mock_sleep = self.sleep_patcher.start()
+
+    def tearDown(self):
+        """各テスト後の後始末"""
+        self.sleep_patcher.stop()
+
+    @patch('requests.Session.post')
+    def test_success(self, mock_post):
+        """成功した場合は再試行しないテスト"""
+        mock_post.return_value = make_response(200)
+
+        response = self.client.post("https://example.com", json={"a": 1})
+
+        self.assertEqual(response.status_code, 200)
+        mock_post.assert_called_once_with("https://example.com", json={"a": 1}, timeout=5)
+        self.mock_sleep.assert_not_called()
+
+    @patch('requests.Session.post')
+    def test_retry_after(self, mock_post):
+        """429 の場合は Retry-After の秒数だけ待って再試行するテスト"""
+        mock_post.side_effect = [make_response(429, {"Retry-After": "7"}), make_response(200)]
+
+        response = self.client.post("https://example.com")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.call_count, 2)
+        self.mock_sleep.assert_called_once_with(7.0)
+
+    @patch('requests.Session.get')
+    def test_rate_limit_reset(self, mock_get):
+        """x-rate-limit-reset の時刻まで待って再試行するテスト"""
+        reset = str(int(time.time()) + 30)
+        mock_get.side_effect = [
+            make_response(429, {"x-rate-limit-remaining": "0", "x-rate-limit-reset": reset}),
+            make_response(200)
+        ]
+
+        self.client.get("https://example.com")
+
+        wait = self.mock_sleep.call_args[0][0]
+        self.assertGreater(wait, 25)
+        self.assertLessEqual(wait, 30)
+
+    @patch('requests.Session.post')
+    def test_retry_server_error_with_backoff(self, mock_post):
+        """5xx の場合はジッター付きの指数バックオフで再試行し、上限に達したら最後のレスポンスを返すテスト"""
+        mock_post.return_value = make_response(503)
+
+        response = self.client.post("https://example.com", idempotent=True)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(mock_post.call_count, 4)
+        waits = [call.args[0] for call in self.mock_sleep.call_args_list]
+        for attempt, wait in enumerate(waits):
+            self.assertGreaterEqual(wait, 0)
+            self.assertLessEqual(wait, min(4, 0.5 * 2 ** attempt))
+
+    @patch('requests.Session.post')
+    def test_retry_connection_error(self, mock_post):
+        """接続エラー・タイムアウトを再試行し、上限に達したら例外を送出するテスト"""
+        mock_post.side_effect = [requests.exceptions.ConnectionError("接続エラー"), make_response(200)]
+        self.assertEqual(self.client.post("https://example.com").status_code, 200)
+
+        mock_post.side_effect = requests.exceptions.Timeout("タイムアウト")
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.client.post("https://example.com", idempotent=True)
+        self.assertEqual(mock_post.call_count, 2 + 4)
+
+    @patch('requests.Session.post')
+    def test_no_retry_non_idempotent_post(self, mock_post):
+        """冪等でない POST は、処理された可能性のある読み込みタイムアウト・5xx・Retry-After なしの 503 を再試行しないテスト"""
+        mock_post.side_effect = requests.exceptions.ReadTimeout("タイムアウト")
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.client.post("https://example.com")
+        mock_post.assert_called_once()
+
+        for status_code in (500, 502, 503, 504):
+            mock_post.reset_mock(side_effect=True)
+            mock_post.return_value = make_response(status_code)
+            self.assertEqual(self.client.post("https://example.com").status_code, status_code)
+            mock_post.assert_called_once()
+        self.mock_sleep.assert_not_called()
+
+    @patch('requests.Session.post')
+    def test_retry_non_idempotent_post_when_not_processed(self, mock_post):
+        """冪等でない POST も、Retry-After 付きの 503・429 は再試行するテスト"""
+        mock_post.side_effect = [make_response(503, {"Retry-After": "3"}), make_response(429), make_response(200)]
+
+        response = self.client.post("https://example.com")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(self.mock_sleep.call_args_list[0].args[0], 3.0)
+
+    def test_max_elapsed_seconds(self):
+        """タイムアウトを再試行しないリクエストの期限は、最後の1回のタイムアウトとバックオフの分だけになるテスト"""
+        self.assertEqual(self.client.max_elapsed_seconds(), 5 * 4 + 4 * 3)
+        self.assertEqual(self.client.max_elapsed_seconds(idempotent=False), 5 + 4 * 3)
+
+    @patch('requests.Session.post')
+    def test_no_retry_client_error(self, mock_post):
+        """4xx（429以外）は再試行しないテスト"""
+        mock_post.return_value = make_response(400)
+
+        self.assertEqual(self.client.post("https://example.com").status_code, 400)
+        mock_post.assert_called_once()
+
+    @patch('requests.Session.get')
+    def test_pause_when_remaining_exhausted(self, mock_get):
+        """残り回数を使い切ったレスポンスの後は、解除時刻まで次のリクエストを待たせるテスト"""
+        client = HTTPClient(rate_limit_per_second=100, rate_limit_burst=10)
+        reset = str(int(time.time()) + 60)
+        mock_get.return_value = make_response(200, {"x-rate-limit-remaining": "0", "x-rate-limit-reset": reset})
+
+        client.get("https://example.com")
+
+        # 次のトークンは解除時刻まで払い出されない
+        self.assertGreater(client.bucket._paused_until - time.monotonic(), 50)
+
+
+class TestTokenBucket(unittest.TestCase):
+    """TokenBucketクラスのテスト"""
+
+    def test_rate(self):
+        """バースト分を使い切った後は rate 件/秒で払い出されるテスト"""
+        bucket = TokenBucket(rate=50, capacity=2)
+
+        started_at = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        elapsed = time.monotonic() - started_at
+
+        # 2件は即座に、残り4件は 1/50 秒ごと
+        self.assertGreaterEqual(elapsed, 0.07)
+        self.assertLess(elapsed, 0.5)
+
+    def test_pause(self):
+        """pause した秒数は払い出さないテスト"""
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.05)
+
+        self.assertGreaterEqual(bucket.acquire(), 0.04)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import unittest
+import asyncio
+import threading
+from unittest.mock import patch, MagicMock
+import json
+from bookmarks_categorize.modules.database import get_connection, db_executor
+from bookmarks_categorize.modules.categorizer import CategorizeEngine
+from bookmarks_categorize.modules.crud import bulk_insert_bookmarks
+from bookmarks_categorize.modules.failures import get_failures
+from bookmarks_categorize.modules.jobs import (
+    JobRunner,
+    create_job,
+    open_job,
+    append_job_items,
+    queue_job,
+    delete_job,
+    get_job,
+    get_job_results,
+    get_pending_items,
+    get_unfinished_job_ids,
+    update_job_item,
+    ITEM_DONE,
+    JOB_COMPLETED,
+    JOB_FAILED
+)
+from tests.db_test_case import AsyncTempDBTestCase
+
+
+class TestJobs(AsyncTempDBTestCase):
+    """分類ジョブモジュールのテスト（一時ファイルのSQLiteを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        super().setUp()
+        self.bookmarks_json_list = [{"tweet_id": str(i), "text": f"ツイート{i}"} for i in range(3)]
+        self.dify_module = MagicMock()
+
+        def categorized_json(bookmark_json_str):
+            tweet = json.loads(bookmark_json_str)
+            if tweet["tweet_id"] == "2":
+                raise RuntimeError("API接続エラー")
+            return {"data": {"outputs": {"categorized_bookmark_json": '{"分類項目": "テクノロジー"}'}}}
+        self.dify_module.categorized_json.side_effect = categorized_json
+        self.job_runner = JobRunner(CategorizeEngine(self.dify_module, concurrency=2, timeout=5))
+
+    def tearDown(self):
+        """各テスト後の後始末"""
+        db_executor.shutdown()
+        super().tearDown()
+
+    def test_create_job(self):
+        """ジョブ作成直後の進捗のテスト"""
+        job_id = create_job(self.bookmarks_json_list)
+
+        job = get_job(job_id)
+        self.assertEqual(job["status"], "queued")
+        self.assertEqual((job["total"], job["done"], job["failed"]), (3, 0, 0))
+        self.assertEqual(len(get_pending_items(job_id)), 3)
+        self.assertEqual(get_unfinished_job_ids(), [job_id])
+        # インデックスの続きから件数を指定して読み進められる
+        self.assertEqual([index for index, _ in get_pending_items(job_id, after_index=0, limit=1)], [1])
+
+    def test_create_job_from_iterator(self):
+        """イテレーターからジョブを作成するテスト"""
+        job_id = create_job(bookmark_json for bookmark_json in self.bookmarks_json_list)
+
+        self.assertEqual(get_job(job_id)["total"], 3)
+        self.assertEqual(len(get_pending_items(job_id)), 3)
+
+    def test_create_job_in_chunks(self):
+        """アイテムを分けて登録し、登録が終わってから実行待ちになるテスト"""
+        job_id = open_job()
+        self.assertEqual(append_job_items(job_id, 0, self.bookmarks_json_list[:2]), 2)
+        self.assertEqual(append_job_items(job_id, 2, self.bookmarks_json_list[2:]), 1)
+
+        # 登録中のジョブは再開の対象にならない
+        self.assertEqual(get_job(job_id)["status"], "uploading")
+        self.assertEqual(get_unfinished_job_ids(), [])
+
+        queue_job(job_id)
+        job = get_job(job_id)
+        self.assertEqual((job["status"], job["total"]), ("queued", 3))
+        self.assertEqual([index for index, _ in get_pending_items(job_id)], [0, 1, 2])
+
+        delete_job(job_id)
+        self.assertIsNone(get_job(job_id))
+        self.assertEqual(get_pending_items(job_id), [])
+
+    def test_resume_deletes_uploading_jobs(self):
+        """登録の途中で止まったジョブは再開せずに削除するテスト"""
+        uploading_job_id = open_job()
+        append_job_items(uploading_job_id, 0, self.bookmarks_json_list)
+        queued_job_id = create_job(self.bookmarks_json_list)
+
+        with patch.object(self.job_runner, 'start') as mock_start:
+            self.assertEqual(self.job_runner.resume(), [queued_job_id])
+
+        mock_start.assert_called_once_with(queued_job_id)
+        self.assertIsNone(get_job(uploading_job_id))
+
+    def test_get_job_not_found(self):
+        """存在しないジョブを取得するテスト"""
+        self.assertIsNone(get_job("unknown"))
+
+    async def test_run_job(self):
+        """ジョブ実行で成功・失敗が記録され、分類結果がDBに保存されるテスト"""
+        job_id = create_job(self.bookmarks_json_list)
+
+        await self.job_runner.run(job_id)
+
+        job = get_job(job_id)
+        self.assertEqual(job["status"], JOB_COMPLETED)
+        self.assertEqual((job["total"], job["done"], job["failed"]), (3, 2, 1))
+        self.assertEqual(job["summary"]["categories"], {"テクノロジー": 2})
+        self.assertEqual(
+            [result["tweet_content"]["tweet_id"] for result in get_job_results(job_id)],
+            ["0", "1"]
+        )
+        self.assertEqual(get_unfinished_job_ids(), [])
+
+        with get_connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM bookmarks").fetchone()[0]
+        self.assertEqual(count, 2)
+
+        # 失敗したアイテムはデッドレターにも保存される
+        failures = get_failures()
+        self.assertEqual([failure["tweet_id"] for failure in failures], ["2"])
+        self.assertEqual(failures[0]["error"], "RuntimeError: API接続エラー")
+
+    async def test_resume_only_pending_items(self):
+        """再開時には未処理のアイテムだけが分類されるテスト"""
+        job_id = create_job(self.bookmarks_json_list[:2])
+        update_job_item(job_id, 0, ITEM_DONE, category="ニュース")
+
+        await self.job_runner.run(job_id)
+
+        self.dify_module.categorized_json.assert_called_once()
+        job = get_job(job_id)
+        self.assertEqual(job["done"], 2)
+        self.assertEqual(job["summary"]["categories"], {"ニュース": 1, "テクノロジー": 1})
+
+    async def test_run_job_in_pages(self):
+        """未処理のアイテムを少しずつ読み込み、分類結果をまとめて保存するテスト"""
+        job_id = create_job(self.bookmarks_json_list[:2] * 3)
+        job_runner = JobRunner(
+            CategorizeEngine(self.dify_module, concurrency=2, timeout=5),
+            page_size=2, commit_batch_size=4, commit_interval_seconds=60
+        )
+
+        threads = set()
+        def get_pending_items_in_thread(*args):
+            threads.add(threading.current_thread().name)
+            return get_pending_items(*args)
+
+        with patch('bookmarks_categorize.modules.jobs.get_pending_items', side_effect=get_pending_items_in_thread) as mock_get_pending_items, \
+                patch('bookmarks_categorize.modules.jobs.bulk_insert_bookmarks', wraps=bulk_insert_bookmarks) as mock_bulk_insert:
+            await job_runner.run(job_id)
+
+        job = get_job(job_id)
+        self.assertEqual(job["status"], JOB_COMPLETED)
+        self.assertEqual(job["done"], 6)
+        # 2件ずつ3ページと、空の4ページ目
+        self.assertEqual([call.args[2] for call in mock_get_pending_items.call_args_list], [2, 2, 2, 2])
+        self.assertEqual([call.args[1] for call in mock_get_pending_items.call_args_list], [-1, 1, 3, 5])
+        # 4件ごとと最後の残り
+        self.assertEqual([len(call.args[0]) for call in mock_bulk_insert.call_args_list], [4, 2])
+        # DB の読み込みはイベントループのスレッドではなく読み取り用のスレッドで実行される
+        self.assertTrue(all(name.startswith("db-read") for name in threads))
+
+    async def test_run_job_failure(self):
+        """ジョブの実行が例外で止まった場合に失敗として記録され、再開で続きから完了するテスト"""
+        job_id = create_job(self.bookmarks_json_list[:2])
+
+        with patch('bookmarks_categorize.modules.jobs.bulk_insert_bookmarks', side_effect=RuntimeError("DB書き込みエラー")):
+            await self.job_runner.run(job_id)
+
+        job = get_job(job_id)
+        self.assertEqual(job["status"], JOB_FAILED)
+        self.assertEqual(job["error"], "RuntimeError: DB書き込みエラー")
+        self.assertEqual(job["done"], 0)
+        self.assertEqual(len(get_pending_items(job_id)), 2)
+        # 失敗したジョブは再開の対象になる
+        self.assertEqual(get_unfinished_job_ids(), [job_id])
+
+        self.job_runner.resume()
+        await asyncio.gather(*self.job_runner._tasks.values())
+
+        job = get_job(job_id)
+        self.assertEqual(job["status"], JOB_COMPLETED)
+        self.assertIsNone(job["error"])
+        self.assertEqual(job["done"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
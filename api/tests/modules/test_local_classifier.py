@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import patch
+from bookmarks_categorize.modules.crud import bulk_insert_bookmarks, CATEGORY_SOURCE_DIFY, CATEGORY_SOURCE_LOCAL
+from bookmarks_categorize.modules.text_vectors import numpy_available, hashed_features
+from bookmarks_categorize.modules.local_classifier import LocalClassifier
+from tests.db_test_case import TempDBTestCase
+
+
+def make_tweet(text: str, screen_name: str = "test_user") -> dict:
+    return {"full_text": text, "screen_name": screen_name}
+
+
+@unittest.skipUnless(numpy_available(), "NumPy がインストールされていません")
+class TestLocalClassifier(unittest.TestCase):
+    """LocalClassifierクラスのテスト"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.classifier = LocalClassifier(threshold=0.1, min_similarity=0.2, min_samples=3)
+        self.classifier.ready = True
+        for text in ["Pythonの型ヒント入門", "Rustで書くコンパイラ", "Pythonで機械学習", "GPUでPythonを高速化"]:
+            self.classifier.add(make_tweet(text, "dev"), "テクノロジー")
+        for text in ["簡単なカレーのレシピ", "出汁の取り方のレシピ", "スパイスカレーの作り方", "味噌汁のレシピ"]:
+            self.classifier.add(make_tweet(text, "cook"), "料理")
+
+    def test_hashed_features(self):
+        """同じツイートは同じベクトルになり、正規化されているテスト"""
+        indices, weights = hashed_features(make_tweet("Pythonの型ヒント https://example.com/a"), 1024)
+        indices2, weights2 = hashed_features(make_tweet("Pythonの型ヒント https://example.com/a"), 1024)
+
+        self.assertEqual(indices.tolist(), indices2.tolist())
+        self.assertAlmostEqual(float((weights ** 2).sum()), 1.0, places=5)
+        self.assertTrue(all(0 <= index < 1024 for index in indices))
+        self.assertEqual(len(hashed_features({}, 1024)[0]), 0)
+
+    def test_classify_confident(self):
+        """重心に十分近いものはローカルで分類するテスト"""
+        self.assertEqual(self.classifier.classify(make_tweet("Pythonの機械学習ライブラリ", "dev")), "テクノロジー")
+        self.assertEqual(self.classifier.classify(make_tweet("夏野菜カレーのレシピ", "cook")), "料理")
+        self.assertEqual(self.classifier.stats()["local_share"], 1.0)
+
+    def test_classify_uncertain(self):
+        """どのカテゴリにも近くないものは Dify に任せる（None を返す）テスト"""
+        self.assertIsNone(self.classifier.classify(make_tweet("明日の天気は晴れ", "someone")))
+
+        stats = self.classifier.stats()
+        self.assertEqual(stats["attempts"], 1)
+        self.assertEqual(stats["local_hits"], 0)
+
+    def test_min_samples_and_incremental_update(self):
+        """件数が少ないカテゴリには分類せず、追加すると分類できるようになるテスト"""
+        tweet = make_tweet("京都の温泉旅館に泊まった", "traveler")
+        for text in ["京都の紅葉と温泉", "温泉旅館の露天風呂"]:
+            self.classifier.add(make_tweet(text, "traveler"), "旅行")
+        self.assertIsNone(self.classifier.classify(tweet))
+
+        self.classifier.add(make_tweet("箱根の温泉旅館", "traveler"), "旅行")
+        self.assertEqual(self.classifier.classify(tweet), "旅行")
+
+    def test_add_updates_only_affected_centroid(self):
+        """追加後はそのカテゴリの重心だけを作り直し、文書数が一定以上増えたら IDF ごと作り直すテスト"""
+        tweet = make_tweet("Pythonの機械学習ライブラリ", "dev")
+        self.classifier.predict(tweet)
+
+        with patch('bookmarks_categorize.modules.local_classifier.IDF_REFRESH_RATIO', 0.5), \
+                patch.object(self.classifier, '_normalized_centroids', wraps=self.classifier._normalized_centroids) as mock_normalized:
+            self.classifier.add(make_tweet("夏野菜カレーのレシピ", "cook"), "料理")
+            self.classifier.predict(tweet)
+            self.assertEqual(len(mock_normalized.call_args[0][0]), 1)
+            # 新しいカテゴリは行を追加して重心を作る
+            self.classifier.add(make_tweet("京都の温泉旅館", "traveler"), "旅行")
+            self.classifier.predict(tweet)
+            self.assertEqual(len(mock_normalized.call_args[0][0]), 1)
+            self.assertEqual(len(self.classifier._centroids), 3)
+            # 文書数が 8 件の 1.5 倍を超えるまでは IDF を固定する
+            self.assertEqual(self.classifier._idf_documents, 8)
+
+            for text in ["Goの並行処理", "TypeScriptの型", "Kotlinのコルーチン"]:
+                self.classifier.add(make_tweet(text, "dev"), "テクノロジー")
+            self.classifier.predict(tweet)
+            self.assertEqual(len(mock_normalized.call_args[0][0]), 3)
+            self.assertEqual(self.classifier._idf_documents, 13)
+
+    def test_not_ready(self):
+        """重心を作り終えるまでは分類しないテスト"""
+        self.classifier.ready = False
+
+        self.assertIsNone(self.classifier.classify(make_tweet("Pythonの機械学習ライブラリ", "dev")))
+        self.assertEqual(self.classifier.stats()["attempts"], 0)
+
+
+@unittest.skipUnless(numpy_available(), "NumPy がインストールされていません")
+class TestLocalClassifierFit(TempDBTestCase):
+    """DBの分類済みのブックマークから重心を作るテスト（一時ファイルのSQLiteを使用）"""
+
+    def test_fit_from_db(self):
+        """保存済みのブックマークから重心を作るテスト"""
+        bulk_insert_bookmarks([
+            (f"tech_{i}", "テクノロジー", {"tweet_id": str(i), "full_text": f"Pythonの機械学習 その{i}"}) for i in range(3)
+        ] + [
+            (f"cook_{i}", "料理", {"tweet_id": str(10 + i), "full_text": f"カレーのレシピ その{i}"}) for i in range(3)
+        ])
+        classifier = LocalClassifier(min_samples=3)
+
+        self.assertEqual(classifier.fit_from_db(batch_size=2), 6)
+        self.assertTrue(classifier.ready)
+        self.assertEqual(classifier.classify(make_tweet("カレーのレシピ")), "料理")
+
+    def test_fit_from_db_skips_local_labels(self):
+        """ローカル分類で付けたカテゴリは学習に使わないテスト"""
+        bulk_insert_bookmarks([
+            ("dify_1", "テクノロジー", {"tweet_id": "1", "full_text": "Pythonの機械学習"}, CATEGORY_SOURCE_DIFY),
+            ("local_1", "テクノロジー", {"tweet_id": "2", "full_text": "Pythonの型ヒント"}, CATEGORY_SOURCE_LOCAL),
+            ("unknown_1", "料理", {"tweet_id": "3", "full_text": "カレーのレシピ"})
+        ])
+        classifier = LocalClassifier(min_samples=1)
+
+        # 出所が不明な既存の行は学習に使う
+        self.assertEqual(classifier.fit_from_db(), 2)
+        self.assertEqual(classifier.stats()["samples"], 2)
+
+        # Dify で分類し直した場合は学習に使う
+        bulk_insert_bookmarks([("local_2", "テクノロジー", {"tweet_id": "2", "full_text": "Pythonの型ヒント"}, CATEGORY_SOURCE_DIFY)])
+        self.assertEqual(LocalClassifier(min_samples=1).fit_from_db(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
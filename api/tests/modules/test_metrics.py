@@ -0,0 +1,161 @@
+import unittest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from bookmarks_categorize.modules.metrics import (
+    Counter,
+    Histogram,
+    MetricsRegistry,
+    MetricsMiddleware,
+    http_request_seconds,
+    stage_seconds,
+    stage_items,
+    db_query_seconds,
+    db_slow_queries,
+    observe_stage,
+    time_call
+)
+from bookmarks_categorize.modules.database import get_connection, ConnectionPool
+from tests.db_test_case import TempDBTestCase
+
+
+class TestMetrics(unittest.TestCase):
+    """Counter・Histogram・MetricsRegistryクラスのテスト"""
+
+    def test_render_counter(self):
+        """カウンターをラベルごとに Prometheus のテキスト形式で出力するテスト"""
+        metrics = MetricsRegistry()
+        counter = metrics.counter("test_total", "テスト", ("stage",))
+        counter.inc(stage="merge")
+        counter.inc(2, stage="merge")
+        counter.inc(stage='a"b')
+
+        text = metrics.render()
+
+        self.assertIn("# TYPE test_total counter", text)
+        self.assertIn('test_total{stage="merge"} 3', text)
+        # ラベルの値の " はエスケープする
+        self.assertIn('test_total{stage="a\\"b"} 1', text)
+
+    def test_render_histogram(self):
+        """ヒストグラムのバケットを累積件数で出力するテスト"""
+        metrics = MetricsRegistry()
+        histogram = metrics.histogram("test_seconds", "テスト", ("route",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, route="/")
+        histogram.observe(0.5, route="/")
+        histogram.observe(5.0, route="/")
+
+        lines = metrics.render().splitlines()
+
+        self.assertIn('test_seconds_bucket{route="/",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{route="/",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{route="/",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_sum{route="/"} 5.55', lines)
+        self.assertIn('test_seconds_count{route="/"} 3', lines)
+
+    def test_label_names_checked(self):
+        """定義と異なるラベルを指定するとエラーになるテスト"""
+        counter = Counter("test_total", "テスト", ("stage",))
+
+        with self.assertRaises(ValueError):
+            counter.inc(route="/")
+
+    def test_time_call(self):
+        """外部 API の呼び出しを成功・失敗に分けて記録するテスト"""
+        histogram = Histogram("test_call_seconds", "テスト", ("workflow", "outcome"))
+
+        with time_call(histogram, workflow="single"):
+            pass
+        with self.assertRaises(RuntimeError):
+            with time_call(histogram, workflow="single"):
+                raise RuntimeError("失敗")
+
+        self.assertEqual(histogram.count(workflow="single", outcome="ok"), 1)
+        self.assertEqual(histogram.count(workflow="single", outcome="error"), 1)
+
+    def test_observe_stage(self):
+        """処理段階の所要時間と件数を記録するテスト"""
+        before_count = stage_seconds.count(stage="test_stage")
+        before_items = stage_items.value(stage="test_stage")
+
+        observe_stage("test_stage", 0.2, items=3)
+
+        self.assertEqual(stage_seconds.count(stage="test_stage"), before_count + 1)
+        self.assertEqual(stage_items.value(stage="test_stage"), before_items + 3)
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+    """MetricsMiddlewareクラスのテスト"""
+
+    def test_route_template_label(self):
+        """パスではなくルートのテンプレートとステータスコードごとに記録するテスト"""
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: str):
+            return {"id": item_id}
+
+        client = TestClient(app)
+        before = http_request_seconds.count(method="GET", route="/items/{item_id}", status="200")
+
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/missing")
+
+        self.assertEqual(http_request_seconds.count(method="GET", route="/items/{item_id}", status="200"), before + 2)
+        self.assertGreaterEqual(http_request_seconds.count(method="GET", route="unmatched", status="404"), 1)
+
+
+class TestQueryTiming(TempDBTestCase):
+    """接続プールの接続によるクエリの計測と遅いクエリのログのテスト（一時ファイルのSQLiteを使用）"""
+
+    def test_query_timing(self):
+        """execute・cursor().execute・commit の時間を文の種類ごとに記録するテスト"""
+        before_select = db_query_seconds.count(statement="select")
+        before_insert = db_query_seconds.count(statement="insert")
+        before_commit = db_query_seconds.count(statement="commit")
+
+        with get_connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+            cur = conn.cursor()
+            cur.execute("  select count(*) FROM bookmarks").fetchone()
+            cur.executemany("INSERT INTO bookmarks_category (categorize_name) VALUES (?)", [("a",), ("b",)])
+            conn.commit()
+
+        self.assertEqual(db_query_seconds.count(statement="select"), before_select + 2)
+        self.assertEqual(db_query_seconds.count(statement="insert"), before_insert + 1)
+        self.assertEqual(db_query_seconds.count(statement="commit"), before_commit + 1)
+
+    def test_slow_query_log(self):
+        """しきい値以上かかったクエリを警告ログに出すテスト"""
+        pool = ConnectionPool(self.db_path, size=1, slow_query_ms=0)
+        before = db_slow_queries.value(statement="select")
+        try:
+            conn = pool.acquire()
+            with self.assertLogs("bookmarks_categorize.modules.database.slow_query", level="WARNING") as logs:
+                conn.execute("SELECT id\n   FROM bookmarks WHERE id = ?", ("bookmark_1",)).fetchone()
+            pool.release(conn)
+        finally:
+            pool.close()
+
+        self.assertEqual(db_slow_queries.value(statement="select"), before + 1)
+        self.assertIn("SELECT id FROM bookmarks WHERE id = ?", logs.output[0])
+        self.assertIn("bookmark_1", logs.output[0])
+
+    def test_slow_query_log_disabled(self):
+        """しきい値を指定しない場合はログに出さないテスト"""
+        pool = ConnectionPool(self.db_path, size=1)
+        try:
+            conn = pool.acquire()
+            with patch('bookmarks_categorize.modules.database.slow_query_logger.warning') as mock_warning:
+                conn.execute("SELECT 1").fetchone()
+            pool.release(conn)
+        finally:
+            pool.close()
+
+        mock_warning.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
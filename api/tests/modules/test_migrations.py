@@ -0,0 +1,240 @@
+import unittest
+from unittest.mock import patch
+import os
+import sqlite3
+import tempfile
+from bookmarks_categorize.modules.database import get_pool
+from bookmarks_categorize.modules.migrations import MIGRATIONS, migrate, get_schema_version
+from bookmarks_categorize.modules.crud import (
+    bulk_insert_bookmarks,
+    get_bookmarks_json,
+    get_bookmarks_page,
+    iter_bookmarks_ndjson,
+    get_all_categories,
+    encode_cursor
+)
+from bookmarks_categorize.modules.jobs import create_job, get_job, get_pending_items
+from tests.db_test_case import TempDBTestCase
+
+
+class TestMigrations(unittest.TestCase):
+    """マイグレーションのテスト（一時ファイルのSQLiteを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(os.path.join(self.tmp_dir.name, "bookmarks.db"))
+
+    def tearDown(self):
+        """各テスト後の後始末"""
+        self.conn.close()
+        self.tmp_dir.cleanup()
+
+    def test_migrate_new_db(self):
+        """新規DBにすべてのマイグレーションが適用されるテスト"""
+        applied = migrate(self.conn)
+
+        self.assertEqual(applied, list(range(1, len(MIGRATIONS) + 1)))
+        self.assertEqual(get_schema_version(self.conn), len(MIGRATIONS))
+        # 2回目は何も適用されない
+        self.assertEqual(migrate(self.conn), [])
+
+    def test_migrate_legacy_db(self):
+        """マイグレーション導入前に作成されたDB（user_version = 0）にも適用できるテスト"""
+        self.conn.execute("""
+            CREATE TABLE bookmarks_category (
+                id INTEGER NOT NULL PRIMARY KEY,
+                categorize_name TEXT NOT NULL UNIQUE,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                is_deleted INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conn.execute("INSERT INTO bookmarks_category (categorize_name) VALUES ('テクノロジー')")
+        self.conn.commit()
+
+        migrate(self.conn)
+
+        self.assertEqual(get_schema_version(self.conn), len(MIGRATIONS))
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM bookmarks_category").fetchone()[0], 1)
+
+    def test_dedupe_by_tweet_id(self):
+        """ツイートIDが同じブックマークを最新の1件にまとめるマイグレーションのテスト"""
+        with patch('bookmarks_categorize.modules.migrations.MIGRATIONS', MIGRATIONS[:5]):
+            migrate(self.conn)
+        self.conn.execute("INSERT INTO bookmarks_category (id, categorize_name) VALUES (1, '古い分類'), (2, '新しい分類')")
+        self.conn.executemany(
+            "INSERT INTO bookmarks (id, categorize_id, tweet, created_at, is_deleted) VALUES (?, ?, ?, ?, ?)",
+            [
+                ("old", 1, '{"tweet_id": "100", "full_text": "重複したツイート"}', "2024-01-01 00:00:00", 0),
+                ("new", 2, '{"tweet_url": "https://x.com/u/status/100", "full_text": "重複したツイート"}', "2024-01-02 00:00:00", 0),
+                ("deleted", 2, '{"tweet_id": "100"}', "2024-01-03 00:00:00", 1),
+                ("other", 1, '{"tweet_id": "200"}', "2024-01-01 00:00:00", 0),
+                ("no_id_1", 1, '{"full_text": "IDなし"}', "2024-01-01 00:00:00", 0),
+                ("no_id_2", 1, '{"full_text": "IDなし"}', "2024-01-01 00:00:00", 0)
+            ]
+        )
+        self.conn.commit()
+
+        migrate(self.conn)
+
+        rows = self.conn.execute("SELECT id, tweet_id FROM bookmarks ORDER BY id").fetchall()
+        self.assertEqual(rows, [("new", "100"), ("no_id_1", None), ("no_id_2", None), ("other", "200")])
+        # 削除したブックマークは全文検索の索引からも消える
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM bookmarks_fts").fetchone()[0], 4)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.conn.execute("INSERT INTO bookmarks (id, tweet, tweet_id) VALUES ('dup', '{}', '200')")
+
+    def test_backfill_tweet_columns(self):
+        """既存のブックマークの投稿者・投稿日時・メディア・URLを列に書き出すマイグレーションのテスト"""
+        with patch('bookmarks_categorize.modules.migrations.MIGRATIONS', MIGRATIONS[:6]):
+            migrate(self.conn)
+        self.conn.execute("INSERT INTO bookmarks_category (id, categorize_name) VALUES (1, 'テクノロジー')")
+        self.conn.execute(
+            "INSERT INTO bookmarks (id, categorize_id, tweet, tweet_id) VALUES (?, ?, ?, ?)",
+            (
+                "b1", 1,
+                '{"tweet_id": "100", "screen_name": "Test_User", "full_text": "本文 https://www.example.com/a",'
+                ' "tweeted_at": "2024-01-02T03:04:05Z", "extended_media": "[{}]"}',
+                "100"
+            )
+        )
+        self.conn.commit()
+
+        migrate(self.conn)
+
+        row = self.conn.execute(
+            "SELECT screen_name, tweet_text, tweeted_at, has_media FROM bookmarks WHERE id = 'b1'"
+        ).fetchone()
+        self.assertEqual(row, ("Test_User", "本文 https://www.example.com/a", "2024-01-02 03:04:05", 1))
+        self.assertEqual(
+            self.conn.execute("SELECT bookmark_id, url, domain FROM bookmark_urls").fetchall(),
+            [("b1", "https://www.example.com/a", "example.com")]
+        )
+        # ブックマークを削除するとURLも消える
+        self.conn.execute("DELETE FROM bookmarks WHERE id = 'b1'")
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM bookmark_urls").fetchone()[0], 0)
+
+    def test_backfill_category_labels(self):
+        """既存のブックマークの主カテゴリをカテゴリの付与と件数に書き出すマイグレーションのテスト"""
+        with patch('bookmarks_categorize.modules.migrations.MIGRATIONS', MIGRATIONS[:7]):
+            migrate(self.conn)
+        self.conn.execute("INSERT INTO bookmarks_category (id, categorize_name) VALUES (1, 'テクノロジー'), (2, 'ニュース'), (3, '未使用')")
+        self.conn.executemany(
+            "INSERT INTO bookmarks (id, categorize_id, tweet, is_deleted) VALUES (?, ?, '{}', ?)",
+            [("a", 1, 0), ("b", 1, 0), ("c", 2, 0), ("deleted", 2, 1)]
+        )
+        self.conn.commit()
+
+        migrate(self.conn)
+
+        self.assertEqual(
+            self.conn.execute("SELECT bookmark_id, category_id FROM bookmark_categories ORDER BY bookmark_id").fetchall(),
+            [("a", 1), ("b", 1), ("c", 2), ("deleted", 2)]
+        )
+        self.assertEqual(
+            self.conn.execute("SELECT * FROM category_counts ORDER BY category_id").fetchall(),
+            [(1, 2, 2), (2, 1, 1), (3, 0, 0)]
+        )
+
+    def test_migrate_failure_rolls_back(self):
+        """途中で失敗したマイグレーションがロールバックされるテスト"""
+        def broken_migration(cur):
+            cur.execute("CREATE TABLE should_not_exist (id INTEGER)")
+            raise sqlite3.OperationalError("テスト用のエラー")
+
+        with patch('bookmarks_categorize.modules.migrations.MIGRATIONS', MIGRATIONS + [broken_migration]):
+            with self.assertRaises(sqlite3.OperationalError):
+                migrate(self.conn)
+
+        self.assertEqual(get_schema_version(self.conn), len(MIGRATIONS))
+        tables = [row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        self.assertNotIn("should_not_exist", tables)
+
+
+class TestQueryPlans(TempDBTestCase):
+    """一覧取得クエリがインデックスを使い、一時B-treeでソートしないことのテスト"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        super().setUp()
+        bulk_insert_bookmarks([
+            (f"bookmark_{i}", f"カテゴリ{i % 3}", {"tweet_id": str(i), "screen_name": f"user{i % 5}"})
+            for i in range(30)
+        ])
+
+    def explain(self, func, *args, **kwargs) -> list[str]:
+        """関数内で実行されたSELECT文のクエリプランを取得する"""
+        statements = []
+        pool = get_pool()
+        conn = pool.acquire()
+        conn.set_trace_callback(statements.append)
+        pool.release(conn)
+        try:
+            func(*args, **kwargs)
+        finally:
+            conn.set_trace_callback(None)
+
+        selects = [sql for sql in statements if sql.strip().upper().startswith("SELECT")]
+        self.assertTrue(selects)
+        plans = []
+        for sql in selects:
+            plans.extend(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql))
+        return plans
+
+    def assert_uses_index(self, plans: list[str], index_name: str):
+        self.assertTrue(any(index_name in detail for detail in plans), plans)
+        self.assertFalse(any("TEMP B-TREE" in detail for detail in plans), plans)
+
+    def test_get_bookmarks_by_category_plan(self):
+        """カテゴリ別一覧のクエリプランのテスト"""
+        plans = self.explain(get_bookmarks_json, 1)
+
+        self.assert_uses_index(plans, "idx_bookmarks_category_created_id")
+
+    def test_get_all_bookmarks_plan(self):
+        """全件一覧のクエリプランのテスト"""
+        plans = self.explain(get_bookmarks_json, None)
+
+        self.assert_uses_index(plans, "idx_bookmarks_deleted_created_id")
+
+    def test_get_bookmarks_page_plan(self):
+        """キーセットページネーションのクエリプランのテスト"""
+        cursor = encode_cursor("2100-01-01 00:00:00", "bookmark_0")
+
+        self.assert_uses_index(self.explain(get_bookmarks_page, None, 10, cursor), "idx_bookmarks_deleted_created_id")
+        self.assert_uses_index(self.explain(get_bookmarks_page, 1, 10, cursor), "idx_bookmarks_category_created_id")
+
+    def test_iter_bookmarks_ndjson_plan(self):
+        """NDJSON ストリーミングのクエリプランのテスト"""
+        def read_all(*args):
+            return list(iter_bookmarks_ndjson(*args))
+
+        self.assert_uses_index(self.explain(read_all, None), "idx_bookmarks_deleted_created_id")
+        self.assert_uses_index(self.explain(read_all, 1), "idx_bookmarks_category_created_id")
+
+    def test_filter_by_screen_name_plan(self):
+        """投稿者で絞り込んだ一覧のクエリプランのテスト"""
+        plans = self.explain(get_bookmarks_page, None, 10, None, screen_name="user1")
+
+        self.assert_uses_index(plans, "idx_bookmarks_screen_name_created_id")
+
+    def test_get_all_categories_plan(self):
+        """カテゴリ一覧のクエリプランのテスト"""
+        plans = self.explain(get_all_categories)
+
+        self.assert_uses_index(plans, "idx_bookmarks_category_deleted_created")
+
+
+    def test_get_job_plan(self):
+        """ジョブの進捗の集計と未処理アイテムの読み出しがアイテムを読まずにインデックスを使うテスト"""
+        job_id = create_job([{"tweet_id": str(i)} for i in range(10)])
+
+        plans = self.explain(get_job, job_id)
+        self.assert_uses_index(plans, "COVERING INDEX idx_categorize_job_items_status")
+
+        plans = self.explain(get_pending_items, job_id, 3, 5)
+        self.assert_uses_index(plans, "idx_categorize_job_items_status")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from bookmarks_categorize.modules.read_cache import DataVersion, ReadCache
+
+
+class TestReadCache(unittest.TestCase):
+    """ReadCacheクラスのテスト"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.data_version = DataVersion()
+        self.cache = ReadCache(self.data_version, max_entries=2, ttl_seconds=60)
+
+    def test_get_or_load(self):
+        """同じキーは読み込み関数を1回だけ呼び出すテスト"""
+        loader = MagicMock(return_value=["カテゴリ"])
+
+        self.assertEqual(self.cache.get_or_load(("key",), loader), ["カテゴリ"])
+        self.assertEqual(self.cache.get_or_load(("key",), loader), ["カテゴリ"])
+
+        loader.assert_called_once()
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_invalidated_by_data_version(self):
+        """書き込みでバージョンが変わると読み直すテスト"""
+        loader = MagicMock(side_effect=[["古い"], ["新しい"]])
+        etag = self.data_version.etag("categories")
+
+        self.cache.get_or_load(("key",), loader)
+        self.data_version.bump()
+
+        self.assertEqual(self.cache.get_or_load(("key",), loader), ["新しい"])
+        self.assertNotEqual(self.data_version.etag("categories"), etag)
+
+    def test_not_stored_when_written_during_load(self):
+        """読み込み中に書き込まれた結果は保存しないテスト"""
+        def loader():
+            self.data_version.bump()
+            return ["読み込み中に変更"]
+
+        self.cache.get_or_load(("key",), loader)
+
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_lru_eviction(self):
+        """件数の上限を超えると最も古く使われたエントリを削除するテスト"""
+        self.cache.get_or_load(("a",), lambda: "a")
+        self.cache.get_or_load(("b",), lambda: "b")
+        self.cache.get_or_load(("a",), lambda: "a")
+        self.cache.get_or_load(("c",), lambda: "c")
+
+        loader = MagicMock(return_value="b")
+        self.cache.get_or_load(("a",), MagicMock())
+        self.cache.get_or_load(("b",), loader)
+        loader.assert_called_once()
+
+    @patch('bookmarks_categorize.modules.read_cache.time.monotonic')
+    def test_ttl(self, mock_monotonic):
+        """有効期限を過ぎたエントリは読み直すテスト（他のプロセスからの書き込み対策）"""
+        loader = MagicMock(side_effect=["古い", "新しい"])
+        mock_monotonic.return_value = 100.0
+        self.cache.get_or_load(("key",), loader)
+
+        mock_monotonic.return_value = 161.0
+        self.assertEqual(self.cache.get_or_load(("key",), loader), "新しい")
+
+
+if __name__ == '__main__':
+    unittest.main()
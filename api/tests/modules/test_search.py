@@ -0,0 +1,91 @@
+import unittest
+from bookmarks_categorize.modules.database import get_connection
+from bookmarks_categorize.modules.crud import bulk_insert_bookmarks
+from bookmarks_categorize.modules.search import search_bookmarks, rebuild_search_index
+from tests.db_test_case import TempDBTestCase
+
+
+class TestSearch(TempDBTestCase):
+    """全文検索モジュールのテスト（一時ファイルのSQLiteを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        super().setUp()
+        bulk_insert_bookmarks([
+            ("bookmark_1", "テクノロジー", {"screen_name": "fastapi_dev", "name": "FastAPI", "full_text": "FastAPI の非同期処理について解説します"}),
+            ("bookmark_2", "テクノロジー", {"screen_name": "sqlite_fan", "name": "SQLite 好き", "full_text": "SQLite の全文検索 FTS5 は便利"}),
+            ("bookmark_3", "ニュース", {"screen_name": "news_bot", "name": "ニュース", "note_tweet_text": "東京で全文検索の勉強会が開催"}),
+            ("bookmark_4", "ニュース", {"user": {"screen_name": "legacy_user", "name": "Legacy"}, "text": "旧形式のツイート FastAPI"})
+        ])
+
+    def ids(self, bookmarks):
+        return sorted(bookmark["id"] for bookmark in bookmarks)
+
+    def test_search_text(self):
+        """本文の検索のテスト"""
+        bookmarks, next_offset = search_bookmarks("全文検索")
+
+        self.assertEqual(self.ids(bookmarks), ["bookmark_2", "bookmark_3"])
+        self.assertIsNone(next_offset)
+        self.assertIn(bookmarks[0]["category"], ("テクノロジー", "ニュース"))
+
+    def test_search_author(self):
+        """投稿者（旧形式の user 以下も含む）の検索のテスト"""
+        self.assertEqual(self.ids(search_bookmarks("legacy_user")[0]), ["bookmark_4"])
+        self.assertEqual(self.ids(search_bookmarks("fastapi")[0]), ["bookmark_1", "bookmark_4"])
+
+    def test_search_author_matches_filter(self):
+        """username だけのツイートも、全文検索と screen_name の絞り込みで同じ投稿者として扱われるテスト"""
+        bulk_insert_bookmarks([("bookmark_5", "ニュース", {"user": {"username": "@v2_author"}, "text": "X API v2 形式"})])
+
+        self.assertEqual(self.ids(search_bookmarks("v2_author")[0]), ["bookmark_5"])
+        self.assertEqual(self.ids(search_bookmarks("形式", screen_name="v2_author")[0]), ["bookmark_5"])
+
+    def test_search_and_category(self):
+        """複数語のAND検索とカテゴリの絞り込みのテスト"""
+        self.assertEqual(self.ids(search_bookmarks("FastAPI 非同期")[0]), ["bookmark_1"])
+        with get_connection() as conn:
+            news_id = conn.execute("SELECT id FROM bookmarks_category WHERE categorize_name = 'ニュース'").fetchone()[0]
+        self.assertEqual(self.ids(search_bookmarks("FastAPI", category_id=news_id)[0]), ["bookmark_4"])
+
+    def test_search_short_term(self):
+        """3文字未満の語（LIKEで絞り込み）の検索のテスト"""
+        self.assertEqual(self.ids(search_bookmarks("東京")[0]), ["bookmark_3"])
+
+    def test_search_quotes(self):
+        """FTS5の構文として解釈される文字を含む検索語のテスト"""
+        self.assertEqual(search_bookmarks('"OR" NEAR(')[0], [])
+
+    def test_search_pagination(self):
+        """検索結果のページングのテスト"""
+        first, next_offset = search_bookmarks("FastAPI", limit=1)
+        second, last_offset = search_bookmarks("FastAPI", limit=1, offset=next_offset)
+
+        self.assertEqual(next_offset, 1)
+        self.assertIsNone(last_offset)
+        self.assertEqual(self.ids(first + second), ["bookmark_1", "bookmark_4"])
+
+    def test_triggers(self):
+        """bookmarks の更新・削除が索引に反映されるテスト"""
+        with get_connection() as conn:
+            conn.execute("UPDATE bookmarks SET tweet_text = '更新後のツイート' WHERE id = 'bookmark_1'")
+            conn.execute("DELETE FROM bookmarks WHERE id = 'bookmark_2'")
+            conn.commit()
+
+        self.assertEqual(self.ids(search_bookmarks("更新後")[0]), ["bookmark_1"])
+        self.assertEqual(search_bookmarks("非同期")[0], [])
+        self.assertEqual(search_bookmarks("SQLite")[0], [])
+
+    def test_rebuild_search_index(self):
+        """索引の再構築のテスト"""
+        with get_connection() as conn:
+            conn.execute("DELETE FROM bookmarks_fts")
+            conn.commit()
+        self.assertEqual(search_bookmarks("全文検索")[0], [])
+
+        self.assertEqual(rebuild_search_index(), 4)
+        self.assertEqual(self.ids(search_bookmarks("全文検索")[0]), ["bookmark_2", "bookmark_3"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from bookmarks_categorize.modules.jobs import get_job, get_pending_items
+from bookmarks_categorize.modules.sync import sync_bookmarks, get_sync_state, _get_synced_tweet_ids
+from tests.db_test_case import AsyncTempDBTestCase
+
+
+def make_page(tweet_ids: list[str], next_token: str | None = None) -> dict:
+    """ブックマーク1ページ分のレスポンスを作成する"""
+    page = {
+        "data": [{"id": tweet_id, "text": f"ツイート{tweet_id}", "author_id": "u1"} for tweet_id in tweet_ids],
+        "includes": {"users": [{"id": "u1", "username": "test_user", "name": "Test User"}]},
+        "meta": {}
+    }
+    if next_token:
+        page["meta"]["next_token"] = next_token
+    return page
+
+
+class TestSync(AsyncTempDBTestCase):
+    """X のブックマーク同期のテスト（一時ファイルのSQLiteを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        super().setUp()
+        self.x_module = MagicMock()
+        self.fetched_pages = []
+
+    def set_pages(self, pages: list[dict]):
+        """XModule.iter_bookmark_pages が返すページを設定する（実際に取得されたページを記録する）"""
+        def iter_bookmark_pages(user_id, access_token):
+            for page in pages:
+                self.fetched_pages.append(page)
+                yield page
+        self.x_module.iter_bookmark_pages.side_effect = iter_bookmark_pages
+
+    async def test_first_sync(self):
+        """初回の同期で全ページを取得し、分類ジョブを登録するテスト"""
+        self.set_pages([make_page(["5", "4"], "next_1"), make_page(["3"])])
+
+        result = await sync_bookmarks(self.x_module, "token", user_id="user_1")
+
+        self.assertEqual((result["new"], result["pages"]), (3, 2))
+        self.assertEqual(get_job(result["job_id"])["total"], 3)
+        items = get_pending_items(result["job_id"])
+        self.assertEqual(items[0][1]["tweet_id"], "5")
+        self.assertEqual(items[0][1]["screen_name"], "test_user")
+        state = get_sync_state("user_1")
+        self.assertEqual((state["newest_tweet_id"], state["synced_count"]), ("5", 3))
+
+    async def test_incremental_sync_stops_at_synced_tweet(self):
+        """2回目以降は取り込み済みのツイートに到達した時点で取得をやめるテスト"""
+        self.set_pages([make_page(["2", "1"])])
+        await sync_bookmarks(self.x_module, "token", user_id="user_1")
+
+        # 古いツイートをブックマークした場合もブックマークした順に返ってくる
+        self.fetched_pages = []
+        self.set_pages([make_page(["7", "0"], "next_1"), make_page(["2", "1"], "next_2"), make_page(["old"])])
+        result = await sync_bookmarks(self.x_module, "token", user_id="user_1")
+
+        self.assertEqual((result["new"], result["pages"]), (2, 2))
+        self.assertEqual(len(self.fetched_pages), 2)
+        self.assertEqual([item[1]["tweet_id"] for item in get_pending_items(result["job_id"])], ["7", "0"])
+        state = get_sync_state("user_1")
+        self.assertEqual((state["newest_tweet_id"], state["synced_count"]), ("7", 4))
+
+    async def test_incremental_sync_stops_at_newest_tweet(self):
+        """前回の同期の最新のツイートに到達した時点で、取り込み済みかを DB に問い合わせずに取得をやめるテスト"""
+        self.set_pages([make_page(["2", "1"])])
+        await sync_bookmarks(self.x_module, "token", user_id="user_1")
+
+        self.set_pages([make_page(["3", "2", "1"], "next_1"), make_page(["old"])])
+        with patch('bookmarks_categorize.modules.sync._get_synced_tweet_ids', wraps=_get_synced_tweet_ids) as mock_synced:
+            result = await sync_bookmarks(self.x_module, "token", user_id="user_1")
+
+        self.assertEqual((result["new"], result["pages"]), (1, 1))
+        mock_synced.assert_called_once_with("user_1", ["3"])
+        self.assertEqual(get_sync_state("user_1")["newest_tweet_id"], "3")
+
+    async def test_sync_without_new_bookmarks(self):
+        """新しいブックマークがない場合はジョブを登録しないテスト"""
+        self.set_pages([make_page(["1"])])
+        await sync_bookmarks(self.x_module, "token", user_id="user_1")
+
+        result = await sync_bookmarks(self.x_module, "token", user_id="user_1")
+
+        self.assertIsNone(result["job_id"])
+        self.assertEqual(result["new"], 0)
+        self.assertEqual(get_sync_state("user_1")["newest_tweet_id"], "1")
+
+    async def test_sync_resolves_user_id(self):
+        """ユーザーIDを指定しない場合はアクセストークンから取得するテスト"""
+        self.x_module.get_user_id.return_value = "user_2"
+        self.set_pages([make_page([])])
+
+        result = await sync_bookmarks(self.x_module, "token")
+
+        self.assertEqual(result["user_id"], "user_2")
+        self.x_module.get_user_id.assert_called_once_with("token")
+        self.assertIsNone(get_sync_state("user_1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
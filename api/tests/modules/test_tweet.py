@@ -0,0 +1,92 @@
+import unittest
+from bookmarks_categorize.modules.tweet import (
+    extract_tweet_id,
+    extract_tweet_fields,
+    normalize_timestamp,
+    url_domain
+)
+
+
+class TestTweet(unittest.TestCase):
+    """ツイート内容の辞書を扱う関数のテスト"""
+
+    def test_extract_tweet_id(self):
+        """ツイートIDを取り出すテスト"""
+        cases = [
+            ({"id_str": "1234567890123456789", "id": 1234567890123456800}, "1234567890123456789"),
+            ({"tweet_id": "123"}, "123"),
+            ({"id": 456}, "456"),
+            ({"tweet_url": "https://x.com/test_user/status/789?s=20"}, "789"),
+            ({"url": "https://twitter.com/test_user/statuses/1011"}, "1011"),
+            ({"tweet_id": "", "tweet_url": "https://x.com/test_user/status/1213"}, "1213"),
+            ({"id": True, "full_text": "IDなし"}, None),
+            ({"tweet_url": "https://x.com/test_user"}, None),
+            ("ツイートではない", None)
+        ]
+        for tweet, expected in cases:
+            with self.subTest(tweet=tweet):
+                self.assertEqual(extract_tweet_id(tweet), expected)
+
+    def test_normalize_timestamp(self):
+        """投稿日時を UTC の created_at と同じ形式に揃えるテスト"""
+        cases = [
+            ("2024-01-02T03:04:05.000Z", "2024-01-02 03:04:05"),
+            ("2024-01-02T12:04:05+09:00", "2024-01-02 03:04:05"),
+            ("2024-01-02", "2024-01-02 00:00:00"),
+            ("Tue Jan 02 03:04:05 +0000 2024", "2024-01-02 03:04:05"),
+            (1704164645, "2024-01-02 03:04:05"),
+            (1704164645000, "2024-01-02 03:04:05"),
+            ("昨日", None),
+            (True, None),
+            (None, None),
+            ({"$date": "2024-01-02T03:04:05Z"}, None),
+            (["2024-01-02"], None),
+            (float("nan"), None)
+        ]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                self.assertEqual(normalize_timestamp(value), expected)
+
+    def test_extract_tweet_fields(self):
+        """列に保存する項目を取り出すテスト"""
+        fields = extract_tweet_fields({
+            "id_str": "123",
+            "screen_name": "@Test_User",
+            "full_text": "本文 https://t.co/abc https://example.com/a",
+            "note_tweet_text": "長文の本文 https://t.co/abc https://www.Example.com/b",
+            "tweeted_at": "2024-01-02T03:04:05Z",
+            "extended_media": "[{\"type\": \"photo\"}]",
+            "entities": {"urls": [{"url": "https://t.co/xyz", "expanded_url": "https://docs.python.org/3/"}]}
+        })
+
+        self.assertEqual(fields["tweet_id"], "123")
+        self.assertEqual(fields["screen_name"], "Test_User")
+        self.assertEqual(fields["tweet_text"], "長文の本文 https://t.co/abc https://www.Example.com/b")
+        self.assertEqual(fields["tweeted_at"], "2024-01-02 03:04:05")
+        self.assertTrue(fields["has_media"])
+        # 本文中の t.co は展開先が分からないので含めない
+        self.assertEqual(fields["urls"], ["https://docs.python.org/3/", "https://www.Example.com/b"])
+
+    def test_extract_tweet_fields_v2(self):
+        """X API v2 の形式（to_bookmark_json の結果）から取り出すテスト"""
+        fields = extract_tweet_fields({
+            "id": "456",
+            "user": {"username": "v2_user"},
+            "text": "本文",
+            "created_at": "2024-05-06T07:08:09.000Z",
+            "attachments": {"media_keys": []}
+        })
+
+        self.assertEqual(fields["screen_name"], "v2_user")
+        self.assertEqual(fields["tweeted_at"], "2024-05-06 07:08:09")
+        self.assertFalse(fields["has_media"])
+        self.assertEqual(fields["urls"], [])
+
+    def test_url_domain(self):
+        """URLのドメインを小文字・www. なしで取り出すテスト"""
+        self.assertEqual(url_domain("https://WWW.Example.com/path?q=1"), "example.com")
+        self.assertEqual(url_domain("https://docs.python.org:443/"), "docs.python.org")
+
+
+if __name__ == '__main__':
+    unittest.main()
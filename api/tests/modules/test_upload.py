@@ -0,0 +1,171 @@
+import unittest
+import csv
+import io
+import json
+from bookmarks_categorize.modules.upload import (
+    JSONArrayParser,
+    CSVExportParser,
+    CSV_EXPORT_COLUMNS,
+    iter_json_array,
+    aiter_upload_json_array,
+    iter_csv_export,
+    aiter_upload_csv_export,
+    parse_csv_media
+)
+
+
+class FakeUploadFile:
+    """UploadFile の read だけを持つテスト用のファイル"""
+
+    def __init__(self, content: bytes):
+        self.file = io.BytesIO(content)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+
+class TestUpload(unittest.IsolatedAsyncioTestCase):
+    """アップロードファイルの逐次パーサーのテスト"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.bookmarks = [
+            {"tweet_id": str(i), "full_text": f"日本語のツイート{i}", "user": {"screen_name": "test_user"}, "count": i}
+            for i in range(50)
+        ]
+        self.content = json.dumps(self.bookmarks, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def test_iter_json_array(self):
+        """チャンクの境界（マルチバイト文字の途中を含む）によらず全要素を読み込めるテスト"""
+        for chunk_size in [1, 7, 64, 1024 * 1024]:
+            items = list(iter_json_array(io.BytesIO(self.content), chunk_size=chunk_size))
+
+            self.assertEqual(items, self.bookmarks)
+
+    def test_feed_returns_items_incrementally(self):
+        """届いた要素から順に返されるテスト"""
+        parser = JSONArrayParser()
+
+        self.assertEqual(parser.feed(b'\xef\xbb\xbf[{"a": 1}, {"b"'), [{"a": 1}])
+        self.assertEqual(parser.feed(b': 2}, 12'), [{"b": 2}])
+        # 数値は区切り文字が届くまで確定しない
+        self.assertEqual(parser.feed(b'3 '), [123])
+        self.assertEqual(parser.feed(b']'), [])
+        self.assertEqual(parser.close(), [])
+
+    def test_empty_array(self):
+        """空の配列のテスト"""
+        self.assertEqual(list(iter_json_array(io.BytesIO(b" [ ] "))), [])
+
+    def test_invalid_json(self):
+        """不正なJSONのテスト"""
+        for content in [b'{"a": 1}', b'[{"a": 1}', b'[{"a": 1} {"b": 2}]', b'[{"a": 1}] x', b'[{"a": }]', b'']:
+            with self.subTest(content=content):
+                with self.assertRaises(json.JSONDecodeError):
+                    list(iter_json_array(io.BytesIO(content), chunk_size=4))
+
+    def test_max_item_bytes(self):
+        """1件のサイズが上限を超えた場合のテスト"""
+        parser = JSONArrayParser(max_item_bytes=10)
+
+        with self.assertRaises(json.JSONDecodeError):
+            parser.feed(b'[{"text": "' + b"a" * 100)
+
+    async def test_aiter_upload_json_array(self):
+        """アップロードファイルから非同期に読み込むテスト"""
+        items = [item async for item in aiter_upload_json_array(FakeUploadFile(self.content), chunk_size=100)]
+
+        self.assertEqual(items, self.bookmarks)
+
+
+
+class TestCSVExport(unittest.IsolatedAsyncioTestCase):
+    """X のブックマークのエクスポート（CSV）の逐次パーサーのテスト"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        rows = [list(CSV_EXPORT_COLUMNS)]
+        for i in range(20):
+            rows.append([
+                f"user_{i}",
+                f"ユーザー{i}",
+                # 引用符で囲まれた改行・引用符・カンマを含む本文
+                f'日本語のツイート{i}\n"引用", 2行目',
+                "長文のツイート" if i == 3 else "",
+                "2025-01-01T00:00:00.000Z",
+                '[{"type": "photo", "media_url_https": "https://pbs.twimg.com/media/1.jpg"}]' if i % 2 else "",
+                f"https://x.com/user_{i}/status/{1000 + i}",
+                f"https://pbs.twimg.com/profile_images/{i}.jpg"
+            ])
+        output = io.StringIO()
+        csv.writer(output).writerows(rows)
+        # 表計算ソフトで保存した CSV と同じく BOM 付き・CRLF にする
+        self.content = b"\xef\xbb\xbf" + output.getvalue().encode("utf-8")
+        self.rows = rows[1:]
+
+    def test_iter_csv_export(self):
+        """チャンクの境界（引用符の中の改行・マルチバイト文字の途中を含む）によらず全行を読み込めるテスト"""
+        for chunk_size in [1, 7, 64, 1024 * 1024]:
+            with self.subTest(chunk_size=chunk_size):
+                items = list(iter_csv_export(io.BytesIO(self.content), chunk_size=chunk_size))
+
+                self.assertEqual(len(items), 20)
+                self.assertEqual([item["full_text"] for item in items], [row[2] for row in self.rows])
+
+    def test_row_mapping(self):
+        """列がツイート内容の辞書のキーに対応付けられるテスト"""
+        items = list(iter_csv_export(io.BytesIO(self.content)))
+
+        self.assertEqual(items[3], {
+            "tweet_id": "1003",
+            "screen_name": "user_3",
+            "name": "ユーザー3",
+            "full_text": '日本語のツイート3\n"引用", 2行目',
+            "note_tweet_text": "長文のツイート",
+            "tweeted_at": "2025-01-01T00:00:00.000Z",
+            "extended_media": [{"type": "photo", "media_url_https": "https://pbs.twimg.com/media/1.jpg"}],
+            "tweet_url": "https://x.com/user_3/status/1003",
+            "profile_image_url_https": "https://pbs.twimg.com/profile_images/3.jpg"
+        })
+        self.assertNotIn("note_tweet_text", items[0])
+        self.assertEqual(items[0]["extended_media"], [])
+
+    def test_parse_csv_media(self):
+        """extended_media 列の JSON 配列と URL の並びのテスト"""
+        self.assertEqual(parse_csv_media(""), [])
+        self.assertEqual(parse_csv_media("[]"), [])
+        self.assertEqual(
+            parse_csv_media("https://pbs.twimg.com/media/1.jpg, https://pbs.twimg.com/media/2.jpg"),
+            [
+                {"type": None, "media_url_https": "https://pbs.twimg.com/media/1.jpg"},
+                {"type": None, "media_url_https": "https://pbs.twimg.com/media/2.jpg"}
+            ]
+        )
+        self.assertEqual(
+            parse_csv_media('["https://pbs.twimg.com/media/1.jpg"]'),
+            [{"type": None, "media_url_https": "https://pbs.twimg.com/media/1.jpg"}]
+        )
+
+    def test_invalid_csv(self):
+        """引用符が閉じられていない CSV と、必要な列がない CSV のテスト"""
+        for content in [b'full_text\n"a', b"foo,bar\n1,2\n"]:
+            with self.subTest(content=content):
+                with self.assertRaises(csv.Error):
+                    list(iter_csv_export(io.BytesIO(content), chunk_size=4))
+
+    def test_max_item_bytes(self):
+        """1行のサイズが上限を超えた場合のテスト"""
+        parser = CSVExportParser(max_item_bytes=10)
+
+        with self.assertRaises(csv.Error):
+            parser.feed(b'full_text\n"' + b"a" * 100)
+
+    async def test_aiter_upload_csv_export(self):
+        """アップロードファイルから非同期に読み込むテスト"""
+        items = [item async for item in aiter_upload_csv_export(FakeUploadFile(self.content), chunk_size=100)]
+
+        self.assertEqual(items, list(iter_csv_export(io.BytesIO(self.content))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import patch
+import os
+from bookmarks_categorize.modules.database import get_connection
+from bookmarks_categorize.modules.crud import bulk_insert_bookmarks, add_write_listener, remove_write_listener
+from bookmarks_categorize.modules.text_vectors import numpy_available, dense_vector
+from bookmarks_categorize.modules.vector_index import VectorIndex
+from tests.db_test_case import TempDBTestCase
+
+
+@unittest.skipUnless(numpy_available(), "NumPy がインストールされていません")
+class TestVectorIndex(TempDBTestCase):
+    """VectorIndexクラスのテスト（一時ファイルのSQLiteとベクトルファイルを使用）"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        super().setUp()
+        self.vector_path = os.path.join(self.tmp_dir.name, "bookmark_vectors.f32")
+        self.index = VectorIndex(self.vector_path, dim=64)
+        add_write_listener(self.index.on_bookmarks_written)
+        bulk_insert_bookmarks([
+            ("python_1", "テクノロジー", {"tweet_id": "1", "full_text": "Pythonの型ヒント入門"}),
+            ("python_2", "テクノロジー", {"tweet_id": "2", "full_text": "Pythonの型ヒントの使い方"}),
+            ("curry", "料理", {"tweet_id": "3", "full_text": "スパイスカレーのレシピ"}),
+            ("empty", "その他", {"tweet_id": "4"})
+        ])
+
+    def tearDown(self):
+        """各テスト後の後始末"""
+        remove_write_listener(self.index.on_bookmarks_written)
+        self.index.close()
+        super().tearDown()
+
+    def test_dense_vector(self):
+        """同じツイートは同じ正規化されたベクトルになるテスト"""
+        vector = dense_vector({"full_text": "Pythonの型ヒント"}, 64)
+
+        self.assertEqual(vector.tolist(), dense_vector({"full_text": "Pythonの型ヒント"}, 64).tolist())
+        self.assertAlmostEqual(float((vector ** 2).sum()), 1.0, places=5)
+        self.assertFalse(dense_vector({}, 64).any())
+
+    def test_similar_bookmarks(self):
+        """似ている順に返し、自分自身と特徴のないブックマークは含めないテスト"""
+        bookmarks = self.index.similar_bookmarks("python_1", limit=10)
+
+        self.assertEqual(bookmarks[0]["id"], "python_2")
+        self.assertEqual(bookmarks[0]["category"], "テクノロジー")
+        self.assertNotIn("python_1", [bookmark["id"] for bookmark in bookmarks])
+        self.assertNotIn("empty", [bookmark["id"] for bookmark in bookmarks])
+        self.assertEqual([bookmark["score"] for bookmark in bookmarks], sorted(bookmark["score"] for bookmark in bookmarks)[::-1])
+        self.assertIsNone(self.index.similar_bookmarks("missing"))
+
+    def test_excludes_deleted(self):
+        """論理削除したブックマークは返さないテスト"""
+        with get_connection() as conn:
+            conn.execute("UPDATE bookmarks SET is_deleted = 1 WHERE id = 'python_2'")
+            conn.commit()
+
+        bookmarks = self.index.similar_bookmarks("python_1", limit=1)
+
+        self.assertEqual([bookmark["id"] for bookmark in bookmarks], ["curry"])
+
+    def test_candidates_capped_and_chunked(self):
+        """候補を広げても行列の行数を超えず、rowid を SQL_IN_CHUNK_SIZE 件ずつ引いても結果が変わらないテスト"""
+        bulk_insert_bookmarks([
+            (f"python_{i}", "テクノロジー", {"tweet_id": str(i), "full_text": f"Pythonの型ヒント {i}"})
+            for i in range(5, 25)
+        ])
+        with get_connection() as conn:
+            conn.execute("UPDATE bookmarks SET is_deleted = 1 WHERE id LIKE 'python_%' AND id != 'python_1'")
+            conn.commit()
+        with patch.object(VectorIndex, 'MIN_CAPACITY', 32):
+            index = VectorIndex(os.path.join(self.tmp_dir.name, "small.f32"), dim=64)
+            index.sync_from_db()
+        self.addCleanup(index.close)
+        expected = [bookmark["id"] for bookmark in index.similar_bookmarks("python_1", limit=2)]
+
+        with patch('bookmarks_categorize.modules.vector_index.SQL_IN_CHUNK_SIZE', 3), \
+                patch.object(index, 'search', wraps=index.search) as mock_search:
+            bookmarks = index.similar_bookmarks("python_1", limit=2)
+
+        self.assertEqual(len(index), 32)
+        self.assertEqual([call.args[1] for call in mock_search.call_args_list], [5, 20, 32])
+        self.assertEqual([bookmark["id"] for bookmark in bookmarks], expected)
+        self.assertFalse(any(bookmark["id"].startswith("python_") for bookmark in bookmarks))
+
+    def test_updated_on_insert(self):
+        """crud で挿入・更新したブックマークのベクトルがすぐに使われるテスト"""
+        bulk_insert_bookmarks([("python_3", "テクノロジー", {"tweet_id": "5", "full_text": "Pythonの型ヒント入門の続き"})])
+        self.assertEqual(self.index.similar_bookmarks("python_1", limit=1)[0]["id"], "python_3")
+
+        # 同じツイートIDの再インポートでは既存の行のベクトルを書き換える
+        bulk_insert_bookmarks([("curry_2", "料理", {"tweet_id": "5", "full_text": "スパイスカレーのレシピ"})])
+        self.assertEqual(self.index.similar_bookmarks("curry", limit=1)[0]["id"], "python_3")
+
+    def test_persisted_and_synced(self):
+        """ベクトルはファイルに残り、未登録の分は sync_from_db で登録されるテスト"""
+        self.index.close()
+        remove_write_listener(self.index.on_bookmarks_written)
+        # リスナーなしで挿入した分はベクトルがない
+        bulk_insert_bookmarks([("python_3", "テクノロジー", {"tweet_id": "5", "full_text": "Pythonの型ヒント入門の続き"})])
+
+        reopened = VectorIndex(self.vector_path, dim=64)
+        self.assertEqual(reopened.similar_bookmarks("python_1", limit=1)[0]["id"], "python_2")
+
+        # 特徴のないツイートを含め、ゼロベクトルの行を登録し直す
+        self.assertEqual(reopened.sync_from_db(), 2)
+        self.assertEqual(reopened.similar_bookmarks("python_1", limit=1)[0]["id"], "python_3")
+        reopened.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from bookmarks_categorize.modules.x import XModule, BOOKMARKS_MAX_RESULTS
+
+
+def make_response(json_data: dict, status_code: int = 200) -> MagicMock:
+    """X API のレスポンスを模したモックを作成する"""
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = json_data
+    response.text = str(json_data)
+    return response
+
+
+class TestXModule(unittest.TestCase):
+    """XModuleクラスのテスト"""
+
+    def setUp(self):
+        """各テスト前の準備"""
+        self.x_module = XModule(
+            client_id="test_client_id",
+            client_secret=None,
+            redirect_uri="http://localhost:8081/",
+            scopes=["bookmark.read"]
+        )
+
+    @patch('bookmarks_categorize.modules.http_client.requests.Session.get')
+    def test_get_bookmarks(self, mock_request):
+        """ブックマーク1ページ分を展開付きで取得するテスト"""
+        page = {"data": [{"id": "1", "text": "ツイート"}], "meta": {"result_count": 1}}
+        mock_request.return_value = make_response(page)
+
+        result = self.x_module.get_bookmarks("user_1", "token", pagination_token="next_1")
+
+        self.assertEqual(result, page)
+        args, kwargs = mock_request.call_args
+        self.assertEqual(args, ("https://api.twitter.com/2/users/user_1/bookmarks",))
+        self.assertEqual(kwargs["timeout"], self.x_module.timeout)
+        self.assertEqual(kwargs["params"]["pagination_token"], "next_1")
+        self.assertEqual(kwargs["params"]["max_results"], BOOKMARKS_MAX_RESULTS)
+        self.assertIn("author_id", kwargs["params"]["expansions"])
+        self.assertIn("attachments.media_keys", kwargs["params"]["expansions"])
+
+    @patch('bookmarks_categorize.modules.http_client.requests.Session.get')
+    def test_get_bookmarks_api_base_url(self, mock_request):
+        """接続先の X API の URL を変更できるテスト"""
+        mock_request.return_value = make_response({"data": [], "meta": {"result_count": 0}})
+        x_module = XModule(
+            client_id="test_client_id",
+            client_secret=None,
+            redirect_uri="http://localhost:8081/",
+            scopes=["bookmark.read"],
+            api_base_url="http://127.0.0.1:8000/2/"
+        )
+
+        x_module.get_bookmarks("user_1", "token")
+
+        args, _ = mock_request.call_args
+        self.assertEqual(args, ("http://127.0.0.1:8000/2/users/user_1/bookmarks",))
+
+    @patch('bookmarks_categorize.modules.http_client.requests.Session.get')
+    def test_get_bookmarks_error(self, mock_request):
+        """ブックマーク取得のエラーのテスト（再試行しないエラー）"""
+        mock_request.return_value = make_response({"title": "Unauthorized"}, status_code=401)
+
+        with self.assertRaises(Exception) as context:
+            self.x_module.get_bookmarks("user_1", "token")
+        self.assertIn("401", str(context.exception))
+
+    @patch('bookmarks_categorize.modules.http_client.requests.Session.get')
+    def test_iter_bookmark_pages(self, mock_request):
+        """next_token を辿って全ページを取得するテスト"""
+        mock_request.side_effect = [
+            make_response({"data": [{"id": "3"}], "meta": {"next_token": "next_1"}}),
+            make_response({"data": [{"id": "2"}], "meta": {"next_token": "next_2"}}),
+            make_response({"data": [{"id": "1"}], "meta": {}})
+        ]
+
+        pages = list(self.x_module.iter_bookmark_pages("user_1", "token"))
+
+        self.assertEqual([page["data"][0]["id"] for page in pages], ["3", "2", "1"])
+        tokens = [call.kwargs["params"].get("pagination_token") for call in mock_request.call_args_list]
+        self.assertEqual(tokens, [None, "next_1", "next_2"])
+
+    def test_to_bookmark_json(self):
+        """X API のツイートをブックマークのJSONに変換するテスト"""
+        tweet = {
+            "id": "100",
+            "text": "短縮された本文",
+            "author_id": "u1",
+            "created_at": "2024-01-01T00:00:00.000Z",
+            "attachments": {"media_keys": ["m1"]},
+            "note_tweet": {"text": "長文の本文"}
+        }
+        includes = {
+            "users": [{"id": "u1", "username": "test_user", "name": "Test User", "profile_image_url": "https://pbs.twimg.com/u1.jpg"}],
+            "media": [{"media_key": "m1", "type": "photo", "url": "https://pbs.twimg.com/m1.jpg"}]
+        }
+
+        bookmark_json = XModule.to_bookmark_json(tweet, includes)
+
+        self.assertEqual(bookmark_json, {
+            "tweet_id": "100",
+            "screen_name": "test_user",
+            "name": "Test User",
+            "full_text": "短縮された本文",
+            "note_tweet_text": "長文の本文",
+            "tweeted_at": "2024-01-01T00:00:00.000Z",
+            "tweet_url": "https://x.com/test_user/status/100",
+            "profile_image_url_https": "https://pbs.twimg.com/u1.jpg",
+            "extended_media": [{"type": "photo", "media_url_https": "https://pbs.twimg.com/m1.jpg"}]
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
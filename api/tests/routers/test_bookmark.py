@@ -2,10 +2,15 @@ import unittest
 from unittest.mock import patch, MagicMock
 import json
 import io
+import os
+import tempfile
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
-from bookmarks_categorize.routers.bookmark import router
-from bookmarks_categorize.modules.dify import DifyModule
+from bookmarks_categorize.routers import bookmark
+from bookmarks_categorize.routers.bookmark import router, readCache
+from bookmarks_categorize.modules.read_cache import data_version
+from bookmarks_categorize.modules.database import PoolTimeoutError
+from bookmarks_categorize.modules.dify import DifyModule, DifyError
 
 # テスト用のFastAPIアプリを作成
 app = FastAPI()
@@ -17,6 +22,8 @@ class TestBookmarkRouter(unittest.TestCase):
 
     def setUp(self):
         """各テスト前の準備"""
+        # モックの結果が他のテストに残らないようにする
+        readCache.clear()
         # テスト用のデータ
         self.test_category = {
             "id": 1,
@@ -51,11 +58,11 @@ class TestBookmarkRouter(unittest.TestCase):
         self.assertEqual(response.json(), {"categories": [self.test_category]})
         mock_get_all_categories.assert_called_once()
 
-    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_by_category')
-    def test_get_bookmarks_all(self, mock_get_bookmarks_by_category):
+    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_json')
+    def test_get_bookmarks_all(self, mock_get_bookmarks_json):
         """全ブックマーク取得エンドポイントのテスト"""
         # モックの設定
-        mock_get_bookmarks_by_category.return_value = [self.test_bookmark]
+        mock_get_bookmarks_json.return_value = json.dumps({"bookmarks": [self.test_bookmark]}).encode("utf-8")
         
         # リクエスト実行
         response = client.get("/bookmarks/")
@@ -63,13 +70,19 @@ class TestBookmarkRouter(unittest.TestCase):
         # アサーション
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"bookmarks": [self.test_bookmark]})
-        mock_get_bookmarks_by_category.assert_called_once_with(None)
+        self.assertEqual(response.headers["content-type"], "application/json")
+        mock_get_bookmarks_json.assert_called_once_with(None)
 
-    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_by_category')
-    def test_get_bookmarks_by_category(self, mock_get_bookmarks_by_category):
+        # 全件の結果は読み取りキャッシュに載せず、毎回読み出す
+        client.get("/bookmarks/")
+        self.assertEqual(mock_get_bookmarks_json.call_count, 2)
+        self.assertEqual(readCache.stats()["entries"], 0)
+
+    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_json')
+    def test_get_bookmarks_by_category(self, mock_get_bookmarks_json):
         """カテゴリ別ブックマーク取得エンドポイントのテスト"""
         # モックの設定
-        mock_get_bookmarks_by_category.return_value = [self.test_bookmark]
+        mock_get_bookmarks_json.return_value = json.dumps({"bookmarks": [self.test_bookmark]}).encode("utf-8")
         
         # リクエスト実行
         response = client.get("/bookmarks/?category_id=1")
@@ -77,15 +90,181 @@ class TestBookmarkRouter(unittest.TestCase):
         # アサーション
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"bookmarks": [self.test_bookmark]})
-        mock_get_bookmarks_by_category.assert_called_once_with(1)
+        mock_get_bookmarks_json.assert_called_once_with(1)
+
+    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_page')
+    def test_get_bookmarks_page(self, mock_get_bookmarks_page):
+        """ページ指定のブックマーク取得エンドポイントのテスト"""
+        # モックの設定
+        mock_get_bookmarks_page.return_value = ([self.test_bookmark], "next_cursor_123")
+
+        # リクエスト実行
+        response = client.get("/bookmarks/?category_id=1&limit=1&cursor=cursor_123")
+
+        # アサーション
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"bookmarks": [self.test_bookmark], "next_cursor": "next_cursor_123"})
+        mock_get_bookmarks_page.assert_called_once_with(1, 1, "cursor_123")
+
+    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_page')
+    def test_get_bookmarks_filters(self, mock_get_bookmarks_page):
+        """投稿者・投稿日時・メディア・ドメインで絞り込むエンドポイントのテスト"""
+        # モックの設定
+        mock_get_bookmarks_page.return_value = ([self.test_bookmark], None)
+
+        # リクエスト実行（指定した条件だけが渡される）
+        response = client.get("/bookmarks/?limit=10&screen_name=test_user&since=2024-01-01&has_media=true&domain=example.com")
+
+        # アサーション
+        self.assertEqual(response.status_code, 200)
+        mock_get_bookmarks_page.assert_called_once_with(
+            None, 10, None, screen_name="test_user", since="2024-01-01", has_media=True, domain="example.com"
+        )
+
+        # 解釈できない日時は400
+        mock_get_bookmarks_page.side_effect = ValueError("日時を解釈できません: 先月")
+        response = client.get("/bookmarks/?limit=10&since=先月")
+        self.assertEqual(response.status_code, 400)
+
+    @patch('bookmarks_categorize.routers.bookmark.iter_bookmarks_ndjson')
+    def test_get_bookmarks_stream(self, mock_iter_bookmarks_ndjson):
+        """NDJSONでブックマークを取得するエンドポイントのテスト"""
+        # モックの設定
+        line = json.dumps(self.test_bookmark, ensure_ascii=False) + "\n"
+        mock_iter_bookmarks_ndjson.return_value = (chunk for chunk in [line.encode("utf-8"), line.encode("utf-8")])
+
+        # リクエスト実行（Accept ヘッダーでも stream=1 でも同じ）
+        response = client.get("/bookmarks/?category_id=1", headers={"Accept": "application/x-ndjson"})
+
+        # アサーション
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        self.assertEqual([json.loads(line) for line in response.text.splitlines()], [self.test_bookmark] * 2)
+        mock_iter_bookmarks_ndjson.assert_called_once_with(1, None, None)
+
+        mock_iter_bookmarks_ndjson.return_value = (chunk for chunk in [])
+        response = client.get("/bookmarks/?stream=1&limit=10")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, "")
+        mock_iter_bookmarks_ndjson.assert_called_with(None, 10, None)
+
+    @patch('bookmarks_categorize.routers.bookmark.iter_bookmarks_ndjson')
+    def test_get_bookmarks_stream_invalid_cursor(self, mock_iter_bookmarks_ndjson):
+        """NDJSONの取得で不正なカーソルを指定した場合のテスト"""
+        def invalid_cursor(*args):
+            raise ValueError("カーソルの形式が不正です")
+            yield
+        mock_iter_bookmarks_ndjson.side_effect = invalid_cursor
+
+        response = client.get("/bookmarks/?stream=1&cursor=invalid")
+
+        self.assertEqual(response.status_code, 400)
+
+    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_page')
+    def test_get_bookmarks_page_invalid_cursor(self, mock_get_bookmarks_page):
+        """不正なカーソルを指定した場合のテスト"""
+        mock_get_bookmarks_page.side_effect = ValueError("カーソルの形式が不正です")
+
+        response = client.get("/bookmarks/?cursor=invalid")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "カーソルの形式が不正です"})
 
-    @patch('bookmarks_categorize.routers.bookmark.get_or_create_category')
     @patch('bookmarks_categorize.routers.bookmark.get_all_categories')
-    def test_create_category(self, mock_get_all_categories, mock_get_or_create_category):
+    def test_get_categories_etag(self, mock_get_all_categories):
+        """変更がなければキャッシュを返し、If-None-Match に 304 を返すテスト"""
+        # モックの設定
+        mock_get_all_categories.return_value = [self.test_category]
+
+        # 1回目はDBから読み込み、2回目はキャッシュから返す
+        response = client.get("/bookmarks/categories")
+        etag = response.headers["ETag"]
+        self.assertEqual(client.get("/bookmarks/categories").json(), {"categories": [self.test_category]})
+        mock_get_all_categories.assert_called_once()
+
+        # 同じ ETag なら本文なしの 304
+        response = client.get("/bookmarks/categories", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        # 書き込みがあると ETag が変わり、読み直す
+        data_version.bump()
+        response = client.get("/bookmarks/categories", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(mock_get_all_categories.call_count, 2)
+
+    @patch('bookmarks_categorize.routers.bookmark.get_categories_with_counts')
+    def test_get_categories_with_counts(self, mock_get_categories_with_counts):
+        """ブックマーク数付きのカテゴリ取得エンドポイントのテスト"""
+        # モックの設定
+        category = {**self.test_category, "parent_id": None, "bookmark_count": 3, "label_count": 4}
+        mock_get_categories_with_counts.return_value = [category]
+
+        # リクエスト実行
+        response = client.get("/bookmarks/categories?with_counts=1")
+
+        # アサーション
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"categories": [category]})
+        mock_get_categories_with_counts.assert_called_once()
+
+    @patch('bookmarks_categorize.routers.bookmark.set_bookmark_categories')
+    def test_update_bookmark_categories(self, mock_set_bookmark_categories):
+        """ブックマークのカテゴリ更新エンドポイントのテスト"""
+        mock_set_bookmark_categories.return_value = [1, 2]
+
+        response = client.put("/bookmarks/bookmark_123/categories", json={"category_ids": [2]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"bookmark_id": "bookmark_123", "category_ids": [1, 2]})
+        mock_set_bookmark_categories.assert_called_once_with("bookmark_123", [2])
+
+        # 存在しないブックマークは404、存在しないカテゴリは400
+        mock_set_bookmark_categories.return_value = None
+        self.assertEqual(client.put("/bookmarks/missing/categories", json={"category_ids": []}).status_code, 404)
+        mock_set_bookmark_categories.side_effect = ValueError("カテゴリが存在しません: [9]")
+        self.assertEqual(client.put("/bookmarks/bookmark_123/categories", json={"category_ids": [9]}).status_code, 400)
+
+    @patch('bookmarks_categorize.routers.bookmark.get_or_create_category')
+    @patch('bookmarks_categorize.routers.bookmark.set_category_parent')
+    @patch('bookmarks_categorize.routers.bookmark.get_category')
+    def test_create_category_with_parent(self, mock_get_category, mock_set_category_parent, mock_get_or_create_category):
+        """親カテゴリを指定したカテゴリ作成エンドポイントのテスト"""
+        mock_get_or_create_category.return_value = 2
+        mock_get_category.return_value = {**self.test_category, "id": 2, "parent_id": 1}
+
+        response = client.post("/bookmarks/categories", json={"name": "AI", "parent_id": 1})
+
+        self.assertEqual(response.status_code, 200)
+        mock_set_category_parent.assert_called_once_with(2, 1)
+
+        mock_set_category_parent.side_effect = ValueError("カテゴリの親子関係が循環しています")
+        response = client.post("/bookmarks/categories", json={"name": "AI", "parent_id": 2})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_page')
+    def test_get_bookmarks_etag(self, mock_get_bookmarks_page):
+        """一覧は条件ごとにキャッシュし、If-None-Match に 304 を返すテスト"""
+        # モックの設定
+        mock_get_bookmarks_page.return_value = ([self.test_bookmark], None)
+
+        response = client.get("/bookmarks/?limit=10")
+        client.get("/bookmarks/?limit=10")
+        client.get("/bookmarks/?limit=10&screen_name=test_user")
+        self.assertEqual(mock_get_bookmarks_page.call_count, 2)
+
+        response = client.get("/bookmarks/?limit=10", headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(mock_get_bookmarks_page.call_count, 2)
+
+    @patch('bookmarks_categorize.routers.bookmark.get_or_create_category')
+    @patch('bookmarks_categorize.routers.bookmark.get_category')
+    def test_create_category(self, mock_get_category, mock_get_or_create_category):
         """カテゴリ作成エンドポイントのテスト"""
         # モックの設定
         mock_get_or_create_category.return_value = 1
-        mock_get_all_categories.return_value = [self.test_category]
+        mock_get_category.return_value = self.test_category
         
         # リクエスト実行
         response = client.post(
@@ -97,18 +276,17 @@ class TestBookmarkRouter(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"category": self.test_category})
         mock_get_or_create_category.assert_called_once_with("テクノロジー")
-        mock_get_all_categories.assert_called_once()
+        mock_get_category.assert_called_once_with(1)
 
-    @patch('bookmarks_categorize.routers.bookmark.DifyModule')
-    @patch('bookmarks_categorize.routers.bookmark.get_or_create_category')
-    @patch('bookmarks_categorize.routers.bookmark.insert_bookmark')
-    def test_categorize_bookmarks(self, mock_insert_bookmark, mock_get_or_create_category, mock_dify_module):
+    @patch('bookmarks_categorize.routers.bookmark.resolve_failures')
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.cache', None)
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.known_category', None)
+    @patch('bookmarks_categorize.routers.bookmark.difyModule.categorized_json')
+    @patch('bookmarks_categorize.routers.bookmark.bulk_insert_bookmarks')
+    def test_categorize_bookmarks(self, mock_bulk_insert_bookmarks, mock_categorized_json, mock_resolve_failures):
         """ブックマークカテゴリ化エンドポイントのテスト"""
         # モックの設定
-        mock_dify_instance = MagicMock()
-        mock_dify_module.return_value = mock_dify_instance
-        
-        mock_dify_instance.categorized_json.return_value = {
+        mock_categorized_json.return_value = {
             "data": {
                 "outputs": {
                     "categorized_bookmark_json": '{"分類項目": "テクノロジー"}'
@@ -116,8 +294,6 @@ class TestBookmarkRouter(unittest.TestCase):
             }
         }
         
-        mock_get_or_create_category.return_value = 1
-        
         # テスト用のJSONファイル
         test_json = json.dumps([{
             "tweet_id": "1234567890",
@@ -136,15 +312,381 @@ class TestBookmarkRouter(unittest.TestCase):
         
         # アサーション
         self.assertEqual(response.status_code, 200)
-        # mock_dify_instance.categorized_json.assert_called_once()
-        # mock_get_or_create_category.assert_called_once_with("テクノロジー")
-        # mock_insert_bookmark.assert_called_once()
+        self.assertEqual(response.json()[0]["bookmark_category"], "テクノロジー")
+        mock_categorized_json.assert_called_once()
+        mock_bulk_insert_bookmarks.assert_called_once()
+        bookmarks = mock_bulk_insert_bookmarks.call_args[0][0]
+        self.assertEqual(len(bookmarks), 1)
+        self.assertEqual(bookmarks[0][1], "テクノロジー")
+        self.assertEqual(bookmarks[0][2]["tweet_id"], "1234567890")
+
+    @patch('bookmarks_categorize.routers.bookmark.resolve_failures')
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.cache', None)
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.known_category', None)
+    @patch('bookmarks_categorize.routers.bookmark.difyModule.categorized_json')
+    @patch('bookmarks_categorize.routers.bookmark.bulk_insert_bookmarks')
+    def test_categorize_bookmarks_quotes(self, mock_bulk_insert_bookmarks, mock_categorized_json, mock_resolve_failures):
+        """分類項目やツイート内容に引用符などが含まれていてもそのまま返すテスト"""
+        mock_categorized_json.return_value = {
+            "data": {
+                "outputs": {
+                    "categorized_bookmark_json": json.dumps({"分類項目": 'C++ "入門" と \'型\''}, ensure_ascii=False)
+                }
+            }
+        }
+        tweet = {"tweet_id": "1", "full_text": "\"引用\" と 'quote' \\ バックスラッシュ", "flag": True, "note": None}
+
+        response = client.post(
+            "/bookmarks/categorize",
+            files={"file": ("test.json", io.BytesIO(json.dumps([tweet]).encode()), "application/json")}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{"bookmark_category": 'C++ "入門" と \'型\'', "tweet_content": tweet}])
+        self.assertEqual(mock_bulk_insert_bookmarks.call_args[0][0][0][1:], ('C++ "入門" と \'型\'', tweet, "dify"))
+
+    @patch('bookmarks_categorize.routers.bookmark.record_failures')
+    @patch('bookmarks_categorize.routers.bookmark.resolve_failures')
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.cache', None)
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.known_category', None)
+    @patch('bookmarks_categorize.routers.bookmark.difyModule.categorized_json')
+    @patch('bookmarks_categorize.routers.bookmark.bulk_insert_bookmarks')
+    def test_categorize_bookmarks_partial_failure(self, mock_bulk_insert_bookmarks, mock_categorized_json, mock_resolve_failures, mock_record_failures):
+        """一部のブックマークの分類に失敗しても、残りを保存して返し、失敗したものをデッドレターに保存するテスト"""
+        def categorized_json(bookmark_json):
+            if json.loads(bookmark_json)["tweet_id"] == "2":
+                raise DifyError("ワークフロー実行エラー: 500 Server Error")
+            return {"data": {"outputs": {"categorized_bookmark_json": '{"分類項目": "テクノロジー"}'}}}
+        mock_categorized_json.side_effect = categorized_json
+        tweets = [{"tweet_id": str(i), "full_text": f"ツイート{i}"} for i in range(1, 4)]
+
+        response = client.post(
+            "/bookmarks/categorize",
+            files={"file": ("test.json", io.BytesIO(json.dumps(tweets).encode()), "application/json")}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Categorize-Failed"], "1")
+        self.assertEqual([item["tweet_content"]["tweet_id"] for item in response.json()], ["1", "3"])
+        stored = [bookmark[2]["tweet_id"] for call in mock_bulk_insert_bookmarks.call_args_list for bookmark in call[0][0]]
+        self.assertEqual(sorted(stored), ["1", "3"])
+        failed = [failure for call in mock_record_failures.call_args_list for failure in call[0][0]]
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0][0]["tweet_id"], "2")
+        self.assertTrue(failed[0][1].startswith("DifyError: ワークフロー実行エラー"))
+
+    @patch('bookmarks_categorize.routers.bookmark.count_failures')
+    @patch('bookmarks_categorize.routers.bookmark.get_failures')
+    def test_get_categorize_failures(self, mock_get_failures, mock_count_failures):
+        """デッドレターの取得エンドポイントのテスト"""
+        failure = {"id": 1, "tweet_id": "2", "tweet": {"tweet_id": "2"}, "error": "DifyError: timeout", "attempts": 2}
+        mock_get_failures.return_value = [failure]
+        mock_count_failures.return_value = 1
+
+        response = client.get("/bookmarks/categorize/failures?limit=10")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"failures": [failure], "total": 1})
+        mock_get_failures.assert_called_once_with(10)
+
+    @patch('bookmarks_categorize.routers.bookmark.count_failures')
+    @patch('bookmarks_categorize.routers.bookmark.get_failures')
+    @patch('bookmarks_categorize.routers.bookmark.record_failures')
+    @patch('bookmarks_categorize.routers.bookmark.resolve_failures')
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.cache', None)
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.known_category', None)
+    @patch('bookmarks_categorize.routers.bookmark.difyModule.categorized_json')
+    @patch('bookmarks_categorize.routers.bookmark.bulk_insert_bookmarks')
+    def test_retry_categorize_failures(self, mock_bulk_insert_bookmarks, mock_categorized_json, mock_resolve_failures,
+                                       mock_record_failures, mock_get_failures, mock_count_failures):
+        """デッドレターのブックマークだけを分類し直し、成功したものを取り除き、失敗したものを残すテスト"""
+        def categorized_json(bookmark_json):
+            if json.loads(bookmark_json)["tweet_id"] == "2":
+                raise DifyError("ワークフロー実行エラー: timeout")
+            return {"data": {"outputs": {"categorized_bookmark_json": '{"分類項目": "料理"}'}}}
+        mock_categorized_json.side_effect = categorized_json
+        mock_get_failures.return_value = [
+            {"id": 10, "tweet_id": "1", "tweet": {"tweet_id": "1"}, "error": "DifyError: timeout", "attempts": 1},
+            {"id": 11, "tweet_id": "2", "tweet": {"tweet_id": "2"}, "error": "DifyError: timeout", "attempts": 1}
+        ]
+        mock_count_failures.return_value = 1
+
+        response = client.post("/bookmarks/categorize/failures/retry")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"retried": 2, "succeeded": 1, "failed": 1, "remaining": 1})
+        self.assertEqual(mock_categorized_json.call_count, 2)
+        mock_bulk_insert_bookmarks.assert_called_once()
+        self.assertEqual(mock_bulk_insert_bookmarks.call_args[0][0][0][1:], ("料理", {"tweet_id": "1"}, "dify"))
+        mock_resolve_failures.assert_called_once_with([{"tweet_id": "1"}])
+        self.assertEqual(mock_record_failures.call_args[0][0][0][0], {"tweet_id": "2"})
+
+    @patch('bookmarks_categorize.routers.bookmark.bulk_insert_bookmarks')
+    def test_categorize_bookmarks_invalid_json(self, mock_bulk_insert_bookmarks):
+        """不正なJSONファイルで分類するテスト"""
+        response = client.post(
+            "/bookmarks/categorize",
+            files={"file": ("test.json", io.BytesIO(b'[{"text": "a"'), "application/json")}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        mock_bulk_insert_bookmarks.assert_not_called()
+
+    @patch('bookmarks_categorize.routers.bookmark.resolve_failures')
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.cache', None)
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine.known_category', None)
+    @patch('bookmarks_categorize.routers.bookmark.difyModule.categorized_json')
+    @patch('bookmarks_categorize.routers.bookmark.bulk_insert_bookmarks')
+    def test_categorize_bookmarks_csv(self, mock_bulk_insert_bookmarks, mock_categorized_json, mock_resolve_failures):
+        """X のブックマークのエクスポート（CSV）を Dify で変換せずに分類するテスト"""
+        mock_categorized_json.return_value = {
+            "data": {"outputs": {"categorized_bookmark_json": '{"分類項目": "テクノロジー"}'}}
+        }
+        content = (
+            "screen_name,name,full_text,tweeted_at,extended_media,tweet_url,profile_image_url_https\r\n"
+            'test_user,Test User,"1行目\n2行目",2025-01-01T00:00:00.000Z,,https://x.com/test_user/status/123,https://example.com/a.jpg\r\n'
+        ).encode("utf-8")
+
+        response = client.post(
+            "/bookmarks/categorize",
+            files={"file": ("bookmarks.csv", io.BytesIO(content), "text/csv")}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        tweet = response.json()[0]["tweet_content"]
+        self.assertEqual(tweet["tweet_id"], "123")
+        self.assertEqual(tweet["full_text"], "1行目\n2行目")
+        # Dify には変換済みのツイート内容が1件ずつ送られる
+        self.assertEqual(json.loads(mock_categorized_json.call_args[0][0])["screen_name"], "test_user")
+        self.assertEqual(mock_bulk_insert_bookmarks.call_args[0][0][0][2], tweet)
+
+    @patch('bookmarks_categorize.routers.bookmark.jobRunner')
+    @patch('bookmarks_categorize.routers.bookmark.queue_job')
+    @patch('bookmarks_categorize.routers.bookmark.append_job_items')
+    @patch('bookmarks_categorize.routers.bookmark.open_job')
+    def test_create_categorize_job_csv(self, mock_open_job, mock_append_job_items, mock_queue_job, mock_job_runner):
+        """CSV で分類ジョブを登録するテスト（不正な CSV は 400）"""
+        registered = []
+        def append_job_items(job_id, start_index, bookmarks_json_list):
+            registered.extend(bookmarks_json_list)
+            return len(bookmarks_json_list)
+        mock_open_job.return_value = "job_123"
+        mock_append_job_items.side_effect = append_job_items
+        content = b"full_text,tweet_url\na,https://x.com/a/status/1\nb,https://x.com/b/status/2\n"
+
+        response = client.post(
+            "/bookmarks/categorize/jobs",
+            files={"file": ("bookmarks.csv", io.BytesIO(content), "text/csv")}
+        )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"job_id": "job_123", "total": 2})
+        self.assertEqual([tweet["tweet_id"] for tweet in registered], ["1", "2"])
+
+        response = client.post(
+            "/bookmarks/categorize/jobs",
+            files={"file": ("bookmarks.csv", io.BytesIO(b'full_text\n"a'), "text/csv")}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @patch('bookmarks_categorize.routers.bookmark.jobRunner')
+    @patch('bookmarks_categorize.routers.bookmark.queue_job')
+    @patch('bookmarks_categorize.routers.bookmark.append_job_items')
+    @patch('bookmarks_categorize.routers.bookmark.open_job')
+    def test_create_categorize_job(self, mock_open_job, mock_append_job_items, mock_queue_job, mock_job_runner):
+        """分類ジョブ登録エンドポイントのテスト"""
+        # モックの設定
+        mock_open_job.return_value = "job_123"
+        mock_append_job_items.side_effect = lambda job_id, start_index, bookmarks_json_list: len(bookmarks_json_list)
+        test_json = json.dumps([self.test_bookmark["tweet"]])
+
+        # リクエスト実行
+        response = client.post(
+            "/bookmarks/categorize/jobs",
+            files={"file": ("test.json", io.BytesIO(test_json.encode()), "application/json")}
+        )
+
+        # アサーション
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"job_id": "job_123", "total": 1})
+        mock_append_job_items.assert_called_once_with("job_123", 0, [self.test_bookmark["tweet"]])
+        mock_queue_job.assert_called_once_with("job_123")
+        mock_job_runner.start.assert_called_once_with("job_123")
+
+    @patch('bookmarks_categorize.routers.bookmark.JOB_ITEMS_CHUNK_SIZE', 2)
+    @patch('bookmarks_categorize.routers.bookmark.jobRunner')
+    @patch('bookmarks_categorize.routers.bookmark.delete_job')
+    @patch('bookmarks_categorize.routers.bookmark.queue_job')
+    @patch('bookmarks_categorize.routers.bookmark.append_job_items')
+    @patch('bookmarks_categorize.routers.bookmark.open_job')
+    def test_create_categorize_job_in_chunks(self, mock_open_job, mock_append_job_items, mock_queue_job, mock_delete_job, mock_job_runner):
+        """読み込んだアイテムが一定件数ごとにリストで登録され、途中で不正な形式になった場合は登録途中のジョブが削除されるテスト"""
+        mock_open_job.return_value = "job_123"
+        mock_append_job_items.side_effect = lambda job_id, start_index, bookmarks_json_list: len(bookmarks_json_list)
+        tweets = [{"tweet_id": str(i)} for i in range(5)]
+
+        response = client.post(
+            "/bookmarks/categorize/jobs",
+            files={"file": ("test.json", io.BytesIO(json.dumps(tweets).encode()), "application/json")}
+        )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"job_id": "job_123", "total": 5})
+        self.assertEqual(
+            [call.args for call in mock_append_job_items.call_args_list],
+            [("job_123", 0, tweets[:2]), ("job_123", 2, tweets[2:4]), ("job_123", 4, tweets[4:])]
+        )
+        mock_delete_job.assert_not_called()
+
+        # 1チャンク登録した後で不正な形式になった場合
+        mock_append_job_items.reset_mock()
+        response = client.post(
+            "/bookmarks/categorize/jobs",
+            files={"file": ("test.json", io.BytesIO(json.dumps(tweets).encode()[:-20]), "application/json")}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        mock_delete_job.assert_called_once_with("job_123")
+        mock_job_runner.start.assert_called_once()
+
+    @patch('bookmarks_categorize.routers.bookmark.jobRunner')
+    def test_create_categorize_job_invalid_json(self, mock_job_runner):
+        """不正なJSONファイルで分類ジョブを登録するテスト"""
+        for content in [b'[{"text": "a"}, {"text": ', b'{"text": "a"}']:
+            response = client.post(
+                "/bookmarks/categorize/jobs",
+                files={"file": ("test.json", io.BytesIO(content), "application/json")}
+            )
+
+            self.assertEqual(response.status_code, 400)
+        mock_job_runner.start.assert_not_called()
+
+    @patch('bookmarks_categorize.routers.bookmark.get_job_results')
+    @patch('bookmarks_categorize.routers.bookmark.get_job')
+    def test_get_categorize_job_results(self, mock_get_job, mock_get_job_results):
+        """分類ジョブの途中結果取得エンドポイントのテスト"""
+        # モックの設定
+        job = {"id": "job_123", "status": "running", "total": 2, "done": 1, "failed": 0}
+        mock_get_job.return_value = job
+        mock_get_job_results.return_value = [
+            {"bookmark_category": "テクノロジー", "tweet_content": self.test_bookmark["tweet"]}
+        ]
+
+        # リクエスト実行
+        response = client.get("/bookmarks/categorize/jobs/job_123/results")
+
+        # アサーション
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["job"], job)
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    @patch('bookmarks_categorize.routers.bookmark.get_job')
+    def test_get_categorize_job_not_found(self, mock_get_job):
+        """存在しない分類ジョブを取得するテスト"""
+        mock_get_job.return_value = None
+
+        response = client.get("/bookmarks/categorize/jobs/unknown")
+
+        self.assertEqual(response.status_code, 404)
+
+    @patch('bookmarks_categorize.routers.bookmark.jobRunner')
+    @patch('bookmarks_categorize.routers.bookmark.sync_bookmarks')
+    def test_sync_x_bookmarks(self, mock_sync_bookmarks, mock_job_runner):
+        """X のブックマーク同期エンドポイントのテスト"""
+        result = {"user_id": "user_1", "job_id": "job_123", "new": 2, "pages": 1}
+        mock_sync_bookmarks.return_value = result
+
+        response = client.post("/bookmarks/x/sync", json={"access_token": "token"})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), result)
+        self.assertEqual(mock_sync_bookmarks.call_args[0][1:], ("token", None))
+        mock_job_runner.start.assert_called_once_with("job_123")
+
+    @patch('bookmarks_categorize.routers.bookmark.jobRunner')
+    @patch('bookmarks_categorize.routers.bookmark.sync_bookmarks')
+    def test_sync_x_bookmarks_error(self, mock_sync_bookmarks, mock_job_runner):
+        """X API のエラーのテスト"""
+        mock_sync_bookmarks.side_effect = Exception("Request returned an error: 429")
+
+        response = client.post("/bookmarks/x/sync", json={"access_token": "token", "user_id": "user_1"})
+
+        self.assertEqual(response.status_code, 502)
+        mock_job_runner.start.assert_not_called()
+
+    def test_categorize_resources_opened_in_lifespan(self):
+        """ルーターの import 時には分類キャッシュ・ローカル分類・類似検索のベクトルを作らず、起動時に作って終了時に閉じるテスト"""
+        self.assertIsNone(bookmark.categorizeCache)
+        self.assertIsNone(bookmark.vectorIndex)
+        self.assertIsNone(bookmark.categorizeEngine.cache)
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+             patch('bookmarks_categorize.routers.bookmark.cache_db_path', os.path.join(tmp_dir, "categorize_cache.db")), \
+             patch('bookmarks_categorize.routers.bookmark.vector_index_path', os.path.join(tmp_dir, "bookmark_vectors.f32")), \
+             patch.object(bookmark.settings, 'categorize_cache_enabled', True):
+            bookmark.open_categorize_resources()
+            try:
+                self.assertIsNotNone(bookmark.categorizeCache)
+                self.assertIs(bookmark.categorizeEngine.cache, bookmark.categorizeCache)
+                self.assertIs(bookmark.categorizeEngine.local_classifier, bookmark.localClassifier)
+            finally:
+                bookmark.close_categorize_resources()
+
+        self.assertIsNone(bookmark.categorizeCache)
+        self.assertIsNone(bookmark.localClassifier)
+        self.assertIsNone(bookmark.vectorIndex)
+        self.assertIsNone(bookmark.categorizeEngine.cache)
+
+    @patch('bookmarks_categorize.routers.bookmark.vectorIndex')
+    def test_get_similar_bookmarks(self, mock_vector_index):
+        """似ているブックマークの取得エンドポイントのテスト"""
+        similar = {**self.test_bookmark, "score": 0.8}
+        mock_vector_index.similar_bookmarks.return_value = [similar]
 
-    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_by_category')
-    def test_get_bookmarks_error(self, mock_get_bookmarks_by_category):
+        response = client.get("/bookmarks/bookmark_123/similar?limit=5")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"bookmarks": [similar]})
+        mock_vector_index.similar_bookmarks.assert_called_once_with("bookmark_123", 5)
+
+        # 存在しないブックマークは404
+        mock_vector_index.similar_bookmarks.return_value = None
+        self.assertEqual(client.get("/bookmarks/missing/similar").status_code, 404)
+
+    @patch('bookmarks_categorize.routers.bookmark.vectorIndex', None)
+    def test_get_similar_bookmarks_disabled(self):
+        """類似検索が無効な場合のテスト"""
+        response = client.get("/bookmarks/bookmark_123/similar")
+
+        self.assertEqual(response.status_code, 503)
+
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine')
+    def test_get_local_classifier_stats(self, mock_categorize_engine):
+        """ローカル分類の統計取得エンドポイントのテスト"""
+        stats = {"ready": True, "categories": 2, "samples": 100, "attempts": 10, "local_hits": 7, "local_share": 0.7}
+        mock_categorize_engine.local_stats.return_value = stats
+
+        response = client.get("/bookmarks/categorize/local")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"local": stats})
+
+    @patch('bookmarks_categorize.routers.bookmark.categorizeEngine')
+    def test_get_categorize_cache_stats(self, mock_categorize_engine):
+        """分類キャッシュの統計取得エンドポイントのテスト"""
+        stats = {"hits": 3, "misses": 1, "hit_rate": 0.75, "entries": 4, "estimated_saved_seconds": 6.0}
+        mock_categorize_engine.cache_stats.return_value = stats
+
+        response = client.get("/bookmarks/categorize/cache")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"cache": stats})
+
+    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_json')
+    def test_get_bookmarks_error(self, mock_get_bookmarks_json):
         """ブックマーク取得エラーのテスト"""
         # 例外を発生させる
-        mock_get_bookmarks_by_category.side_effect = Exception("テスト用のエラー")
+        mock_get_bookmarks_json.side_effect = Exception("テスト用のエラー")
         
         # リクエスト実行
         response = client.get("/bookmarks/")
@@ -153,6 +695,33 @@ class TestBookmarkRouter(unittest.TestCase):
         self.assertEqual(response.status_code, 500)
         self.assertEqual(response.json(), {"detail": "ブックマーク取得エラー: テスト用のエラー"})
 
+    @patch('bookmarks_categorize.routers.bookmark.get_bookmarks_page')
+    def test_get_bookmarks_pool_timeout(self, mock_get_bookmarks_page):
+        """接続プールの接続が空かない場合に 503 を返すテスト"""
+        mock_get_bookmarks_page.side_effect = PoolTimeoutError("接続プールから接続を取得できませんでした")
+
+        response = client.get("/bookmarks/?limit=10")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "1")
+
+    @patch('bookmarks_categorize.routers.bookmark.search_bookmarks')
+    def test_search_bookmarks(self, mock_search_bookmarks):
+        """ブックマーク検索エンドポイントのテスト"""
+        bookmarks = [{"id": "bookmark_1", "category": "テクノロジー", "tweet": {"full_text": "全文検索"}, "created_at": "2024-01-01 00:00:00"}]
+        mock_search_bookmarks.return_value = (bookmarks, 20)
+
+        response = client.get("/bookmarks/search", params={"q": "全文検索", "category_id": 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"bookmarks": bookmarks, "next_offset": 20})
+        mock_search_bookmarks.assert_called_once_with("全文検索", 1, 20, 0)
+
+    def test_search_bookmarks_without_query(self):
+        """検索語を指定しない場合のテスト"""
+        self.assertEqual(client.get("/bookmarks/search").status_code, 422)
+        self.assertEqual(client.get("/bookmarks/search", params={"q": ""}).status_code, 422)
+
     @patch('bookmarks_categorize.routers.bookmark.get_all_categories')
     def test_get_categories_error(self, mock_get_all_categories):
         """カテゴリ取得エラーのテスト"""
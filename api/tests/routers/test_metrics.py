@@ -0,0 +1,29 @@
+import unittest
+from fastapi.testclient import TestClient
+from fastapi import FastAPI
+from bookmarks_categorize.routers.metrics import router
+from bookmarks_categorize.modules.metrics import observe_stage
+
+# テスト用のFastAPIアプリを作成
+app = FastAPI()
+app.include_router(router)
+client = TestClient(app)
+
+class TestMetricsRouter(unittest.TestCase):
+    """メトリクスルーターのテスト"""
+
+    def test_get_metrics(self):
+        """Prometheus のテキスト形式で計測値を返すエンドポイントのテスト"""
+        observe_stage("merge", 0.01, items=2)
+
+        response = client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE bookmarks_stage_duration_seconds histogram", response.text)
+        self.assertIn('bookmarks_stage_items_total{stage="merge"}', response.text)
+        self.assertIn("# TYPE bookmarks_db_query_duration_seconds histogram", response.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
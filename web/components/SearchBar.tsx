@@ -3,7 +3,7 @@ import { StyleSheet, View, TextInput, TouchableOpacity, Platform } from 'react-n
 import { Menu, Search, Upload } from 'lucide-react-native';
 import * as DocumentPicker from 'expo-document-picker';
 import * as FileSystem from 'expo-file-system';
-import { categorizeBookmarks } from '../services/api';
+import { categorizeBookmarks, waitForCategorizeJob } from '../services/api';
 import Colors from '../constants/colors';
 import { useBookmarkStore } from '../store/bookmarkStore';
 
@@ -44,9 +44,15 @@ const SearchBar = () => {
         type: 'application/json',
       } as any);
 
-      // API 呼び出し
-      await categorizeBookmarks(formData);
+      // API 呼び出し（分類はバックグラウンドジョブで実行される）
+      const { job_id } = await categorizeBookmarks(formData);
       alert('ファイルを送信しました');
+
+      // 完了まで進捗をポーリング
+      const job = await waitForCategorizeJob(job_id, ({ done, failed, total }) => {
+        console.log(`categorize progress: ${done + failed}/${total}`);
+      });
+      alert(`分類が完了しました（成功: ${job.done} 件、失敗: ${job.failed} 件）`);
     } catch (e) {
       console.error(e);
       alert('ファイルの送信に失敗しました');
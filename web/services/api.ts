@@ -1,5 +1,13 @@
 import axios from 'axios';
-import { ApiBookmark, FetchBookmarksResponse, FetchCategoriesResponse, Category } from '../types/app';
+import {
+  ApiBookmark,
+  FetchBookmarksResponse,
+  FetchCategoriesResponse,
+  Category,
+  CategorizeJob,
+  CreateCategorizeJobResponse,
+  FetchCategorizeJobResponse,
+} from '../types/app';
 
 // Axiosインスタンスを作成し、ベースURLとタイムアウトを設定
 export const api = axios.create({
@@ -8,10 +16,19 @@ export const api = axios.create({
 });
 
 // ブックマーク取得関数
-export const fetchBookmarks = async (categoryId?: number): Promise<FetchBookmarksResponse> => {
+// limit を指定するとキーセットページネーションで1ページ分だけ取得し、
+// レスポンスの next_cursor を cursor に渡すと次のページを取得する
+export const fetchBookmarks = async (
+  categoryId?: number,
+  limit?: number,
+  cursor?: string | null,
+): Promise<FetchBookmarksResponse> => {
   try {
-    const url = categoryId ? `/bookmarks/?category_id=${categoryId}` : '/bookmarks/';
-    const res = await api.get<FetchBookmarksResponse>(url);
+    const params: Record<string, string | number> = {};
+    if (categoryId) params.category_id = categoryId;
+    if (limit) params.limit = limit;
+    if (cursor) params.cursor = cursor;
+    const res = await api.get<FetchBookmarksResponse>('/bookmarks/', { params });
     return res.data;
   } catch (error) {
     console.error('Failed to fetch bookmarks:', error);
@@ -42,12 +59,13 @@ export const addCategory = async (name: string): Promise<AddCategoryResponse> =>
 };
 
 /**
- * JSON ファイルを /bookmarks/categorize に POST する
+ * JSON ファイルを /bookmarks/categorize/jobs に POST し、分類ジョブを登録する
+ * 分類はサーバー側のバックグラウンドジョブで行われるため、ジョブIDがすぐに返る
  * @param formData FormData（file フィールドに JSON ファイルをセット）
  */
-export const categorizeBookmarks = async (formData: FormData) => {
+export const categorizeBookmarks = async (formData: FormData): Promise<CreateCategorizeJobResponse> => {
   try {
-    const res = await api.post('/bookmarks/categorize', formData, {
+    const res = await api.post<CreateCategorizeJobResponse>('/bookmarks/categorize/jobs', formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
     });
     return res.data;
@@ -56,3 +74,34 @@ export const categorizeBookmarks = async (formData: FormData) => {
     throw error;
   }
 };
+
+// 分類ジョブの進捗取得関数
+export const fetchCategorizeJob = async (jobId: string): Promise<CategorizeJob> => {
+  const res = await api.get<FetchCategorizeJobResponse>(`/bookmarks/categorize/jobs/${jobId}`);
+  return res.data.job;
+};
+
+/**
+ * 分類ジョブが完了するまで進捗をポーリングする（ジョブが失敗した場合は例外を投げる）
+ * @param jobId ジョブID
+ * @param onProgress 進捗が取得されるたびに呼ばれるコールバック
+ * @param intervalMs ポーリング間隔（ミリ秒）
+ */
+export const waitForCategorizeJob = async (
+  jobId: string,
+  onProgress?: (job: CategorizeJob) => void,
+  intervalMs = 2000,
+): Promise<CategorizeJob> => {
+  while (true) {
+    const job = await fetchCategorizeJob(jobId);
+    onProgress?.(job);
+    if (job.status === 'completed') {
+      return job;
+    }
+    // 失敗したジョブはサーバーの再起動時に再開されるまで進まないので、待つのをやめる
+    if (job.status === 'failed') {
+      throw new Error(`分類ジョブが失敗しました: ${job.error}`);
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+};
@@ -31,6 +31,7 @@ export interface ApiBookmark {
 // レスポンス全体の型定義
 export interface FetchBookmarksResponse {
   bookmarks: ApiBookmark[];
+  next_cursor?: string | null;  // limit 指定時のみ。最終ページの場合は null
 }
 
 // カテゴリの型定義
@@ -44,3 +45,33 @@ export interface Category {
 export interface FetchCategoriesResponse {
   categories: Category[];
 }
+
+// 分類ジョブの型定義
+export interface CategorizeJob {
+  id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  total: number;
+  done: number;
+  failed: number;
+  summary: {
+    total: number;
+    done: number;
+    failed: number;
+    categories: Record<string, number>;
+  } | null;
+  // ジョブの実行が失敗した場合のエラー内容
+  error: string | null;
+  created_at: string;
+  updated_at: string;
+}
+
+// 分類ジョブ登録レスポンスの型定義
+export interface CreateCategorizeJobResponse {
+  job_id: string;
+  total: number;
+}
+
+// 分類ジョブ進捗レスポンスの型定義
+export interface FetchCategorizeJobResponse {
+  job: CategorizeJob;
+}